@@ -4,27 +4,59 @@ BoutiqueComplete1 - Flask Backend Application
 A complete REST API for an online shop management system.
 """
 
-from flask import Flask, request, jsonify, render_template, send_from_directory
-from pymongo import MongoClient
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 from bson import ObjectId, json_util
+from bson.errors import InvalidId
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, ExecutionTimeout
 from datetime import datetime
+import base64
 import json
+import os
+import re
+import threading
+
+import autocomplete
+import compress
+import database
+import fields
+from cache import TTLCache, make_key
+from serialization import BSONJSONProvider
+import index_advisor
+import indexes
+import joins
+import order_lines
+import sales_stats
+import search
+import stock
+import versions
 
 # --- Flask App Configuration ---
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
+# Encode ObjectId, datetime and Decimal128 directly in jsonify (single pass)
+app.json = BSONJSONProvider(app)
+
+# Negotiated gzip/deflate/zstd above COMPRESS_MIN_SIZE, streams included (compress.py)
+@app.after_request
+def compress_response(response):
+    return compress.compress_response(request, response)
 
 # --- MongoDB Configuration ---
-MONGO_URI = "mongodb://localhost:27017"
-DATABASE_NAME = "BoutiqueComplete1"
+# Connection settings come from the environment (see database.py)
+MONGO_URI = database.MONGO_URI
+DATABASE_NAME = database.DATABASE_NAME
 
 def get_db():
-    """Get database connection."""
-    client = MongoClient(MONGO_URI)
-    return client[DATABASE_NAME]
+    """Get database from the shared, pooled client."""
+    return database.get_db()
 
 def serialize_doc(doc):
-    """Convert MongoDB document to JSON-serializable format."""
+    """
+    Convert MongoDB document to JSON-serializable format.
+    Responses no longer need it (see serialization.BSONJSONProvider);
+    kept as the reference implementation for benchmarks.
+    """
     if doc is None:
         return None
     if isinstance(doc, list):
@@ -43,6 +75,150 @@ def serialize_doc(doc):
         return result
     return doc
 
+# --- Streaming responses ---
+# ?stream=ndjson sends one document per line, ?stream=json sends the usual
+# {"data": [...], "success": true} envelope as a chunked array. Documents
+# are pulled from the cursor batch by batch, so memory stays flat.
+
+STREAM_FORMATS = ('ndjson', 'json')
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+
+def get_stream_options(args):
+    """
+    Return (format, batch_size) from query params, or (None, None) when
+    streaming is not requested. Raises ValueError on invalid values.
+    """
+    stream_format = args.get('stream')
+    if not stream_format:
+        return None, None
+    if stream_format not in STREAM_FORMATS:
+        raise ValueError(f'stream must be one of {", ".join(STREAM_FORMATS)}')
+    batch_size = args.get('batch_size', type=int, default=STREAM_BATCH_SIZE)
+    if batch_size <= 0:
+        raise ValueError('batch_size must be positive')
+    return stream_format, batch_size
+
+def iter_json_chunks(cursor, stream_format, batch_size):
+    """Encode documents from cursor, yielding one chunk per batch."""
+    dumps = app.json.dumps
+    separator = '\n' if stream_format == 'ndjson' else ','
+    first = True
+    batch = []
+    try:
+        if stream_format == 'json':
+            yield '{"data":['
+        for doc in cursor:
+            batch.append(dumps(doc, separators=(',', ':')))
+            if len(batch) >= batch_size:
+                yield ('' if first else separator) + separator.join(batch)
+                first = False
+                batch = []
+        if batch:
+            yield ('' if first else separator) + separator.join(batch)
+            first = False
+        if stream_format == 'json':
+            yield '],"success":true}\n'
+        elif not first:
+            yield '\n'
+    finally:
+        cursor.close()
+
+def stream_response(cursor, stream_format, batch_size):
+    """Build a chunked response streaming the cursor as NDJSON or a JSON array."""
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+    return Response(iter_json_chunks(cursor, stream_format, batch_size), mimetype=mimetype)
+
+# --- Conditional requests (ETags, see versions.py) ---
+# List reads are tagged from the Versions counters of the collections they
+# read: a matching If-None-Match is answered before running the query.
+# Responses carry Cache-Control: no-cache so caches revalidate every time.
+
+def tag_response(response, etag):
+    """Set the ETag (and revalidation policy) on a 200 response."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def not_modified(etag):
+    """Empty 304 response, if If-None-Match matches etag (else None)."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return tag_response(Response(status=304), etag)
+
+def bump_versions(*collections):
+    """Change the ETags of reads over these collections, after a write."""
+    versions.bump(get_db(), *collections)
+
+# --- Single round-trip mutations ---
+
+def mutate_one(collection, object_id, update, projection=None, condition=None):
+    """
+    Apply an update to one document and return its post-image in the same
+    round trip (find_one_and_update, ReturnDocument.AFTER).
+    Returns None if no document has this _id (and matches condition).
+    """
+    return collection.find_one_and_update(
+        {'_id': object_id, **(condition or {})},
+        update,
+        projection=projection,
+        return_document=ReturnDocument.AFTER
+    )
+
+# --- Batch reads by _id ---
+# POST /api/<collection>/batch-get resolves many references with one $in
+# query instead of one GET per id (N+1 requests from the pages).
+
+BATCH_GET_MAX_IDS = int(os.environ.get('BATCH_GET_MAX_IDS', 1000))
+
+def plan_batch_get(data, allowed, internal=()):
+    """
+    Validate a batch-get body {"ids": [...], "fields": "nom,prix"} and
+    return the query, projection and what batch_get_response needs.
+    Raises ValueError.
+    """
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(value, str) for value in ids):
+        raise ValueError('ids must be a list of strings')
+    if len(ids) > BATCH_GET_MAX_IDS:
+        raise ValueError(f'At most {BATCH_GET_MAX_IDS} ids per request')
+    value = data.get('fields')
+    if isinstance(value, list):
+        value = ','.join(str(item) for item in value)
+    elif value is not None and not isinstance(value, str):
+        raise ValueError('fields must be a string or a list')
+
+    projection = fields.parse_fields(value, allowed, internal)
+    # _id is needed to put the documents back in request order
+    projection, dropped = fields.ensure_fields(projection, ['_id'])
+    object_ids = list(dict.fromkeys(ObjectId(value) for value in ids if ObjectId.is_valid(value)))
+    return {
+        'ids': ids,
+        'query': {'_id': {'$in': object_ids}},
+        'projection': projection,
+        'dropped': dropped
+    }
+
+def batch_get_response(plan, docs):
+    """
+    Response body: data[i] is the document of ids[i] (null if missing),
+    missing lists the ids not found (malformed ones included), once each.
+    """
+    by_id = {str(doc['_id']): doc for doc in docs}
+    fields.strip_fields(docs, plan['dropped'])
+    # ObjectId strings are lowercase hex
+    data = [by_id.get(value.lower()) for value in plan['ids']]
+    missing = list(dict.fromkeys(value for value in plan['ids'] if value.lower() not in by_id))
+    return {'success': True, 'data': data, 'missing': missing}
+
+def batch_get(collection, allowed, internal=()):
+    """Flask view body of the batch-get endpoints."""
+    try:
+        plan = plan_batch_get(request.get_json(silent=True), allowed, internal)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    docs = list(collection.find(plan['query'], plan['projection']))
+    return jsonify(batch_get_response(plan, docs))
+
 # ============================================================
 # PAGE ROUTES (HTML Templates)
 # ============================================================
@@ -86,26 +262,15 @@ def serve_docs(filename):
 # API ROUTES - PRODUCTS (CRUD)
 # ============================================================
 
-@app.route('/api/products', methods=['GET'])
-def get_products():
+def build_product_query(args):
     """
-    Get all products with optional filters, sort, limit, skip.
-    Query params: 
-      - categorie: filter by category
-      - min_prix: minimum price ($gte)
-      - max_prix: maximum price ($lte)
-      - search: regex search on nom
-      - sort: field to sort by (prefix with - for descending)
-      - limit: number of results
-      - skip: number to skip (pagination)
+    Build the Produits filter from request query params.
+    Raises ValueError for an unknown search_mode.
     """
-    db = get_db()
-    
-    # Build query filter
     query = {}
     
     # Category filter ($in operator if multiple)
-    categorie = request.args.get('categorie')
+    categorie = args.get('categorie')
     if categorie:
         categories = categorie.split(',')
         if len(categories) > 1:
@@ -114,8 +279,8 @@ def get_products():
             query['categorie'] = categorie
     
     # Price filters ($gte, $gt, $lte)
-    min_prix = request.args.get('min_prix', type=float)
-    max_prix = request.args.get('max_prix', type=float)
+    min_prix = args.get('min_prix', type=float)
+    max_prix = args.get('max_prix', type=float)
     if min_prix is not None or max_prix is not None:
         query['prix'] = {}
         if min_prix is not None:
@@ -124,122 +289,473 @@ def get_products():
             query['prix']['$lte'] = max_prix
     
     # Stock filter
-    min_stock = request.args.get('min_stock', type=int)
+    min_stock = args.get('min_stock', type=int)
     if min_stock is not None:
         query['stock'] = {'$gt': min_stock}
     
-    # Regex search on nom
-    search = request.args.get('search')
-    if search:
-        query['nom'] = {'$regex': search, '$options': 'i'}
+    # Search on nom (see search.py): word prefix, ranked text or literal regex
+    search_text = args.get('search')
+    if search_text:
+        search_mode = args.get('search_mode', 'prefix')
+        if search_mode not in search.SEARCH_MODES:
+            raise ValueError(f'search_mode must be one of {", ".join(search.SEARCH_MODES)}')
+        if search_mode == 'text':
+            query.update(search.text_filter(search_text))
+        elif search_mode == 'regex':
+            query.update(search.regex_filter(search_text))
+        else:
+            query.update(search.prefix_filter(search_text) or search.regex_filter(search_text))
     
     # Check if field exists
-    has_field = request.args.get('has_field')
+    has_field = args.get('has_field')
     if has_field:
         query[has_field] = {'$exists': True}
     
-    # Build cursor with sort, limit, skip
-    cursor = db.Produits.find(query)
-    
-    # Sorting
-    sort_field = request.args.get('sort', 'nom')
+    return query
+
+def parse_sort(args, default='nom'):
+    """Parse the sort param ('field' or '-field') into (field, order)."""
+    sort_field = args.get('sort', default)
     sort_order = 1
     if sort_field.startswith('-'):
         sort_field = sort_field[1:]
         sort_order = -1
-    cursor = cursor.sort(sort_field, sort_order)
-    
-    # Pagination
-    limit = request.args.get('limit', type=int)
-    skip = request.args.get('skip', type=int, default=0)
-    
+    return sort_field, sort_order
+
+# --- Keyset (cursor) pagination ---
+# A continuation token stores the sort key and _id of the last document
+# returned, so the next page is an index range scan instead of a skip.
+
+DEFAULT_PAGE_SIZE = 20
+
+def encode_cursor(sort_field, sort_order, last_doc):
+    """Build an opaque continuation token from the last document of a page."""
+    payload = {
+        's': sort_field,
+        'o': sort_order,
+        'v': last_doc.get(sort_field),
+        'id': last_doc['_id']
+    }
+    raw = json_util.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decode a continuation token. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json_util.loads(raw.decode('utf-8'))
+        return payload['s'], payload['o'], payload['v'], payload['id']
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def keyset_filter(sort_field, sort_order, last_value, last_id):
+    """
+    Filter matching documents strictly after (last_value, last_id)
+    for the sort [(sort_field, sort_order), ('_id', sort_order)].
+    """
+    op = '$gt' if sort_order == 1 else '$lt'
+    if sort_field == '_id':
+        return {'_id': {op: last_id}}
+    if last_value is None:
+        # Missing/null values sort first ascending, last descending
+        tie = {sort_field: None, '_id': {op: last_id}}
+        if sort_order == 1:
+            return {'$or': [tie, {sort_field: {'$ne': None}}]}
+        return tie
+    branches = [
+        {sort_field: {op: last_value}},
+        {sort_field: last_value, '_id': {op: last_id}}
+    ]
+    if sort_order == -1:
+        branches.append({sort_field: None})
+    return {'$or': branches}
+
+# --- Listing totals ---
+# total=exact counts the filter (cached briefly per normalized filter),
+# total=estimate uses collection metadata when there is no filter,
+# total=none skips counting.
+
+TOTAL_MODES = ('exact', 'estimate', 'none')
+count_cache = TTLCache(
+    maxsize=int(os.environ.get('COUNT_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('COUNT_CACHE_TTL', 10))
+)
+
+def count_products(db, query, total_mode):
+    """Count products matching query according to total_mode."""
+    if total_mode == 'none':
+        return None
+    if total_mode == 'estimate' and not query:
+        return db.Produits.estimated_document_count()
+    return count_cache.get_or_compute(
+        make_key(query),
+        lambda: db.Produits.count_documents(query)
+    )
+
+# Internal fields never returned by the product read endpoints
+PRODUCT_INTERNAL_FIELDS = [search.TOKENS_FIELD]
+PRODUCT_PROJECTION = {field: 0 for field in PRODUCT_INTERNAL_FIELDS}
+
+# Allowlists of ?fields= (fields.py): field -> None, or the allowlist of its sub-documents
+PRODUCT_FIELDS = dict.fromkeys(['_id', 'nom', 'prix', 'stock', 'categorie', 'tags', 'promotion', 'derniere_modification'])
+CLIENT_FIELDS = dict.fromkeys(['_id', 'nom', 'prenom', 'email', 'ville'])
+EMBEDDED_ORDER_FIELDS = {
+    **dict.fromkeys(['_id', 'client_nom', 'date_commande', 'statut', 'total']),
+    'produits': dict.fromkeys(['produit_id', 'nom', 'prix', 'quantite', 'categorie'])
+}
+LINKED_ORDER_FIELDS = {
+    **dict.fromkeys(['_id', 'client_id', 'date_commande', 'statut']),
+    'produits': dict.fromkeys(['produit_id', 'quantite']),
+    'produits_details': PRODUCT_FIELDS,
+    'client_details': CLIENT_FIELDS
+}
+
+def products_facet_pipeline(query, page_query, sort_spec, skip, limit, projection):
+    """$facet aggregation returning one page and the exact total."""
+    page_stages = []
+    if page_query is not query:
+        page_stages.append({'$match': page_query})
+    page_stages.append({'$sort': dict(sort_spec)})
+    if skip:
+        page_stages.append({'$skip': skip})
+    if limit:
+        page_stages.append({'$limit': limit})
+    if projection:
+        page_stages.append({'$project': projection})
+    return [
+        {'$match': query},
+        {'$facet': {
+            'data': page_stages,
+            'total': [{'$count': 'n'}]
+        }}
+    ]
+
+def fetch_products_page(db, query, page_query, sort_spec, skip, limit, total_mode, use_facet,
+                        projection=PRODUCT_PROJECTION):
+    """
+    Return (products, total) for one page.
+    With use_facet, page and exact total come back in a single $facet
+    aggregation unless the total is already cached.
+    """
+    count_key = make_key(query)
+    if use_facet and total_mode == 'exact' and count_cache.get(count_key) is None:
+        pipeline = products_facet_pipeline(query, page_query, sort_spec, skip, limit, projection)
+        result = next(db.Produits.aggregate(pipeline))
+        total = result['total'][0]['n'] if result['total'] else 0
+        count_cache.set(count_key, total)
+        return result['data'], total
+    
+    cursor = db.Produits.find(page_query, projection).sort(sort_spec)
     if skip:
         cursor = cursor.skip(skip)
     if limit:
         cursor = cursor.limit(limit)
+    return list(cursor), count_products(db, query, total_mode)
+
+# Query shapes of get_products, for the index advisor
+query_shapes = index_advisor.QueryShapeRecorder()
+
+# --- Stats cache ---
+# /api/stats/* results are read through a small TTL cache and dropped by
+# the product and embedded-order write endpoints.
+
+stats_cache = TTLCache(
+    maxsize=int(os.environ.get('STATS_CACHE_SIZE', 64)),
+    ttl=float(os.environ.get('STATS_CACHE_TTL', 60))
+)
+
+# Search-as-you-type index (autocomplete.py), kept current by product writes
+suggestions = autocomplete.SuggestIndex()
+SUGGEST_MAX_LIMIT = 50
+
+def invalidate_product_caches():
+    """Drop cached results derived from Produits after a write."""
+    count_cache.clear()
+    stats_cache.clear()
+    product_dimension.clear()
+    bump_versions('Produits')
+
+def invalidate_stock_caches(product_ids):
+    """Drop cached results showing the stock of these products (order reservations)."""
+    # Listing totals too: min_stock filters on stock
+    count_cache.clear()
+    stats_cache.clear()
+    product_dimension.discard(product_ids)
+    bump_versions('Produits')
+
+def invalidate_order_caches():
+    """Drop cached results derived from CommandesEmbedding after a write."""
+    stats_cache.clear()
+    bump_versions('CommandesEmbedding')
+
+def plan_products_request(args):
+    """
+    Turn the query params of GET /api/products into the query to run.
+    Raises ValueError on invalid params.
+    """
+    # Build query filter
+    query = build_product_query(args)
+    sort_field, sort_order = parse_sort(args)
+    limit = args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        raise ValueError('limit must be positive')
+    keyset = 'cursor' in args
+    
+    projection = fields.parse_fields(args.get('fields'), PRODUCT_FIELDS, PRODUCT_INTERNAL_FIELDS)
+    dropped = []
+    if keyset:
+        # The next cursor is built from the sort key and _id of the last product
+        projection, dropped = fields.ensure_fields(projection, [sort_field, '_id'])
+    
+    # Text search is ranked by relevance unless a sort is requested
+    ranked = '$text' in query and 'sort' not in args
+    if '$text' in query:
+        projection = {**projection, 'score': {'$meta': 'textScore'}}
+    if ranked and keyset:
+        raise ValueError('cursor pagination requires an explicit sort with search_mode=text')
+    
+    total_mode = args.get('total', 'exact')
+    if total_mode not in TOTAL_MODES:
+        raise ValueError(f'total must be one of {", ".join(TOTAL_MODES)}')
+    # The page comes back inside one $facet document (16 MB max): without
+    # a limit, the page is fetched with find and counted separately
+    use_facet = args.get('facet', '').lower() in ('1', 'true', 'yes') and (limit is not None or keyset)
+    
+    sort_spec = [(sort_field, sort_order)]
+    if ranked:
+        sort_spec = [('score', {'$meta': 'textScore'})]
+    elif keyset and sort_field != '_id':
+        sort_spec.append(('_id', sort_order))
+    
+    plan = {
+        'query': query,
+        'page_query': query,
+        'sort_field': sort_field,
+        'sort_order': sort_order,
+        'sort_spec': sort_spec,
+        'projection': projection,
+        'dropped': dropped,
+        'total_mode': total_mode,
+        'use_facet': use_facet,
+        'keyset': keyset,
+        'skip': 0,
+        'limit': limit,
+        'fetch_limit': limit
+    }
     
-    products = list(cursor)
-    
-    # Get total count for pagination
-    total = db.Produits.count_documents(query)
-    
-    return jsonify({
+    # Keyset pagination: constant cost whatever the page depth
+    if keyset:
+        plan['limit'] = limit or DEFAULT_PAGE_SIZE
+        # Fetch one extra document to know if another page exists
+        plan['fetch_limit'] = plan['limit'] + 1
+        token = args.get('cursor')
+        if token:
+            token_field, token_order, last_value, last_id = decode_cursor(token)
+            if (token_field, token_order) != (sort_field, sort_order):
+                raise ValueError('Cursor does not match sort')
+            after = keyset_filter(sort_field, sort_order, last_value, last_id)
+            plan['page_query'] = {'$and': [query, after]} if query else after
+    else:
+        # Legacy pagination with skip/limit
+        plan['skip'] = args.get('skip', type=int, default=0)
+    return plan
+
+def products_response(plan, products, total):
+    """Response body of GET /api/products for a fetched page."""
+    if plan['keyset']:
+        limit = plan['limit']
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = encode_cursor(plan['sort_field'], plan['sort_order'], products[-1])
+        fields.strip_fields(products, plan['dropped'])
+        return {
+            'success': True,
+            'data': products,
+            'total': total,
+            'limit': limit,
+            'next_cursor': next_cursor
+        }
+    return {
         'success': True,
-        'data': serialize_doc(products),
+        'data': products,
         'total': total,
-        'skip': skip,
-        'limit': limit
-    })
+        'skip': plan['skip'],
+        'limit': plan['limit']
+    }
+
+@app.route('/api/products', methods=['GET'])
+def get_products():
+    """
+    Get all products with optional filters, sort, limit, skip.
+    Query params: 
+      - categorie: filter by category
+      - min_prix: minimum price ($gte)
+      - max_prix: maximum price ($lte)
+      - search: search on nom
+      - search_mode: prefix (default, word prefixes), text (ranked) or regex (literal substring)
+      - sort: field to sort by (prefix with - for descending)
+      - limit: number of results
+      - skip: number to skip (legacy pagination)
+      - cursor: continuation token (keyset pagination). Pass an empty
+        value for the first page, then the returned next_cursor.
+      - total: exact (default), estimate or none
+      - facet: if true, fetch page and total in one aggregation (needs limit or cursor)
+      - fields: nom,prix,stock (only these) or -tags,-promotion (all but these)
+    Conditional: ETag from the Produits version, 304 on If-None-Match.
+    """
+    db = get_db()
+    try:
+        plan = plan_products_request(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    etag = versions.collection_etag(db, 'Produits')
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    # Feed the index advisor (see /api/indexes/advise)
+    query_shapes.record(plan['query'], plan['sort_spec'])
+    
+    products, total = fetch_products_page(
+        db, plan['query'], plan['page_query'], plan['sort_spec'], plan['skip'],
+        plan['fetch_limit'], plan['total_mode'], plan['use_facet'], plan['projection']
+    )
+    return tag_response(jsonify(products_response(plan, products, total)), etag)
+
+@app.route('/api/products/suggest', methods=['GET'])
+def suggest_products():
+    """
+    Autocomplete on nom, tags and categorie, served from memory.
+    Query params:
+      - q: text typed so far (accents and case ignored)
+      - limit: number of suggestions (default 10, max 50)
+    Falls back to a word-prefix query on the database while the index is
+    being built or if it exceeds SUGGEST_MAX_PRODUCTS.
+    """
+    q = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', type=int, default=10), 1), SUGGEST_MAX_LIMIT)
+    
+    db = get_db()
+    suggestions.ensure_built(db)
+    if suggestions.ready and not suggestions.truncated:
+        return jsonify({'success': True, 'data': suggestions.suggest(q, limit), 'source': 'memory'})
+    
+    query = search.prefix_filter(q)
+    data = []
+    if query is not None:
+        data = list(db.Produits.find(query, {'nom': 1, 'categorie': 1, 'prix': 1}).sort('nom', 1).limit(limit))
+    return jsonify({'success': True, 'data': data, 'source': 'database'})
+
+@app.route('/api/products/suggest/stats', methods=['GET'])
+def suggest_stats():
+    """Size and freshness of the autocomplete index."""
+    return jsonify({'success': True, 'data': suggestions.stats()})
 
 @app.route('/api/products/<product_id>', methods=['GET'])
 def get_product(product_id):
-    """Get a single product by ID."""
+    """
+    Get a single product by ID. Query params: fields (as GET /api/products)
+    Tagged with its derniere_modification (If-None-Match, If-Match on PUT).
+    """
     db = get_db()
     try:
-        product = db.Produits.find_one({'_id': ObjectId(product_id)})
+        projection, dropped = product_projection(request.args)
+        product = db.Produits.find_one({'_id': ObjectId(product_id)}, projection)
         if product:
-            return jsonify({'success': True, 'data': serialize_doc(product)})
+            return product_response(product, dropped)
         return jsonify({'success': False, 'error': 'Product not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@app.route('/api/products', methods=['POST'])
-def create_product():
-    """Create a new product."""
-    db = get_db()
-    data = request.get_json()
+def product_projection(args):
+    """
+    Projection of GET /api/products/<id> for ?fields= (the ETag fields are
+    always read) and the fields to drop afterwards. Raises ValueError.
+    """
+    projection = fields.parse_fields(args.get('fields'), PRODUCT_FIELDS, PRODUCT_INTERNAL_FIELDS)
+    return fields.ensure_fields(projection, ['_id', 'derniere_modification'])
+
+def product_response(product, dropped=()):
+    """JSON response tagged with the product's ETag (304 if If-None-Match matches)."""
+    etag = versions.document_etag(product)
+    fields.strip_fields([product], dropped)
+    body = {'success': True, 'data': product}
+    if etag is None:
+        return jsonify(body)
+    return not_modified(etag) or tag_response(jsonify(body), etag)
+
+PRODUCT_REQUIRED_FIELDS = ['nom', 'prix', 'stock', 'categorie']
+
+# Every product write sets derniere_modification (the product ETag)
+STAMP = {'$currentDate': {'derniere_modification': True}}
+
+def build_product(data):
+    """Validate a product payload and return the document to store. Raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError('Product must be a JSON object')
     
     # Validate required fields
-    required = ['nom', 'prix', 'stock', 'categorie']
-    for field in required:
+    for field in PRODUCT_REQUIRED_FIELDS:
         if field not in data:
-            return jsonify({'success': False, 'error': f'Missing field: {field}'}), 400
+            raise ValueError(f'Missing field: {field}')
     
-    # Insert product
-    product = {
-        'nom': data['nom'],
-        'prix': float(data['prix']),
-        'stock': int(data['stock']),
-        'categorie': data['categorie']
-    }
+    try:
+        product = {
+            'nom': data['nom'],
+            'prix': float(data['prix']),
+            'stock': int(data['stock']),
+            'categorie': data['categorie']
+        }
+    except (TypeError, ValueError):
+        raise ValueError('prix must be a number and stock an integer')
     
     # Add optional fields
     if 'tags' in data:
         product['tags'] = data['tags']
-    
-    result = db.Produits.insert_one(product)
-    product['_id'] = str(result.inserted_id)
-    
-    return jsonify({'success': True, 'data': product, 'message': 'Product created successfully'}), 201
+    return product
 
-@app.route('/api/products/<product_id>', methods=['PUT'])
-def update_product(product_id):
-    """
-    Update a product. Supports various update operators.
-    Body can contain:
-      - Direct fields to update (uses $set)
-      - $set, $unset, $rename, $currentDate operators
-      - Array operators: $push, $addToSet, $pull, $pop
-    """
+@app.route('/api/products', methods=['POST'])
+def create_product():
+    """Create a new product."""
     db = get_db()
     data = request.get_json()
     
     try:
-        object_id = ObjectId(product_id)
-    except:
-        return jsonify({'success': False, 'error': 'Invalid product ID'}), 400
+        product = build_product(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    # Check if product exists
-    existing = db.Produits.find_one({'_id': object_id})
-    if not existing:
-        return jsonify({'success': False, 'error': 'Product not found'}), 404
+    # Products are always stamped: derniere_modification is their ETag
+    product['derniere_modification'] = versions.modification_stamp()
+    result = db.Produits.insert_one({**product, search.TOKENS_FIELD: search.search_tokens(product['nom'])})
+    invalidate_product_caches()
+    suggestions.add({**product, '_id': result.inserted_id})
+    product['_id'] = str(result.inserted_id)
     
-    # Build update document
+    return jsonify({'success': True, 'data': product, 'message': 'Product created successfully'}), 201
+
+def touches_field(update, field):
+    """True if an update document can change the given top-level field."""
+    for op, spec in update.items():
+        if not isinstance(spec, dict):
+            continue
+        for key, value in spec.items():
+            if key.split('.')[0] == field:
+                return True
+            if op == '$rename' and isinstance(value, str) and value.split('.')[0] == field:
+                return True
+    return False
+
+PRODUCT_UPDATE_OPERATORS = ['$set', '$unset', '$rename', '$currentDate', '$push', '$addToSet', '$pull', '$pop']
+
+def build_product_update(data):
+    """Build the update document of update_product from a request payload."""
     update = {}
     
     # Handle explicit operators
-    operators = ['$set', '$unset', '$rename', '$currentDate', '$push', '$addToSet', '$pull', '$pop']
-    for op in operators:
+    for op in PRODUCT_UPDATE_OPERATORS:
         if op in data:
             update[op] = data[op]
     
@@ -254,30 +770,221 @@ def update_product(product_id):
         update['$currentDate'] = {}
     update['$currentDate']['derniere_modification'] = True
     
-    result = db.Produits.update_one({'_id': object_id}, update)
+    # Keep the search tokens in sync with the new name, in the same write
+    # when the new name is known up front
+    set_fields = update.get('$set')
+    new_nom = set_fields.get('nom') if isinstance(set_fields, dict) else None
+    if isinstance(new_nom, str):
+        update['$set'] = {**set_fields, search.TOKENS_FIELD: search.search_tokens(new_nom)}
+    return update
+
+def tokens_outdated(update):
+    """True if an update changes nom without setting the search tokens ($rename, $unset)."""
+    set_fields = update.get('$set')
+    return touches_field(update, 'nom') and not (isinstance(set_fields, dict) and search.TOKENS_FIELD in set_fields)
+
+@app.route('/api/products/<product_id>', methods=['PUT'])
+def update_product(product_id):
+    """
+    Update a product. Supports various update operators.
+    Body can contain:
+      - Direct fields to update (uses $set)
+      - $set, $unset, $rename, $currentDate operators
+      - Array operators: $push, $addToSet, $pull, $pop
+    If-Match (ETag of GET /api/products/<id>): the update only applies if
+    the product has not changed since, otherwise 412.
+    """
+    db = get_db()
+    data = request.get_json()
     
-    if result.modified_count > 0:
-        updated = db.Produits.find_one({'_id': object_id})
-        return jsonify({
-            'success': True, 
-            'data': serialize_doc(updated),
-            'message': 'Product updated successfully'
-        })
+    try:
+        object_id = ObjectId(product_id)
+    except:
+        return jsonify({'success': False, 'error': 'Invalid product ID'}), 400
+    
+    # Optimistic concurrency: If-Match becomes part of the update filter.
+    # Weak tags are accepted: compression weakens the ETag of a response.
+    condition = None
+    if request.if_match and not request.if_match.star_tag:
+        condition = versions.revision_filter(object_id, request.if_match.as_set(include_weak=True))
+        if condition is None:
+            return jsonify({'success': False, 'error': 'Product was modified (If-Match)'}), 412
+    
+    update = build_product_update(data)
+    updated = mutate_one(db.Produits, object_id, update, PRODUCT_PROJECTION, condition)
+    if updated is None:
+        if condition is not None and db.Produits.count_documents({'_id': object_id}, limit=1):
+            return jsonify({'success': False, 'error': 'Product was modified (If-Match)'}), 412
+        return jsonify({'success': False, 'error': 'Product not found'}), 404
     
-    return jsonify({'success': True, 'message': 'No changes made'})
+    invalidate_product_caches()
+    if tokens_outdated(update):
+        # $rename / $unset of nom: tokens depend on the post-image
+        db.Produits.update_one(
+            {'_id': object_id},
+            {'$set': {search.TOKENS_FIELD: search.search_tokens(updated.get('nom'))}}
+        )
+    suggestions.add(updated)
+    response = jsonify({
+        'success': True, 
+        'data': updated,
+        'message': 'Product updated successfully'
+    })
+    etag = versions.document_etag(updated)
+    return tag_response(response, etag) if etag else response
 
 @app.route('/api/products/<product_id>', methods=['DELETE'])
 def delete_product(product_id):
     """Delete a product."""
     db = get_db()
     try:
-        result = db.Produits.delete_one({'_id': ObjectId(product_id)})
+        object_id = ObjectId(product_id)
+        result = db.Produits.delete_one({'_id': object_id})
         if result.deleted_count > 0:
+            invalidate_product_caches()
+            suggestions.remove(object_id)
             return jsonify({'success': True, 'message': 'Product deleted successfully'})
         return jsonify({'success': False, 'error': 'Product not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+# --- Bulk writes ---
+
+BULK_OPERATIONS = ('insert', 'upsert', 'update', 'delete')
+BULK_MAX_OPERATIONS = int(os.environ.get('BULK_MAX_OPERATIONS', 50000))
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+
+def build_bulk_request(item):
+    """
+    Validate one bulk item and return (write model, product _id or None,
+    whether search tokens must be recomputed afterwards).
+    Raises ValueError or InvalidId.
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Operation must be a JSON object')
+    op = item.get('op')
+    if op not in BULK_OPERATIONS:
+        raise ValueError(f'op must be one of {", ".join(BULK_OPERATIONS)}')
+    
+    if op == 'insert':
+        product = build_product(item.get('document'))
+        product['_id'] = ObjectId()
+        product['derniere_modification'] = versions.modification_stamp()
+        product[search.TOKENS_FIELD] = search.search_tokens(product['nom'])
+        return InsertOne(product), product['_id'], False
+    
+    # Other operations are matched on _id (nom is not unique)
+    if not item.get('_id'):
+        raise ValueError('_id required')
+    object_id = ObjectId(item['_id'])
+    if op == 'upsert':
+        product = build_product(item.get('document'))
+        product[search.TOKENS_FIELD] = search.search_tokens(product['nom'])
+        update = {'$set': product, '$currentDate': {'derniere_modification': True}}
+        return UpdateOne({'_id': object_id}, update, upsert=True), object_id, False
+    
+    if op == 'delete':
+        return DeleteOne({'_id': object_id}), object_id, False
+    
+    if not isinstance(item.get('update'), dict) or not item['update']:
+        raise ValueError('update must be a non-empty object')
+    update = build_product_update(dict(item['update']))
+    return UpdateOne({'_id': object_id}, update), object_id, tokens_outdated(update)
+
+@app.route('/api/products/bulk', methods=['POST'])
+def bulk_products():
+    """
+    Apply many product writes with chunked, unordered bulk_write calls.
+    Body: { "operations": [
+        {"op": "insert", "document": {...}},
+        {"op": "upsert", "_id": "...", "document": {...}},
+        {"op": "update", "_id": "...", "update": {...}},     (same body as PUT /api/products/<id>)
+        {"op": "delete", "_id": "..."}
+    ] }
+    Documents are validated like POST /api/products. Each item gets a result
+    ('ok' or 'error' with a message); one failure does not stop the others.
+    An update or delete of an unknown _id is an error with reason 'not_found'.
+    """
+    db = get_db()
+    data = request.get_json()
+    items = data.get('operations') if isinstance(data, dict) else None
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'operations must be a non-empty list'}), 400
+    if len(items) > BULK_MAX_OPERATIONS:
+        return jsonify({'success': False, 'error': f'At most {BULK_MAX_OPERATIONS} operations per request'}), 400
+    
+    # Validate everything first; invalid items are reported, never sent
+    results = []
+    pending = []
+    retokenize = []
+    for index, item in enumerate(items):
+        try:
+            write, object_id, outdated = build_bulk_request(item)
+        except (ValueError, InvalidId) as e:
+            results.append({'index': index, 'status': 'error', 'error': str(e)})
+            continue
+        result = {'index': index, 'op': item['op'], 'status': 'ok'}
+        if object_id is not None:
+            result['_id'] = object_id
+        results.append(result)
+        pending.append((index, write))
+        if outdated:
+            retokenize.append(object_id)
+    
+    # Updates and deletes of unknown products are reported, not sent
+    targets = {results[index]['_id'] for index, _ in pending if items[index]['op'] in ('update', 'delete')}
+    if targets:
+        existing = {doc['_id'] for doc in db.Produits.find({'_id': {'$in': list(targets)}}, {'_id': 1})}
+        missing = targets - existing
+        if missing:
+            for index, _ in pending:
+                result = results[index]
+                if result['op'] in ('update', 'delete') and result['_id'] in missing:
+                    result.update({'status': 'error', 'error': 'Product not found', 'reason': 'not_found'})
+            pending = [(index, write) for index, write in pending if results[index]['status'] == 'ok']
+            retokenize = [object_id for object_id in retokenize if object_id not in missing]
+    
+    summary = {'inserted': 0, 'upserted': 0, 'matched': 0, 'modified': 0, 'deleted': 0}
+    for start in range(0, len(pending), BULK_CHUNK_SIZE):
+        chunk = pending[start:start + BULK_CHUNK_SIZE]
+        try:
+            details = db.Produits.bulk_write([write for _, write in chunk], ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for error in details.get('writeErrors', []):
+                result = results[chunk[error['index']][0]]
+                result['status'] = 'error'
+                result['error'] = error.get('errmsg')
+        summary['inserted'] += details.get('nInserted', 0)
+        summary['upserted'] += details.get('nUpserted', 0)
+        summary['matched'] += details.get('nMatched', 0)
+        summary['modified'] += details.get('nModified', 0)
+        summary['deleted'] += details.get('nRemoved', 0)
+    
+    if pending:
+        invalidate_product_caches()
+        suggestions.mark_stale()
+    if retokenize:
+        # $rename / $unset of nom: recompute tokens from the stored names
+        search.backfill_search_tokens(db, {'_id': {'$in': retokenize}})
+    
+    summary['errors'] = sum(1 for result in results if result['status'] == 'error')
+    return jsonify({
+        'success': summary['errors'] == 0,
+        'data': results,
+        'summary': summary
+    })
+
+@app.route('/api/products/batch-get', methods=['POST'])
+def batch_get_products():
+    """
+    Get many products by ID with one $in query.
+    Body: { "ids": ["...", ...], "fields": "nom,prix" }  (fields optional, as GET /api/products)
+    data keeps the order of ids (null where missing); missing lists unknown ids.
+    """
+    return batch_get(get_db().Produits, PRODUCT_FIELDS, PRODUCT_INTERNAL_FIELDS)
+
 # ============================================================
 # API ROUTES - PRODUCTS ARRAY OPERATIONS
 # ============================================================
@@ -295,15 +1002,14 @@ def add_tag(product_id):
     
     try:
         operator = '$addToSet' if unique_only else '$push'
-        result = db.Produits.update_one(
-            {'_id': ObjectId(product_id)},
-            {operator: {'tags': tag}}
-        )
-        
-        updated = db.Produits.find_one({'_id': ObjectId(product_id)})
+        updated = mutate_one(db.Produits, ObjectId(product_id), {operator: {'tags': tag}, **STAMP}, PRODUCT_PROJECTION)
+        if updated is None:
+            return jsonify({'success': False, 'error': 'Product not found'}), 404
+        invalidate_product_caches()
+        suggestions.add(updated)
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': f'Tag added using {operator}'
         })
     except Exception as e:
@@ -320,15 +1026,14 @@ def remove_tag(product_id):
         return jsonify({'success': False, 'error': 'Tag is required'}), 400
     
     try:
-        result = db.Produits.update_one(
-            {'_id': ObjectId(product_id)},
-            {'$pull': {'tags': tag}}
-        )
-        
-        updated = db.Produits.find_one({'_id': ObjectId(product_id)})
+        updated = mutate_one(db.Produits, ObjectId(product_id), {'$pull': {'tags': tag}, **STAMP}, PRODUCT_PROJECTION)
+        if updated is None:
+            return jsonify({'success': False, 'error': 'Product not found'}), 404
+        invalidate_product_caches()
+        suggestions.add(updated)
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': 'Tag removed using $pull'
         })
     except Exception as e:
@@ -343,15 +1048,14 @@ def pop_tag(product_id):
     
     try:
         pop_value = 1 if position == 'last' else -1
-        result = db.Produits.update_one(
-            {'_id': ObjectId(product_id)},
-            {'$pop': {'tags': pop_value}}
-        )
-        
-        updated = db.Produits.find_one({'_id': ObjectId(product_id)})
+        updated = mutate_one(db.Produits, ObjectId(product_id), {'$pop': {'tags': pop_value}, **STAMP}, PRODUCT_PROJECTION)
+        if updated is None:
+            return jsonify({'success': False, 'error': 'Product not found'}), 404
+        invalidate_product_caches()
+        suggestions.add(updated)
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': f'Removed {position} tag using $pop'
         })
     except Exception as e:
@@ -363,44 +1067,122 @@ def pop_tag(product_id):
 
 @app.route('/api/orders/embedding', methods=['GET'])
 def get_orders_embedding():
-    """Get all orders with embedded products."""
-    db = get_db()
-    orders = list(db.CommandesEmbedding.find())
-    return jsonify({'success': True, 'data': serialize_doc(orders)})
-
-@app.route('/api/orders/embedding', methods=['POST'])
-def create_order_embedding():
-    """Create order with embedded products."""
+    """
+    Get all orders with embedded products.
+    Query params: stream (ndjson|json), batch_size, fields (e.g. statut,total,produits.nom)
+    """
     db = get_db()
-    data = request.get_json()
-    
-    # Validate
-    if 'client_nom' not in data or 'produits' not in data:
-        return jsonify({'success': False, 'error': 'client_nom and produits required'}), 400
+    try:
+        stream_format, batch_size = get_stream_options(request.args)
+        projection = fields.parse_fields(request.args.get('fields'), EMBEDDED_ORDER_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    etag = versions.collection_etag(db, 'CommandesEmbedding')
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    if stream_format:
+        cursor = db.CommandesEmbedding.find({}, projection).batch_size(batch_size)
+        return tag_response(stream_response(cursor, stream_format, batch_size), etag)
+    
+    orders = list(db.CommandesEmbedding.find({}, projection))
+    return tag_response(jsonify({'success': True, 'data': orders}), etag)
+
+def build_embedded_order(data):
+    """
+    Validate an embedded order payload and return the document to store.
+    Lines still need order_lines.snapshot_lines. Raises ValueError.
+    """
+    if not isinstance(data, dict) or 'client_nom' not in data or 'produits' not in data:
+        raise ValueError('client_nom and produits required')
+    if not isinstance(data['produits'], list) or not all(isinstance(p, dict) for p in data['produits']):
+        raise ValueError('produits must be a list of objects')
     
     # Calculate total
-    total = sum(p.get('prix', 0) * p.get('quantite', 1) for p in data['produits'])
+    try:
+        total = order_lines.order_total(data['produits'])
+    except TypeError:
+        raise ValueError('prix and quantite must be numbers')
     
-    order = {
+    return {
         'client_nom': data['client_nom'],
         'date_commande': datetime.now(),
         'statut': data.get('statut', 'En cours'),
         'produits': data['produits'],
         'total': total
     }
+
+# --- Stock reservation (stock.py) ---
+# Creating an order takes its quantities off Produits.stock with
+# conditional decrements (in a transaction when the deployment has them);
+# an unknown or short product rejects the whole order (409) with the
+# shortfall of each product.
+
+def reserve_stock(db, lines):
+    """
+    Reserve the stock of order lines.
+    Returns (reserved quantities, None) or (None, error response: 400 or 409).
+    """
+    try:
+        return stock.reserve(db, lines), None
+    except ValueError as e:
+        return None, (jsonify({'success': False, 'error': str(e)}), 400)
+    except stock.StockShortfall as e:
+        # Decrements given back still changed stock and derniere_modification
+        if e.released:
+            invalidate_stock_caches(e.released)
+        return None, (jsonify({'success': False, 'error': str(e), 'shortfalls': e.shortfalls}), 409)
+
+def insert_reserved_order(db, collection, order, reserved):
+    """insert_one for an order whose stock is reserved (given back if the insert fails)."""
+    try:
+        result = collection.insert_one(order)
+    except Exception:
+        stock.release(db, reserved)
+        if reserved:
+            invalidate_stock_caches(list(reserved))
+        raise
+    if reserved:
+        invalidate_stock_caches(list(reserved))
+    return result
+
+@app.route('/api/orders/embedding', methods=['POST'])
+def create_order_embedding():
+    """
+    Create order with embedded products.
+    Reserves the stock of lines with a product (409 with shortfalls if short).
+    """
+    db = get_db()
+    data = request.get_json()
+    
+    try:
+        order = build_embedded_order(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    result = db.CommandesEmbedding.insert_one(order)
+    # Snapshot produit_id and categorie of each line (stats group on them)
+    try:
+        order_lines.snapshot_lines(db, order['produits'])
+    except InvalidId:
+        return jsonify({'success': False, 'error': 'Invalid produit_id'}), 400
+    
+    reserved, error = reserve_stock(db, order['produits'])
+    if error:
+        return error
+    result = insert_reserved_order(db, db.CommandesEmbedding, order, reserved)
     order['_id'] = str(result.inserted_id)
+    sales_stats.apply_sales_deltas(db, order['produits'])
+    invalidate_order_caches()
     
     return jsonify({
         'success': True,
-        'data': serialize_doc(order),
+        'data': order,
         'message': 'Embedded order created'
     }), 201
 
 @app.route('/api/orders/embedding/<order_id>/products', methods=['POST'])
 def add_product_to_embedding(order_id):
-    """Add product to embedded order using $push."""
+    """Add product to embedded order (pipeline update: append, then recompute total)."""
     db = get_db()
     data = request.get_json()
     
@@ -412,21 +1194,22 @@ def add_product_to_embedding(order_id):
         'prix': float(data['prix']),
         'quantite': int(data.get('quantite', 1))
     }
+    if data.get('produit_id'):
+        product['produit_id'] = data['produit_id']
     
     try:
-        # Add product and update total
-        db.CommandesEmbedding.update_one(
-            {'_id': ObjectId(order_id)},
-            {
-                '$push': {'produits': product},
-                '$inc': {'total': product['prix'] * product['quantite']}
-            }
-        )
+        order_lines.snapshot_lines(db, [product])
+        
+        # Add product and recompute total from the lines, atomically
+        updated = mutate_one(db.CommandesEmbedding, ObjectId(order_id), order_lines.push_line_update(product))
+        if updated is None:
+            return jsonify({'success': False, 'error': 'Order not found'}), 404
+        sales_stats.apply_sales_deltas(db, [product])
+        invalidate_order_caches()
         
-        updated = db.CommandesEmbedding.find_one({'_id': ObjectId(order_id)})
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': 'Product added to order'
         })
     except Exception as e:
@@ -434,43 +1217,45 @@ def add_product_to_embedding(order_id):
 
 @app.route('/api/orders/embedding/<order_id>/products', methods=['DELETE'])
 def remove_product_from_embedding(order_id):
-    """Remove product from embedded order using $pull."""
+    """
+    Remove product from embedded order (every line with this nom) and
+    recompute the total, in one pipeline update.
+    """
     db = get_db()
     data = request.get_json()
     product_nom = data.get('nom')
     
-    if not product_nom:
+    if not product_nom or not isinstance(product_nom, str):
         return jsonify({'success': False, 'error': 'Product nom required'}), 400
     
     try:
-        # Get order to calculate total reduction
-        order = db.CommandesEmbedding.find_one({'_id': ObjectId(order_id)})
-        if not order:
-            return jsonify({'success': False, 'error': 'Order not found'}), 404
-        
-        # Find product to remove
-        product_to_remove = next((p for p in order['produits'] if p['nom'] == product_nom), None)
-        if not product_to_remove:
-            return jsonify({'success': False, 'error': 'Product not in order'}), 404
-        
-        reduction = product_to_remove['prix'] * product_to_remove['quantite']
-        
-        db.CommandesEmbedding.update_one(
-            {'_id': ObjectId(order_id)},
-            {
-                '$pull': {'produits': {'nom': product_nom}},
-                '$inc': {'total': -reduction}
-            }
+        object_id = ObjectId(order_id)
+        # The pre-image tells which lines were removed (sales stats)
+        order = db.CommandesEmbedding.find_one_and_update(
+            {'_id': object_id, 'produits.nom': product_nom},
+            order_lines.pull_lines_update(product_nom),
+            return_document=ReturnDocument.BEFORE
         )
-        
-        updated = db.CommandesEmbedding.find_one({'_id': ObjectId(order_id)})
-        return jsonify({
-            'success': True,
-            'data': serialize_doc(updated),
-            'message': 'Product removed from order'
-        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
+    if order is None:
+        if db.CommandesEmbedding.count_documents({'_id': object_id}, limit=1):
+            return jsonify({'success': False, 'error': 'Product not in order'}), 404
+        return jsonify({'success': False, 'error': 'Order not found'}), 404
+    
+    # The lines are removed: past this point errors are not the client's
+    removed = [p for p in order['produits'] if p.get('nom') == product_nom]
+    sales_stats.apply_sales_deltas(db, removed, sign=-1)
+    invalidate_order_caches()
+    
+    # Post-image: the same filter applied to the pre-image
+    order['produits'] = [p for p in order['produits'] if p.get('nom') != product_nom]
+    order['total'] = order_lines.order_total(order['produits'])
+    return jsonify({
+        'success': True,
+        'data': order,
+        'message': 'Product removed from order'
+    })
 
 
 @app.route('/api/orders/embedding/<order_id>', methods=['DELETE'])
@@ -479,10 +1264,13 @@ def delete_order_embedding(order_id):
     db = get_db()
     
     try:
-        result = db.CommandesEmbedding.delete_one({'_id': ObjectId(order_id)})
+        # find_one_and_delete returns the lines to subtract from the stats
+        deleted = db.CommandesEmbedding.find_one_and_delete({'_id': ObjectId(order_id)})
         
-        if result.deleted_count == 0:
+        if deleted is None:
             return jsonify({'success': False, 'error': 'Order not found'}), 404
+        sales_stats.apply_sales_deltas(db, deleted.get('produits', []), sign=-1)
+        invalidate_order_caches()
         
         return jsonify({
             'success': True,
@@ -509,18 +1297,14 @@ def update_order_embedding(order_id):
         if not update_fields:
             return jsonify({'success': False, 'error': 'No fields to update'}), 400
         
-        result = db.CommandesEmbedding.update_one(
-            {'_id': ObjectId(order_id)},
-            {'$set': update_fields}
-        )
-        
-        if result.matched_count == 0:
+        updated = mutate_one(db.CommandesEmbedding, ObjectId(order_id), {'$set': update_fields})
+        if updated is None:
             return jsonify({'success': False, 'error': 'Order not found'}), 404
+        bump_versions('CommandesEmbedding')
         
-        updated = db.CommandesEmbedding.find_one({'_id': ObjectId(order_id)})
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': 'Embedded order updated'
         })
     except Exception as e:
@@ -530,64 +1314,241 @@ def update_order_embedding(order_id):
 # API ROUTES - ORDERS (LINKING)
 # ============================================================
 
+# Use $lookup to join products and clients:
+# (field of the order, collection, local field, allowlist, internal fields)
+LINKED_ORDER_JOINS = [
+    ('produits_details', 'Produits', 'produits.produit_id', PRODUCT_FIELDS, PRODUCT_INTERNAL_FIELDS),
+    ('client_details', 'Clients', 'client_id', CLIENT_FIELDS, [])
+]
+
+def lookup_stage(collection, local_field, as_field, projection=None):
+    """$lookup on _id, with the joined documents projected inside the join if given."""
+    stage = {'from': collection, 'localField': local_field, 'foreignField': '_id', 'as': as_field}
+    if projection:
+        # localField/foreignField together with a pipeline needs MongoDB 5.0+
+        stage['pipeline'] = [{'$project': projection}]
+    return {'$lookup': stage}
+
+def plan_linked_order_fields(value=None):
+    """
+    Split a fields= value of GET /api/orders/linking into the projection
+    of the orders themselves, whether it is an inclusion, and the joins to
+    run: [(join, projection of the joined documents or None for whole
+    documents)]. A join left out of the fields is not listed. Raises ValueError.
+    """
+    projection = fields.parse_fields(value, LINKED_ORDER_FIELDS) or {}
+    inclusion = fields.is_inclusion(projection)
+    joins = []
+    for join in LINKED_ORDER_JOINS:
+        as_field = join[0]
+        prefix = as_field + '.'
+        sub = {path[len(prefix):]: projection.pop(path) for path in list(projection) if path.startswith(prefix)}
+        if sub:
+            joins.append((join, sub))
+        elif projection.get(as_field) == 1 or (not inclusion and as_field not in projection):
+            joins.append((join, None))
+        projection.pop(as_field, None)
+    return projection, inclusion, joins
+
+def linked_orders_pipeline(value=None):
+    """
+    Aggregation of GET /api/orders/linking for a fields= value.
+    Sub-fields of a join (produits_details.nom) are projected inside its
+    $lookup; a join left out of the fields is not run at all.
+    Raises ValueError.
+    """
+    projection, inclusion, joins = plan_linked_order_fields(value)
+    pipeline = []
+    for (as_field, collection, local_field, allowed, internal), sub in joins:
+        prefix = as_field + '.'
+        if sub:
+            if inclusion:
+                projection[as_field] = 1
+            else:
+                sub.update({field: 0 for field in internal})
+            pipeline.append(lookup_stage(collection, local_field, as_field, sub))
+            continue
+        pipeline.append(lookup_stage(collection, local_field, as_field))
+        # Whole joined documents: internal fields are removed after the join
+        if inclusion and internal:
+            projection.update({f'{prefix}{field}': 1 for field in allowed})
+        elif inclusion:
+            projection[as_field] = 1
+        else:
+            projection.update({f'{prefix}{field}': 0 for field in internal})
+    if projection:
+        pipeline.append({'$project': projection})
+    return pipeline
+
+LINKED_ORDERS_COLLECTIONS = ('CommandesLinking', 'Produits', 'Clients')
+
+# --- Paginated reads with an application-side join (joins.py) ---
+# cursor=/limit= read pages of orders by _id and stitch in products and
+# clients from bounded in-process caches: only the misses of a page are
+# read, with one $in query per collection.
+
+JOIN_MODES = ('app', 'lookup')
+
+product_dimension = joins.DimensionCache('Produits', PRODUCT_PROJECTION)
+client_dimension = joins.DimensionCache('Clients')
+DIMENSIONS = {'Produits': product_dimension, 'Clients': client_dimension}
+
+def plan_linked_orders_request(args):
+    """
+    Turn the query params of GET /api/orders/linking into the reads to run.
+    Raises ValueError on invalid params.
+    """
+    stream_format, batch_size = get_stream_options(args)
+    paginated = 'cursor' in args or 'limit' in args
+    join = args.get('join', 'app' if paginated else 'lookup')
+    if join not in JOIN_MODES:
+        raise ValueError(f'join must be one of {", ".join(JOIN_MODES)}')
+    if stream_format and paginated:
+        raise ValueError('stream cannot be combined with cursor or limit')
+    if join == 'app' and not paginated:
+        raise ValueError('join=app needs cursor or limit')
+    
+    plan = {'stream_format': stream_format, 'batch_size': batch_size, 'paginated': paginated, 'join': join}
+    if not paginated:
+        plan['pipeline'] = linked_orders_pipeline(args.get('fields'))
+        return plan
+    
+    limit = args.get('limit', type=int, default=DEFAULT_PAGE_SIZE)
+    if limit <= 0:
+        raise ValueError('limit must be positive')
+    query = {}
+    token = args.get('cursor')
+    if token:
+        token_field, _, _, last_id = decode_cursor(token)
+        if token_field != '_id':
+            raise ValueError('Invalid cursor')
+        query = {'_id': {'$gt': last_id}}
+    plan.update(limit=limit, query=query)
+    
+    if join == 'lookup':
+        pipeline = linked_orders_pipeline(args.get('fields'))
+        dropped = []
+        if pipeline and '$project' in pipeline[-1]:
+            projection, dropped = fields.ensure_fields(pipeline[-1]['$project'], ['_id'])
+            pipeline[-1] = {'$project': projection}
+        # One extra order tells whether another page exists
+        page = [{'$match': query}, {'$sort': {'_id': 1}}, {'$limit': limit + 1}]
+        plan.update(pipeline=page + pipeline, dropped=dropped)
+        return plan
+    
+    projection, inclusion, linked = plan_linked_order_fields(args.get('fields'))
+    # The cursor needs _id, the joins need their reference fields
+    required = ['_id'] + [local_field for (_, _, local_field, _, _), _ in linked]
+    projection, dropped = fields.ensure_fields(projection, required, inclusion)
+    plan.update(projection=projection or None, joins=linked, dropped=dropped)
+    return plan
+
+def join_linked_orders(db, plan, orders):
+    """Stitch the cached products and clients into a page of orders."""
+    for (as_field, collection, local_field, _, _), sub in plan['joins']:
+        found = DIMENSIONS[collection].get_many(db, joins.collect_ids(orders, local_field))
+        joins.stitch(orders, local_field, as_field, found, sub)
+    return orders
+
+def linked_orders_page_response(plan, orders):
+    """Response body of a paginated read (orders: up to limit + 1, joined)."""
+    limit = plan['limit']
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor('_id', 1, orders[-1])
+    fields.strip_fields(orders, plan['dropped'])
+    return {'success': True, 'data': orders, 'limit': limit, 'next_cursor': next_cursor}
+
 @app.route('/api/orders/linking', methods=['GET'])
 def get_orders_linking():
-    """Get all orders with linked products (resolved)."""
-    db = get_db()
-    
-    # Use $lookup to join products
-    pipeline = [
-        {
-            '$lookup': {
-                'from': 'Produits',
-                'localField': 'produits.produit_id',
-                'foreignField': '_id',
-                'as': 'produits_details'
-            }
-        },
-        {
-            '$lookup': {
-                'from': 'Clients',
-                'localField': 'client_id',
-                'foreignField': '_id',
-                'as': 'client_details'
-            }
-        }
-    ]
-    
-    orders = list(db.CommandesLinking.aggregate(pipeline))
-    return jsonify({'success': True, 'data': serialize_doc(orders)})
-
-@app.route('/api/orders/linking', methods=['POST'])
-def create_order_linking():
-    """Create order with product references (linking)."""
+    """
+    Get all orders with linked products (resolved).
+    Query params: stream (ndjson|json), batch_size,
+      fields (e.g. statut,produits_details.nom,client_details.nom),
+      cursor, limit: pages by _id, joined in the app from cached products
+        and clients (join=lookup to use $lookup instead)
+    """
     db = get_db()
-    data = request.get_json()
+    try:
+        plan = plan_linked_orders_request(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    if 'client_id' not in data or 'produits' not in data:
-        return jsonify({'success': False, 'error': 'client_id and produits required'}), 400
+    # The joined products and clients are part of the response
+    etag = versions.collection_etag(db, *LINKED_ORDERS_COLLECTIONS)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
     
-    # Convert product IDs to ObjectId
-    produits = []
-    for p in data['produits']:
-        produits.append({
-            'produit_id': ObjectId(p['produit_id']),
-            'quantite': int(p.get('quantite', 1))
-        })
+    if plan['paginated']:
+        if plan['join'] == 'lookup':
+            orders = list(db.CommandesLinking.aggregate(plan['pipeline']))
+        else:
+            cursor = db.CommandesLinking.find(plan['query'], plan['projection'])
+            orders = list(cursor.sort('_id', 1).limit(plan['limit'] + 1))
+            join_linked_orders(db, plan, orders[:plan['limit']])
+        return tag_response(jsonify(linked_orders_page_response(plan, orders)), etag)
     
-    order = {
-        'client_id': ObjectId(data['client_id']),
+    if plan['stream_format']:
+        cursor = db.CommandesLinking.aggregate(plan['pipeline'], batchSize=plan['batch_size'])
+        return tag_response(stream_response(cursor, plan['stream_format'], plan['batch_size']), etag)
+    
+    orders = list(db.CommandesLinking.aggregate(plan['pipeline']))
+    return tag_response(jsonify({'success': True, 'data': orders}), etag)
+
+def build_linked_order(data):
+    """Validate a linked order payload and return the document to store. Raises ValueError."""
+    if not isinstance(data, dict) or 'client_id' not in data or 'produits' not in data:
+        raise ValueError('client_id and produits required')
+    if not isinstance(data['produits'], list):
+        raise ValueError('produits must be a list')
+    
+    # Convert product IDs to ObjectId
+    try:
+        produits = []
+        for p in data['produits']:
+            produits.append({
+                'produit_id': ObjectId(p['produit_id']),
+                'quantite': int(p.get('quantite', 1))
+            })
+        client_id = ObjectId(data['client_id'])
+    except InvalidId as e:
+        raise ValueError(str(e))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise ValueError('Each line needs a produit_id and an integer quantite')
+    
+    return {
+        'client_id': client_id,
         'date_commande': datetime.now(),
         'statut': data.get('statut', 'En cours'),
         'produits': produits
     }
+
+@app.route('/api/orders/linking', methods=['POST'])
+def create_order_linking():
+    """
+    Create order with product references (linking).
+    Reserves the stock of every line (409 with shortfalls if short).
+    """
+    db = get_db()
+    data = request.get_json()
+    
+    try:
+        order = build_linked_order(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    result = db.CommandesLinking.insert_one(order)
+    reserved, error = reserve_stock(db, order['produits'])
+    if error:
+        return error
+    result = insert_reserved_order(db, db.CommandesLinking, order, reserved)
     order['_id'] = str(result.inserted_id)
+    bump_versions('CommandesLinking')
     
     return jsonify({
         'success': True,
-        'data': serialize_doc(order),
+        'data': order,
         'message': 'Linked order created'
     }), 201
 
@@ -601,18 +1562,17 @@ def add_product_to_linking(order_id):
         return jsonify({'success': False, 'error': 'produit_id required'}), 400
     
     try:
-        db.CommandesLinking.update_one(
-            {'_id': ObjectId(order_id)},
-            {'$push': {'produits': {
-                'produit_id': ObjectId(data['produit_id']),
-                'quantite': int(data.get('quantite', 1))
-            }}}
-        )
+        updated = mutate_one(db.CommandesLinking, ObjectId(order_id), {'$push': {'produits': {
+            'produit_id': ObjectId(data['produit_id']),
+            'quantite': int(data.get('quantite', 1))
+        }}})
+        if updated is None:
+            return jsonify({'success': False, 'error': 'Order not found'}), 404
+        bump_versions('CommandesLinking')
         
-        updated = db.CommandesLinking.find_one({'_id': ObjectId(order_id)})
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': 'Product added to linked order'
         })
     except Exception as e:
@@ -624,15 +1584,17 @@ def remove_product_from_linking(order_id, product_id):
     db = get_db()
     
     try:
-        db.CommandesLinking.update_one(
-            {'_id': ObjectId(order_id)},
+        updated = mutate_one(
+            db.CommandesLinking, ObjectId(order_id),
             {'$pull': {'produits': {'produit_id': ObjectId(product_id)}}}
         )
+        if updated is None:
+            return jsonify({'success': False, 'error': 'Order not found'}), 404
+        bump_versions('CommandesLinking')
         
-        updated = db.CommandesLinking.find_one({'_id': ObjectId(order_id)})
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': 'Product removed from linked order'
         })
     except Exception as e:
@@ -649,6 +1611,7 @@ def delete_order_linking(order_id):
         
         if result.deleted_count == 0:
             return jsonify({'success': False, 'error': 'Order not found'}), 404
+        bump_versions('CommandesLinking')
         
         return jsonify({
             'success': True,
@@ -673,33 +1636,196 @@ def update_order_linking(order_id):
         if not update_fields:
             return jsonify({'success': False, 'error': 'No fields to update'}), 400
         
-        result = db.CommandesLinking.update_one(
-            {'_id': ObjectId(order_id)},
-            {'$set': update_fields}
-        )
-        
-        if result.matched_count == 0:
+        updated = mutate_one(db.CommandesLinking, ObjectId(order_id), {'$set': update_fields})
+        if updated is None:
             return jsonify({'success': False, 'error': 'Order not found'}), 404
+        bump_versions('CommandesLinking')
         
-        updated = db.CommandesLinking.find_one({'_id': ObjectId(order_id)})
         return jsonify({
             'success': True,
-            'data': serialize_doc(updated),
+            'data': updated,
             'message': 'Linked order updated'
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+# ============================================================
+# API ROUTES - ORDER INGESTION (NDJSON)
+# ============================================================
+# Feeds POST one order per line. The body is read line by line and
+# inserted in fixed-size batches while the per-batch summary is streamed
+# back, so memory stays flat and a slow database slows the upload down.
+
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+INGEST_MAX_LINE_BYTES = int(os.environ.get('INGEST_MAX_LINE_BYTES', 1024 * 1024))
+# Errors listed per batch summary; the count is always complete
+INGEST_MAX_ERRORS = 20
+
+def iter_ndjson(stream, max_line_bytes=INGEST_MAX_LINE_BYTES):
+    """Yield (line number, document or None, error or None) for each non-empty line."""
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_line_bytes:
+            # Skip the rest of the oversized line
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes + 1)
+            yield line_number, None, f'Line longer than {max_line_bytes} bytes'
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+
+def insert_order_batch(db, kind, batch):
+    """
+    Insert one batch of (line number, order) with insert_many(ordered=False).
+    Returns (inserted count, [(line number, error)]).
+    """
+    collection = db.CommandesEmbedding if kind == 'embedding' else db.CommandesLinking
+    errors = []
+    failed = set()
+    try:
+        collection.insert_many([order for _, order in batch], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            failed.add(error['index'])
+            errors.append((batch[error['index']][0], error.get('errmsg')))
+    
+    if kind == 'embedding':
+        lines = [line for i, (_, order) in enumerate(batch) if i not in failed for line in order['produits']]
+        sales_stats.apply_sales_deltas(db, lines)
+    return len(batch) - len(failed), errors
+
+def iter_ingest(db, kind, stream, batch_size):
+    """Validate, batch and insert NDJSON orders, yielding one summary line per batch."""
+    build = build_embedded_order if kind == 'embedding' else build_linked_order
+    dumps = app.json.dumps
+    totals = {'received': 0, 'inserted': 0, 'rejected': 0}
+    batch = []
+    errors = []
+    batch_number = 0
+    first_line = None
+    
+    def flush():
+        nonlocal batch, errors, batch_number, first_line
+        inserted = 0
+        if batch:
+            if kind == 'embedding':
+                # One Produits query for every line of the batch
+                lines = [line for _, order in batch for line in order['produits']]
+                order_lines.snapshot_lines(db, lines)
+            inserted, write_errors = insert_order_batch(db, kind, batch)
+            errors += write_errors
+        batch_number += 1
+        totals['inserted'] += inserted
+        totals['rejected'] += len(errors)
+        summary = {
+            'batch': batch_number,
+            'first_line': first_line,
+            'inserted': inserted,
+            'rejected': len(errors),
+            'errors': [{'line': n, 'error': error} for n, error in errors[:INGEST_MAX_ERRORS]]
+        }
+        batch, errors, first_line = [], [], None
+        return dumps(summary, separators=(',', ':')) + '\n'
+    
+    for line_number, doc, error in iter_ndjson(stream):
+        totals['received'] += 1
+        if first_line is None:
+            first_line = line_number
+        if error is None:
+            try:
+                order = build(doc)
+                if kind == 'embedding':
+                    # produit_id must be valid before the batch snapshot
+                    for line in order['produits']:
+                        if line.get('produit_id'):
+                            ObjectId(line['produit_id'])
+                batch.append((line_number, order))
+            except (ValueError, TypeError, InvalidId) as e:
+                error = str(e)
+        if error is not None:
+            errors.append((line_number, error))
+        if len(batch) + len(errors) >= batch_size:
+            yield flush()
+    
+    if batch or errors:
+        yield flush()
+    if totals['inserted']:
+        if kind == 'embedding':
+            invalidate_order_caches()
+        else:
+            bump_versions('CommandesLinking')
+    yield dumps({'done': True, **totals}, separators=(',', ':')) + '\n'
+
+def ingest_response(kind):
+    """Stream the ingestion of the request body as NDJSON summaries."""
+    batch_size = request.args.get('batch_size', type=int, default=INGEST_BATCH_SIZE)
+    if batch_size <= 0:
+        return jsonify({'success': False, 'error': 'batch_size must be positive'}), 400
+    
+    db = get_db()
+    generator = iter_ingest(db, kind, request.stream, batch_size)
+    return Response(stream_with_context(generator), mimetype='application/x-ndjson')
+
+@app.route('/api/orders/embedding/ingest', methods=['POST'])
+def ingest_orders_embedding():
+    """
+    Bulk-load embedded orders from an NDJSON body (one order per line,
+    same fields as POST /api/orders/embedding).
+    Query params: batch_size (default INGEST_BATCH_SIZE)
+    Response: NDJSON, one summary per batch, then {"done": true, ...totals}.
+    """
+    return ingest_response('embedding')
+
+@app.route('/api/orders/linking/ingest', methods=['POST'])
+def ingest_orders_linking():
+    """
+    Bulk-load linked orders from an NDJSON body (one order per line,
+    same fields as POST /api/orders/linking).
+    """
+    return ingest_response('linking')
+
 # ============================================================
 # API ROUTES - CLIENTS
 # ============================================================
 
 @app.route('/api/clients', methods=['GET'])
 def get_clients():
-    """Get all clients."""
+    """
+    Get all clients.
+    Query params: stream (ndjson|json), batch_size, fields (e.g. nom,prenom)
+    """
     db = get_db()
-    clients = list(db.Clients.find())
-    return jsonify({'success': True, 'data': serialize_doc(clients)})
+    try:
+        stream_format, batch_size = get_stream_options(request.args)
+        projection = fields.parse_fields(request.args.get('fields'), CLIENT_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    etag = versions.collection_etag(db, 'Clients')
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    if stream_format:
+        cursor = db.Clients.find({}, projection).batch_size(batch_size)
+        return tag_response(stream_response(cursor, stream_format, batch_size), etag)
+    
+    clients = list(db.Clients.find({}, projection))
+    return tag_response(jsonify({'success': True, 'data': clients}), etag)
+
+@app.route('/api/clients/batch-get', methods=['POST'])
+def batch_get_clients():
+    """
+    Get many clients by ID with one $in query.
+    Body: { "ids": ["...", ...], "fields": "nom,prenom" }  (fields optional)
+    """
+    return batch_get(get_db().Clients, CLIENT_FIELDS)
 
 # ============================================================
 # API ROUTES - AGGREGATION
@@ -707,74 +1833,89 @@ def get_clients():
 
 @app.route('/api/stats/sales-by-category', methods=['GET'])
 def sales_by_category():
-    """Calculate total sales per category using aggregation."""
-    db = get_db()
-    
-    # Aggregation on embedded orders
-    pipeline = [
-        {'$unwind': '$produits'},
-        {'$lookup': {
-            'from': 'Produits',
-            'localField': 'produits.nom',
-            'foreignField': 'nom',
-            'as': 'details_produit'
-        }},
-        {'$unwind': '$details_produit'},
-        {'$group': {
-            '_id': '$details_produit.categorie',
-            'total_ventes': {'$sum': {'$multiply': ['$produits.prix', '$produits.quantite']}},
-            'nombre_articles': {'$sum': '$produits.quantite'}
-        }}
-    ]
+    """
+    Total sales per category, read from the pre-aggregated counters
+    maintained by the embedded-order endpoints (see sales_stats.py).
+    """
+    db = get_db()
     
-    embedded_result = list(db.CommandesEmbedding.aggregate(pipeline))
+    embedded_result = stats_cache.get_or_compute(
+        'sales-by-category',
+        lambda: sales_stats.read_sales_by_category(db)
+    )
     
     return jsonify({
         'success': True,
         'data': {
-            'embedded_orders': serialize_doc(embedded_result),
+            'embedded_orders': embedded_result,
         }
     })
 
+STOCK_BY_CATEGORY_PIPELINE = [
+    {'$group': {
+        '_id': '$categorie',
+        'nombre_produits': {'$sum': 1},
+        'stock_total': {'$sum': '$stock'},
+        'valeur_stock': {'$sum': {'$multiply': ['$prix', '$stock']}},
+        'prix_moyen': {'$avg': '$prix'}
+    }},
+    {'$sort': {'valeur_stock': -1}}
+]
+
 @app.route('/api/stats/stock-by-category', methods=['GET'])
 def stock_by_category():
     """Get stock value per category."""
     db = get_db()
     
-    pipeline = [
-        {'$group': {
-            '_id': '$categorie',
-            'nombre_produits': {'$sum': 1},
-            'stock_total': {'$sum': '$stock'},
-            'valeur_stock': {'$sum': {'$multiply': ['$prix', '$stock']}},
-            'prix_moyen': {'$avg': '$prix'}
-        }},
-        {'$sort': {'valeur_stock': -1}}
-    ]
+    result = stats_cache.get_or_compute(
+        'stock-by-category',
+        lambda: list(db.Produits.aggregate(STOCK_BY_CATEGORY_PIPELINE))
+    )
     
-    result = list(db.Produits.aggregate(pipeline))
-    
-    return jsonify({'success': True, 'data': serialize_doc(result)})
+    return jsonify({'success': True, 'data': result})
 
 @app.route('/api/stats/top-products', methods=['GET'])
 def top_products():
-    """Get top selling products from embedded orders."""
-    db = get_db()
-    
-    pipeline = [
-        {'$unwind': '$produits'},
-        {'$group': {
-            '_id': '$produits.nom',
-            'quantite_vendue': {'$sum': '$produits.quantite'},
-            'revenue': {'$sum': {'$multiply': ['$produits.prix', '$produits.quantite']}}
-        }},
-        {'$sort': {'quantite_vendue': -1}},
-        {'$limit': 10}
-    ]
+    """Get top selling products from the pre-aggregated counters."""
+    db = get_db()
     
-    result = list(db.CommandesEmbedding.aggregate(pipeline))
+    result = stats_cache.get_or_compute(
+        'top-products',
+        lambda: sales_stats.read_top_products(db, limit=10)
+    )
     
-    return jsonify({'success': True, 'data': serialize_doc(result)})
+    return jsonify({'success': True, 'data': result})
+
+@app.route('/api/stats/rebuild', methods=['POST'])
+def rebuild_stats():
+    """Recompute the sales counters from CommandesEmbedding and report drift."""
+    db = get_db()
+    drift = sales_stats.rebuild_sales_stats(db)
+    stats_cache.clear()
+    return jsonify({
+        'success': True,
+        'data': {'drift': drift},
+        'message': f'Sales stats rebuilt ({len(drift)} drifted values corrected)'
+    })
+
+@app.route('/api/stats/cache', methods=['GET'])
+def stats_cache_info():
+    """Get hit/miss counters of the stats, count and join caches."""
+    return jsonify({
+        'success': True,
+        'data': {
+            'stats': stats_cache.stats(),
+            'counts': count_cache.stats(),
+            'join_products': product_dimension.stats(),
+            'join_clients': client_dimension.stats()
+        }
+    })
+
+@app.route('/api/stats/cache', methods=['DELETE'])
+def clear_stats_cache():
+    """Drop every cached stats result."""
+    stats_cache.clear()
+    return jsonify({'success': True, 'message': 'Stats cache cleared'})
 
 # ============================================================
 # API ROUTES - INDEXES
@@ -812,10 +1953,63 @@ def create_index():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/indexes/status', methods=['GET'])
+def indexes_status():
+    """Compare existing indexes with the declared spec (indexes.py)."""
+    db = get_db()
+    return jsonify({'success': True, 'data': indexes.verify_indexes(db)})
+
+@app.route('/api/indexes/advise', methods=['GET'])
+def advise_indexes():
+    """
+    Explain the most frequent GET /api/products query shapes and suggest
+    compound indexes (Equality, Sort, Range order).
+    Query params: limit (shapes, default 20), refresh (re-run explain)
+    """
+    db = get_db()
+    limit = request.args.get('limit', type=int, default=20)
+    refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+    report = index_advisor.advise(db.Produits, query_shapes, limit=limit, refresh=refresh)
+    return jsonify({'success': True, 'data': report})
+
+@app.route('/api/indexes/advise', methods=['DELETE'])
+def reset_index_advice():
+    """Forget recorded query shapes."""
+    query_shapes.reset()
+    return jsonify({'success': True, 'message': 'Query shapes cleared'})
+
+# ============================================================
+# API ROUTES - CONNECTION POOL
+# ============================================================
+
+@app.route('/api/pool/stats', methods=['GET'])
+def pool_stats():
+    """Get connection pool configuration and usage counters."""
+    return jsonify({'success': True, 'data': database.get_pool_stats()})
+
+# ============================================================
+# API ROUTES - COMPRESSION
+# ============================================================
+
+@app.route('/api/compression/stats', methods=['GET'])
+def compression_stats():
+    """Bytes saved and CPU time spent by response compression, per encoding."""
+    return jsonify({'success': True, 'data': compress.stats.snapshot()})
+
+@app.route('/api/compression/stats', methods=['DELETE'])
+def reset_compression_stats():
+    """Reset the compression counters."""
+    compress.stats.reset()
+    return jsonify({'success': True, 'message': 'Compression counters cleared'})
+
 # ============================================================
 # API ROUTES - ADVANCED QUERY OPERATORS DEMO
 # ============================================================
 
+# Guards for user-supplied $regex / $where in the demo
+DEMO_REGEX_MAX_LENGTH = 100
+DEMO_MAX_TIME_MS = int(os.environ.get('DEMO_MAX_TIME_MS', 2000))
+
 @app.route('/api/demo/operators', methods=['POST'])
 def demo_operators():
     """
@@ -860,6 +2054,16 @@ def demo_operators():
         field = params.get('field', 'nom')
         pattern = params.get('pattern', '^[SC]')
         options = params.get('options', 'i')
+        # Raw patterns are the point of this demo: bound their size, reject
+        # invalid ones and cap the query time (DEMO_MAX_TIME_MS) instead
+        if params.get('literal'):
+            pattern = re.escape(pattern)
+        if len(pattern) > DEMO_REGEX_MAX_LENGTH:
+            return jsonify({'success': False, 'error': f'Pattern longer than {DEMO_REGEX_MAX_LENGTH} characters'}), 400
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            return jsonify({'success': False, 'error': f'Invalid pattern: {e}'}), 400
         query[field] = {'$regex': pattern, '$options': options}
         
     elif operator == '$where':
@@ -915,8 +2119,22 @@ def demo_operators():
             value = params.get('value', 'outdated')
             update_query['$pull'] = {field: value}
 
+        # Keep product ETags valid unless the demo targets the stamp itself
+        if not touches_field(update_query, 'derniere_modification'):
+            update_query.setdefault('$currentDate', {})['derniere_modification'] = True
+        
+        # Products to retokenize, collected before the update: a new nom
+        # can make them stop matching filter_query
+        retokenize = None
+        if touches_field(update_query, 'nom'):
+            retokenize = [doc['_id'] for doc in db.Produits.find(filter_query, {'_id': 1})]
+        
         # Execute Update
         result = db.Produits.update_many(filter_query, update_query)
+        invalidate_product_caches()
+        if retokenize:
+            search.backfill_search_tokens(db, {'_id': {'$in': retokenize}})
+        suggestions.mark_stale()
         
         # return all docs to see changes
         results = list(db.Produits.find({}))
@@ -927,7 +2145,7 @@ def demo_operators():
             'query': json.loads(json_util.dumps(update_query)),
             'count': len(results),
             'modified_count': result.modified_count,
-            'data': serialize_doc(results)
+            'data': results
         })
 
     else:
@@ -936,7 +2154,10 @@ def demo_operators():
     # Apply projection if specified
     projection = params.get('projection')
     
-    results = list(db.Produits.find(query, projection))
+    try:
+        results = list(db.Produits.find(query, projection).max_time_ms(DEMO_MAX_TIME_MS))
+    except ExecutionTimeout:
+        return jsonify({'success': False, 'error': 'Query exceeded the time limit'}), 400
     
     return jsonify({
         # Indique que la requête a été exécutée avec succès
@@ -958,10 +2179,10 @@ def demo_operators():
         'count': len(results),
 
         # Liste des documents retournés par MongoDB
-        # serialize_doc :
+        # BSONJSONProvider (app.json) :
         # - transforme les ObjectId en string
-        # - rend les documents compatibles avec jsonify
-        'data': serialize_doc(results)
+        # - encode les documents directement dans jsonify
+        'data': results
     })
 
 
@@ -981,6 +2202,23 @@ def server_error(e):
 # RUN APPLICATION
 # ============================================================
 
+def bootstrap_indexes():
+    """Build missing declared indexes; never drops anything."""
+    try:
+        report = indexes.ensure_indexes(get_db())
+    except Exception as e:
+        print(f"⚠️  Index bootstrap skipped: {e}")
+        return
+    for collection_name, entry in report.items():
+        for name in entry['created']:
+            print(f"✅ Created index {collection_name}.{name}")
+        for index in entry['extra']:
+            print(f"⚠️  Index not in spec: {collection_name}.{index['name']}")
+
+# WSGI servers (gunicorn, ...) can opt in with ENSURE_INDEXES=1
+if os.environ.get('ENSURE_INDEXES') == '1':
+    bootstrap_indexes()
+
 if __name__ == '__main__':
     print("="*60)
     print("🚀 BoutiqueComplete1 - Flask Server")
@@ -988,4 +2226,9 @@ if __name__ == '__main__':
     print("📦 Database: MongoDB - BoutiqueComplete1")
     print("🌐 Server: http://localhost:5000")
     print("="*60)
+    if os.environ.get('ENSURE_INDEXES') != '0' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        bootstrap_indexes()
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Warm the autocomplete index in the serving (reloader child) process
+        threading.Thread(target=suggestions.build, args=(get_db(),), daemon=True).start()
     app.run(debug=True, host='0.0.0.0', port=5000)
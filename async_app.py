@@ -0,0 +1,372 @@
+"""
+BoutiqueComplete1 - Async API Server (optional)
+================================================
+Serves the read-heavy /api/* routes with Quart and pymongo's native
+AsyncMongoClient: a request waiting on MongoDB does not hold a thread,
+so one process keeps hundreds of requests in flight.
+
+Every other route (writes, HTML pages, admin endpoints) is forwarded to
+the Flask app of app.py, which runs in a thread pool. Both share the same
+process, so caches, the autocomplete index and the index advisor stay
+consistent. Responses of the async routes are byte-identical to the
+Flask ones: same request parsing, same JSON encoder, same caches.
+
+Writes are forwarded with their body read in full (ASYNC_WSGI_MAX_BODY);
+run order ingestion (/api/orders/*/ingest) on the sync server to keep
+its incremental upload.
+
+Install:
+    pip install -r requirements-async.txt
+Run:
+    hypercorn async_app:asgi_app --bind 0.0.0.0:5000
+    python async_app.py
+"""
+
+import asyncio
+import os
+
+try:
+    from hypercorn.middleware import AsyncioWSGIMiddleware
+    from quart import Quart, Response, request
+except ImportError as e:
+    raise ImportError('async_app.py needs Quart and Hypercorn: pip install -r requirements-async.txt') from e
+
+from bson import ObjectId
+from werkzeug.exceptions import HTTPException
+
+import app as sync_app
+import compress
+import database
+import fields
+import joins
+import sales_stats
+import versions
+from cache import make_key
+
+flask_app = sync_app.app
+
+# Largest request body forwarded to the Flask routes (bulk writes)
+ASYNC_WSGI_MAX_BODY = int(os.environ.get('ASYNC_WSGI_MAX_BODY', 64 * 1024 * 1024))
+
+app = Quart(__name__)
+
+
+def get_db():
+    """Get database from the shared async client."""
+    return database.get_async_db()
+
+
+@app.after_serving
+async def close_client():
+    await database.close_async_client()
+
+
+def json_response(obj, status=200):
+    """Encode like flask.jsonify outside debug mode (BSONJSONProvider, compact)."""
+    body = flask_app.json.dumps(obj, separators=(',', ':')) + '\n'
+    return Response(body, status=status, mimetype='application/json')
+
+
+def error_response(message, status):
+    return json_response({'success': False, 'error': message}, status)
+
+
+def tag_response(response, etag):
+    """Async twin of app.tag_response."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag):
+    """Async twin of app.not_modified: a 304 response or None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response('', status=304)
+    # Werkzeug strips entity headers from a 304; Quart keeps them
+    del response.headers['Content-Type']
+    return tag_response(response, etag)
+
+
+async def iter_json_chunks(cursor, stream_format, batch_size):
+    """Async twin of app.iter_json_chunks."""
+    dumps = flask_app.json.dumps
+    separator = '\n' if stream_format == 'ndjson' else ','
+    first = True
+    batch = []
+    try:
+        if stream_format == 'json':
+            yield '{"data":['
+        async for doc in cursor:
+            batch.append(dumps(doc, separators=(',', ':')))
+            if len(batch) >= batch_size:
+                yield ('' if first else separator) + separator.join(batch)
+                first = False
+                batch = []
+        if batch:
+            yield ('' if first else separator) + separator.join(batch)
+            first = False
+        if stream_format == 'json':
+            yield '],"success":true}\n'
+        elif not first:
+            yield '\n'
+    finally:
+        await cursor.close()
+
+
+def stream_response(cursor, stream_format, batch_size):
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+    return Response(iter_json_chunks(cursor, stream_format, batch_size), mimetype=mimetype)
+
+
+async def cached(cache, key, compute):
+    """TTLCache.get_or_compute for a coroutine."""
+    value = cache.get(key)
+    if value is None:
+        value = await compute()
+        cache.set(key, value)
+    return value
+
+
+# ============================================================
+# API ROUTES - PRODUCTS
+# ============================================================
+
+async def count_products(db, query, total_mode):
+    """Async twin of app.count_products (same count cache)."""
+    if total_mode == 'none':
+        return None
+    if total_mode == 'estimate' and not query:
+        return await db.Produits.estimated_document_count()
+    return await cached(sync_app.count_cache, make_key(query), lambda: db.Produits.count_documents(query))
+
+
+async def fetch_products_page(db, plan):
+    """Async twin of app.fetch_products_page."""
+    query = plan['query']
+    count_key = make_key(query)
+    if plan['use_facet'] and plan['total_mode'] == 'exact' and sync_app.count_cache.get(count_key) is None:
+        pipeline = sync_app.products_facet_pipeline(
+            query, plan['page_query'], plan['sort_spec'], plan['skip'], plan['fetch_limit'], plan['projection']
+        )
+        cursor = await db.Produits.aggregate(pipeline)
+        result = (await cursor.to_list())[0]
+        total = result['total'][0]['n'] if result['total'] else 0
+        sync_app.count_cache.set(count_key, total)
+        return result['data'], total
+
+    cursor = db.Produits.find(plan['page_query'], plan['projection']).sort(plan['sort_spec'])
+    if plan['skip']:
+        cursor = cursor.skip(plan['skip'])
+    if plan['fetch_limit']:
+        cursor = cursor.limit(plan['fetch_limit'])
+    return await cursor.to_list(), await count_products(db, query, plan['total_mode'])
+
+
+@app.route('/api/products', methods=['GET'])
+async def get_products():
+    """Same parameters and response as app.get_products."""
+    try:
+        plan = sync_app.plan_products_request(request.args)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    db = get_db()
+    etag = await versions.collection_etag_async(db, 'Produits')
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    sync_app.query_shapes.record(plan['query'], plan['sort_spec'])
+
+    products, total = await fetch_products_page(db, plan)
+    return tag_response(json_response(sync_app.products_response(plan, products, total)), etag)
+
+
+@app.route('/api/products/<product_id>', methods=['GET'])
+async def get_product(product_id):
+    try:
+        projection, dropped = sync_app.product_projection(request.args)
+        product = await get_db().Produits.find_one({'_id': ObjectId(product_id)}, projection)
+        if product:
+            etag = versions.document_etag(product)
+            fields.strip_fields([product], dropped)
+            body = {'success': True, 'data': product}
+            if etag is None:
+                return json_response(body)
+            return not_modified(etag) or tag_response(json_response(body), etag)
+        return error_response('Product not found', 404)
+    except Exception as e:
+        return error_response(str(e), 400)
+
+
+async def batch_get(collection, allowed, internal=()):
+    """Async twin of app.batch_get."""
+    try:
+        plan = sync_app.plan_batch_get(await request.get_json(silent=True), allowed, internal)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    docs = await collection.find(plan['query'], plan['projection']).to_list()
+    return json_response(sync_app.batch_get_response(plan, docs))
+
+
+@app.route('/api/products/batch-get', methods=['POST'])
+async def batch_get_products():
+    return await batch_get(get_db().Produits, sync_app.PRODUCT_FIELDS, sync_app.PRODUCT_INTERNAL_FIELDS)
+
+
+# ============================================================
+# API ROUTES - ORDERS AND CLIENTS
+# ============================================================
+
+async def find_all(collection, allowed):
+    """Full collection read, plain or streamed (?stream=, ?fields=), tagged with its version."""
+    try:
+        stream_format, batch_size = sync_app.get_stream_options(request.args)
+        projection = fields.parse_fields(request.args.get('fields'), allowed)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    etag = await versions.collection_etag_async(get_db(), collection.name)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    cursor = collection.find({}, projection)
+    if stream_format:
+        return tag_response(stream_response(cursor.batch_size(batch_size), stream_format, batch_size), etag)
+    return tag_response(json_response({'success': True, 'data': await cursor.to_list()}), etag)
+
+
+@app.route('/api/orders/embedding', methods=['GET'])
+async def get_orders_embedding():
+    return await find_all(get_db().CommandesEmbedding, sync_app.EMBEDDED_ORDER_FIELDS)
+
+
+@app.route('/api/clients', methods=['GET'])
+async def get_clients():
+    return await find_all(get_db().Clients, sync_app.CLIENT_FIELDS)
+
+
+@app.route('/api/clients/batch-get', methods=['POST'])
+async def batch_get_clients():
+    return await batch_get(get_db().Clients, sync_app.CLIENT_FIELDS)
+
+
+async def join_linked_orders(db, plan, orders):
+    """Async twin of app.join_linked_orders (same caches)."""
+    for (as_field, collection, local_field, _, _), sub in plan['joins']:
+        ids = joins.collect_ids(orders, local_field)
+        found = await sync_app.DIMENSIONS[collection].get_many_async(db, ids)
+        joins.stitch(orders, local_field, as_field, found, sub)
+    return orders
+
+
+@app.route('/api/orders/linking', methods=['GET'])
+async def get_orders_linking():
+    try:
+        plan = sync_app.plan_linked_orders_request(request.args)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    db = get_db()
+    etag = await versions.collection_etag_async(db, *sync_app.LINKED_ORDERS_COLLECTIONS)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    if plan['paginated']:
+        if plan['join'] == 'lookup':
+            cursor = await db.CommandesLinking.aggregate(plan['pipeline'])
+            orders = await cursor.to_list()
+        else:
+            cursor = db.CommandesLinking.find(plan['query'], plan['projection'])
+            orders = await cursor.sort('_id', 1).limit(plan['limit'] + 1).to_list()
+            await join_linked_orders(db, plan, orders[:plan['limit']])
+        return tag_response(json_response(sync_app.linked_orders_page_response(plan, orders)), etag)
+    if plan['stream_format']:
+        cursor = await db.CommandesLinking.aggregate(plan['pipeline'], batchSize=plan['batch_size'])
+        return tag_response(stream_response(cursor, plan['stream_format'], plan['batch_size']), etag)
+    cursor = await db.CommandesLinking.aggregate(plan['pipeline'])
+    return tag_response(json_response({'success': True, 'data': await cursor.to_list()}), etag)
+
+
+# ============================================================
+# API ROUTES - AGGREGATION
+# ============================================================
+
+@app.route('/api/stats/sales-by-category', methods=['GET'])
+async def sales_by_category():
+    db = get_db()
+    embedded_result = await cached(
+        sync_app.stats_cache, 'sales-by-category',
+        lambda: sales_stats.read_sales_by_category_async(db)
+    )
+    return json_response({'success': True, 'data': {'embedded_orders': embedded_result}})
+
+
+@app.route('/api/stats/stock-by-category', methods=['GET'])
+async def stock_by_category():
+    db = get_db()
+
+    async def compute():
+        cursor = await db.Produits.aggregate(sync_app.STOCK_BY_CATEGORY_PIPELINE)
+        return await cursor.to_list()
+
+    result = await cached(sync_app.stats_cache, 'stock-by-category', compute)
+    return json_response({'success': True, 'data': result})
+
+
+@app.route('/api/stats/top-products', methods=['GET'])
+async def top_products():
+    db = get_db()
+    result = await cached(
+        sync_app.stats_cache, 'top-products',
+        lambda: sales_stats.read_top_products_async(db, limit=10)
+    )
+    return json_response({'success': True, 'data': result})
+
+
+# ============================================================
+# ASGI ENTRY POINT
+# ============================================================
+
+class AsyncAPI:
+    """
+    ASGI app: requests whose Flask endpoint has an async twin go to Quart,
+    everything else to the Flask app (in a thread pool).
+    Routing uses Flask's URL map, so both apps agree on what a path means.
+    """
+
+    def __init__(self, async_app, wsgi_app, max_body_size=ASYNC_WSGI_MAX_BODY):
+        self.async_app = async_app
+        self.wsgi = AsyncioWSGIMiddleware(wsgi_app, max_body_size=max_body_size)
+        self.urls = wsgi_app.url_map.bind('localhost')
+
+    def is_async(self, scope):
+        try:
+            endpoint, _ = self.urls.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return False
+        return endpoint in self.async_app.view_functions
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not self.is_async(scope):
+            return await self.wsgi(scope, receive, send)
+        return await self.async_app(scope, receive, send)
+
+
+# Flask responses arrive already compressed; the middleware handles the async routes
+asgi_app = compress.CompressionMiddleware(AsyncAPI(app, flask_app))
+
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    print("=" * 60)
+    print("🚀 BoutiqueComplete1 - Async Server (Quart + AsyncMongoClient)")
+    print("=" * 60)
+    print("🌐 Server: http://localhost:5000")
+    print("=" * 60)
+    if os.environ.get('ENSURE_INDEXES') != '0':
+        sync_app.bootstrap_indexes()
+    config = Config()
+    config.bind = ['0.0.0.0:5000']
+    asyncio.run(serve(asgi_app, config))
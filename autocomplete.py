@@ -0,0 +1,271 @@
+"""
+BoutiqueComplete1 - Catalog Autocomplete
+=========================================
+In-process inverted index over Produits.nom, categorie and tags for
+search-as-you-type (GET /api/products/suggest). Lookups never hit MongoDB.
+
+  - Tokens are accent-folded with search.tokenize ('Été' -> 'ete').
+  - Prefix lookup: a sorted vocabulary walked with bisect.
+  - Infix lookup: a trigram -> tokens map ('shirt' finds 'tshirt').
+  - Every query word must match; results are ranked by field weight
+    (nom > tags > categorie), exact words before prefixes before infixes.
+  - Results of recent queries are cached until the next write.
+
+The index is built with one scan of Produits and kept current by the
+product write endpoints. Other processes (db_init.py, other workers) are
+picked up by a background rebuild once the index is older than max_age.
+Memory is bounded by max_products; past that limit the index is marked
+truncated and callers should fall back to the database.
+"""
+
+from bisect import bisect_left, insort
+import heapq
+import os
+import threading
+import time
+
+from cache import TTLCache
+import search
+
+# nom > tags > categorie
+FIELD_WEIGHTS = {'nom': 3, 'tags': 2, 'categorie': 1}
+
+# Score multipliers per kind of token match
+EXACT_BOOST = 2.0
+PREFIX_BOOST = 1.0
+INFIX_BOOST = 0.5
+
+# Longer tokens are cut; keeps the vocabulary and trigram map small
+MAX_TOKEN_LENGTH = 32
+
+# Vocabulary tokens expanded per query word (short prefixes match many)
+MAX_EXPANSIONS = 64
+
+MAX_QUERY_TOKENS = 8
+
+# Recent results; short prefixes ('c', 'ch') repeat across users
+RESULT_CACHE_SIZE = 4096
+
+# Fields kept per product to render a suggestion
+SUGGESTION_FIELDS = ('nom', 'categorie', 'prix')
+
+MAX_PRODUCTS = int(os.environ.get('SUGGEST_MAX_PRODUCTS', 200000))
+MAX_AGE = float(os.environ.get('SUGGEST_MAX_AGE', 300))
+
+
+def document_tokens(doc):
+    """Map each token of a product to its best field weight."""
+    tokens = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        values = doc.get(field)
+        if values is None:
+            continue
+        if not isinstance(values, list):
+            values = [values]
+        for value in values:
+            if not isinstance(value, str):
+                continue
+            for token in search.tokenize(value):
+                token = token[:MAX_TOKEN_LENGTH]
+                if tokens.get(token, 0) < weight:
+                    tokens[token] = weight
+    return tokens
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class _State:
+    """Index structures; swapped as a whole after a rebuild."""
+
+    def __init__(self):
+        self.docs = {}          # _id -> suggestion fields
+        self.doc_tokens = {}    # _id -> {token: weight}
+        self.postings = {}      # token -> {_id: weight}
+        self.vocabulary = []    # sorted tokens
+        self.trigrams = {}      # trigram -> set of tokens
+        self.truncated = False
+
+    def add(self, doc, max_products):
+        product_id = doc['_id']
+        self.remove(product_id)
+        if len(self.docs) >= max_products:
+            self.truncated = True
+            return
+        self.docs[product_id] = {field: doc.get(field) for field in SUGGESTION_FIELDS}
+        tokens = document_tokens(doc)
+        self.doc_tokens[product_id] = tokens
+        for token, weight in tokens.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                insort(self.vocabulary, token)
+                for gram in trigrams(token):
+                    self.trigrams.setdefault(gram, set()).add(token)
+            posting[product_id] = weight
+
+    def remove(self, product_id):
+        if self.docs.pop(product_id, None) is None:
+            return
+        for token in self.doc_tokens.pop(product_id):
+            posting = self.postings[token]
+            del posting[product_id]
+            if posting:
+                continue
+            del self.postings[token]
+            del self.vocabulary[bisect_left(self.vocabulary, token)]
+            for gram in trigrams(token):
+                tokens = self.trigrams[gram]
+                tokens.discard(token)
+                if not tokens:
+                    del self.trigrams[gram]
+
+    def match(self, word):
+        """Score products for one query word: {_id: score}."""
+        scores = {}
+
+        def add(token, boost):
+            for product_id, weight in self.postings[token].items():
+                score = weight * boost
+                if scores.get(product_id, 0) < score:
+                    scores[product_id] = score
+
+        matched = set()
+        i = bisect_left(self.vocabulary, word)
+        while (i < len(self.vocabulary) and len(matched) < MAX_EXPANSIONS
+               and self.vocabulary[i].startswith(word)):
+            token = self.vocabulary[i]
+            matched.add(token)
+            add(token, EXACT_BOOST if token == word else PREFIX_BOOST)
+            i += 1
+
+        if len(word) >= 3 and len(matched) < MAX_EXPANSIONS:
+            grams = sorted((self.trigrams.get(gram, set()) for gram in trigrams(word)), key=len)
+            candidates = set.intersection(*grams) if grams and grams[0] else set()
+            for token in sorted(candidates - matched)[:MAX_EXPANSIONS - len(matched)]:
+                if word in token:
+                    add(token, INFIX_BOOST)
+        return scores
+
+
+class SuggestIndex:
+    """Thread-safe autocomplete index over the product catalog."""
+
+    def __init__(self, max_products=MAX_PRODUCTS, max_age=MAX_AGE):
+        self.max_products = max_products
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._state = _State()
+        self._built_at = None
+        self._building = False
+        self._stale = False
+        self._results = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=max_age)
+        # Writes applied while a rebuild scans, replayed before the swap
+        self._pending = []
+
+    @property
+    def ready(self):
+        return self._built_at is not None
+
+    @property
+    def truncated(self):
+        return self._state.truncated
+
+    def build(self, db):
+        """Rebuild from one scan of Produits; lookups keep using the old index meanwhile."""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._stale = False
+            self._pending = []
+        try:
+            state = _State()
+            projection = {field: 1 for field in FIELD_WEIGHTS}
+            projection.update({field: 1 for field in SUGGESTION_FIELDS})
+            for doc in db.Produits.find({}, projection).batch_size(1000):
+                state.add(doc, self.max_products)
+            with self._lock:
+                for op, arg in self._pending:
+                    if op == 'add':
+                        state.add(arg, self.max_products)
+                    else:
+                        state.remove(arg)
+                self._state = state
+                self._built_at = time.monotonic()
+                self._results.clear()
+        finally:
+            with self._lock:
+                self._building = False
+                self._pending = []
+
+    def ensure_built(self, db):
+        """Build on first use; refresh in the background once older than max_age."""
+        if self._built_at is None:
+            self.build(db)
+        elif not self._building and (self._stale or time.monotonic() - self._built_at > self.max_age):
+            threading.Thread(target=self.build, args=(db,), daemon=True).start()
+
+    def mark_stale(self):
+        """Schedule a background rebuild on next use (after bulk writes)."""
+        self._stale = True
+
+    def add(self, doc):
+        """Index a new or updated product (needs nom, categorie, tags, prix)."""
+        with self._lock:
+            self._state.add(doc, self.max_products)
+            self._results.clear()
+            if self._building:
+                self._pending.append(('add', doc))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._state.remove(product_id)
+            self._results.clear()
+            if self._building:
+                self._pending.append(('remove', product_id))
+
+    def suggest(self, query, limit=10):
+        """Products matching every word of the query, best first."""
+        words = search.tokenize(query)[:MAX_QUERY_TOKENS]
+        if not words:
+            return []
+        key = (tuple(words), limit)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                return cached
+            state = self._state
+            scores = None
+            for word in words:
+                matches = state.match(word[:MAX_TOKEN_LENGTH])
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {pid: scores[pid] + score for pid, score in matches.items() if pid in scores}
+                if not scores:
+                    break
+            best = heapq.nsmallest(
+                limit, scores.items(),
+                key=lambda item: (-item[1], state.docs[item[0]].get('nom') or '')
+            )
+            results = [{'_id': pid, **state.docs[pid], 'score': score} for pid, score in best]
+            self._results.set(key, results)
+            return results
+
+    def stats(self):
+        with self._lock:
+            state = self._state
+            return {
+                'ready': self.ready,
+                'building': self._building,
+                'products': len(state.docs),
+                'tokens': len(state.vocabulary),
+                'trigrams': len(state.trigrams),
+                'truncated': state.truncated,
+                'max_products': self.max_products,
+                'age_seconds': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+                'stale': self._stale,
+                'result_cache': self._results.stats()
+            }
@@ -0,0 +1,179 @@
+"""
+Async API Parity and Throughput
+================================
+1. Parity: sends the same GET requests to the Flask routes (app.py) and to
+   their async twins (async_app.py) and checks status, content type and
+   body bytes are identical.
+2. Throughput: the same request mix served by the sync routes on a fixed
+   pool of worker threads vs. the async routes with many requests in
+   flight on one event loop.
+
+Both apps are driven in-process through their test clients (no HTTP
+parsing), so the difference measured is the concurrency model. Needs a
+running MongoDB with data (python db_init.py) and
+pip install -r requirements-async.txt.
+
+Usage:
+    python benchmarks/bench_async.py [--requests 2000] [--threads 8] [--concurrency 200]
+    python benchmarks/bench_async.py --parity-only
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import async_app
+from app import app as flask_app
+
+
+def parity_paths(client):
+    """GET requests covering the async routes, built from live data."""
+    paths = [
+        "/api/products",
+        "/api/products?limit=5&skip=2&sort=-prix",
+        "/api/products?categorie=" + quote("Vêtements") + "&min_prix=40",
+        "/api/products?search=chemise",
+        "/api/products?search=" + quote("cuir") + "&search_mode=text",
+        "/api/products?total=estimate&limit=3",
+        "/api/products?total=none",
+        "/api/products?facet=1&limit=4&sort=prix",
+        "/api/products?cursor=&limit=5",
+        "/api/products?total=bad",
+        "/api/products?fields=nom,prix&cursor=&limit=5&sort=-prix",
+        "/api/products?fields=-tags,-promotion&limit=5",
+        "/api/products?fields=mots_cles",
+        "/api/products/not-an-id",
+        "/api/products/000000000000000000000000",
+        "/api/clients",
+        "/api/clients?stream=ndjson&batch_size=2",
+        "/api/orders/embedding",
+        "/api/orders/embedding?stream=json&batch_size=1",
+        "/api/orders/linking",
+        "/api/orders/linking?stream=ndjson",
+        "/api/orders/linking?fields=statut,produits_details.nom,client_details",
+        "/api/orders/linking?limit=2&fields=statut,produits_details.nom",
+        "/api/orders/linking?limit=2&join=lookup",
+        "/api/orders/embedding?fields=-produits",
+        "/api/clients?fields=nom,-_id",
+        "/api/stats/sales-by-category",
+        "/api/stats/stock-by-category",
+        "/api/stats/top-products",
+    ]
+    first_page = client.get("/api/products?cursor=&limit=5").get_json()
+    if first_page.get("next_cursor"):
+        paths.append("/api/products?cursor=" + quote(first_page["next_cursor"]) + "&limit=5")
+    products = client.get("/api/products?limit=1").get_json()["data"]
+    if products:
+        paths.append(f"/api/products/{products[0]['_id']}")
+    return paths
+
+
+LOAD_MIX = [
+    "/api/products?limit=20",
+    "/api/products?categorie=" + quote("Vêtements") + "&sort=-prix&limit=10",
+    "/api/products?cursor=&limit=20",
+    "/api/clients",
+    "/api/orders/linking",
+    "/api/stats/top-products",
+]
+
+
+async def check_parity(flask_client, paths):
+    failures = 0
+    async with async_app.app.test_app() as test_app:
+        client = test_app.test_client()
+        for path in paths:
+            expected = flask_client.get(path)
+            response = await client.get(path)
+            body = await response.get_data()
+            same = (expected.status_code == response.status_code
+                    and expected.mimetype == response.mimetype
+                    and expected.get_data() == body)
+            failures += not same
+            print(f"   {'✅' if same else '❌'} {expected.status_code} {path[:80]}")
+    return failures
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+def run_sync(total, threads):
+    """Sync routes on a fixed thread pool (like a threaded WSGI worker)."""
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = flask_app.test_client()
+        client = local.client
+        start = time.perf_counter()
+        client.get(LOAD_MIX[i % len(LOAD_MIX)]).get_data()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(total)))
+    return time.perf_counter() - start, latencies
+
+
+async def run_async(total, concurrency):
+    """Async routes with up to concurrency requests in flight."""
+    async with async_app.app.test_app() as test_app:
+        client = test_app.test_client()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(LOAD_MIX[i % len(LOAD_MIX)])
+                await response.get_data()
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - start, latencies
+
+
+def report(name, elapsed, latencies):
+    p50, p95, p99 = percentiles(latencies)
+    print(f"   {name:<28}: {len(latencies) / elapsed:8.0f} req/s   "
+          f"p50 {p50:7.1f} ms   p95 {p95:7.1f} ms   p99 {p99:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8, help="sync worker threads")
+    parser.add_argument("--concurrency", type=int, default=200, help="async requests in flight")
+    parser.add_argument("--parity-only", action="store_true")
+    args = parser.parse_args()
+
+    flask_client = flask_app.test_client()
+
+    print("=" * 60)
+    print("🔍 Parity: Flask routes vs async routes")
+    print("=" * 60)
+    failures = asyncio.run(check_parity(flask_client, parity_paths(flask_client)))
+    print(f"\n{'✅' if not failures else '❌'} {failures} difference(s)")
+    if args.parity_only or failures:
+        return 1 if failures else 0
+
+    print("\n" + "=" * 60)
+    print(f"📊 Throughput ({args.requests} requests)")
+    print("=" * 60)
+    report(f"sync, {args.threads} threads", *run_sync(args.requests, args.threads))
+    report(f"async, {args.concurrency} in flight", *asyncio.run(run_async(args.requests, args.concurrency)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Response Compression Benchmark
+===============================
+Fetches real API payloads uncompressed, then compresses each one with
+every available encoding and several levels (compress.make_encoder, the
+same encoders the app uses). Reports size, ratio, bytes saved and CPU
+time per response, to choose COMPRESS_LEVEL / COMPRESS_ZSTD_LEVEL.
+
+A last pass goes through the app with Accept-Encoding set (buffered and
+streamed responses) and prints the counters of GET /api/compression/stats.
+
+Needs a running MongoDB with data (python db_init.py). Payloads grow with
+the data: seed more orders for realistic sizes.
+
+Usage:
+    python benchmarks/bench_compression.py [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compress
+from app import app
+
+PAYLOADS = [
+    ("GET /api/orders/linking", "get", "/api/orders/linking", None),
+    ("GET /api/orders/embedding", "get", "/api/orders/embedding", None),
+    ("GET /api/products?limit=100", "get", "/api/products?limit=100", None),
+    ("GET /api/clients", "get", "/api/clients", None),
+    ("POST /api/demo/operators", "post", "/api/demo/operators",
+     {"operator": "$gte", "params": {"field": "stock", "value": 0}}),
+]
+
+LEVELS = {"gzip": [1, 3, 6, 9], "deflate": [1, 6, 9], "zstd": [1, 3, 9, 19]}
+
+
+def fetch(client, method, path, body):
+    response = getattr(client, method)(path, json=body, headers={"Accept-Encoding": "identity"})
+    return response.get_data()
+
+
+def measure(data, encoding, level, repeat):
+    """Return (compressed size, median CPU seconds per response)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.thread_time()
+        out = compress.make_encoder(encoding, level).compress(data, final=True)
+        timings.append(time.thread_time() - start)
+    timings.sort()
+    return len(out), timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    encodings = ["gzip", "deflate"] + (["zstd"] if compress.ZSTD_AVAILABLE else [])
+
+    print("=" * 72)
+    print(f"📊 Compression by payload (min size {compress.MIN_SIZE} B, "
+          f"default level {compress.LEVEL}, zstd {compress.ZSTD_LEVEL if compress.ZSTD_AVAILABLE else 'n/a'})")
+    print("=" * 72)
+    for name, method, path, body in PAYLOADS:
+        data = fetch(client, method, path, body)
+        print(f"\n{name}: {len(data):,} bytes")
+        if len(data) < compress.MIN_SIZE:
+            print("   below COMPRESS_MIN_SIZE: sent uncompressed")
+            continue
+        for encoding in encodings:
+            for level in LEVELS[encoding]:
+                size, cpu = measure(data, encoding, level, args.repeat)
+                print(f"   {encoding:<8} level {level:>2}: {size:>9,} B  x{len(data) / size:5.1f}  "
+                      f"saved {len(data) - size:>9,} B  cpu {cpu * 1000:7.3f} ms  "
+                      f"({len(data) / cpu / 1e6 if cpu else float('inf'):6.0f} MB/s)")
+
+    print("\n" + "=" * 72)
+    print("📊 Through the app (default levels)")
+    print("=" * 72)
+    compress.stats.reset()
+    for encoding in encodings:
+        for path in ("/api/orders/linking", "/api/orders/linking?stream=ndjson", "/api/clients?stream=json"):
+            client.get(path, headers={"Accept-Encoding": encoding}).get_data()
+    for encoding, entry in compress.stats.snapshot()["encodings"].items():
+        print(f"   {encoding:<8}: {entry['responses']} responses ({entry['streamed']} streamed), "
+              f"{entry['bytes_in']:,} -> {entry['bytes_out']:,} B (x{entry['ratio']}), "
+              f"cpu {entry['cpu_ms']} ms, {entry['cpu_us_per_kb']} µs/KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
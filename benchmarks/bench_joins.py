@@ -0,0 +1,175 @@
+"""
+Linked Orders Join Benchmark
+=============================
+Reads every page of linked orders (keyset on _id, --limit orders per
+page) three ways and compares time and round trips:
+
+  - lookup   : the two $lookup stages on each page (join=lookup)
+  - app cold : app-side join with empty dimension caches on every pass
+  - app warm : app-side join with the products and clients already cached
+
+plus the unpaginated $lookup over the whole collection (the default
+GET /api/orders/linking). Pages of both joins are checked to be the same.
+
+Round trips are counted with a pymongo CommandListener. Needs a running
+MongoDB (MONGO_URI); works in a scratch database that is dropped at the end.
+
+Usage:
+    python benchmarks/bench_joins.py [--orders 20000] [--products 2000] [--clients 1000]
+                                     [--limit 50] [--fields statut,produits_details.nom]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+from werkzeug.datastructures import MultiDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import database
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Count commands sent to the server (one per round trip)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, orders, products, clients, lines):
+    rng = random.Random(42)
+    product_ids = db.Produits.insert_many([
+        {"nom": f"Produit {i}", "prix": round(rng.uniform(5, 200), 2), "stock": rng.randint(0, 500),
+         "categorie": rng.choice(["Vêtements", "Chaussures", "Accessoires"]),
+         "tags": [f"tag{rng.randint(0, 20)}" for _ in range(3)], "mots_cles": ["produit", str(i)]}
+        for i in range(products)
+    ]).inserted_ids
+    client_ids = db.Clients.insert_many([
+        {"nom": f"Nom {i}", "prenom": f"Prenom {i}", "email": f"client{i}@example.com", "ville": "Paris"}
+        for i in range(clients)
+    ]).inserted_ids
+    for start in range(0, orders, 5000):
+        db.CommandesLinking.insert_many([
+            {"client_id": rng.choice(client_ids), "statut": "En cours",
+             "produits": [{"produit_id": product_id, "quantite": rng.randint(1, 5)}
+                          for product_id in rng.sample(product_ids, lines)]}
+            for _ in range(min(5000, orders - start))
+        ])
+
+
+def read_page(db, plan):
+    """Same reads as app.get_orders_linking for a paginated plan."""
+    if plan["join"] == "lookup":
+        orders = list(db.CommandesLinking.aggregate(plan["pipeline"]))
+    else:
+        cursor = db.CommandesLinking.find(plan["query"], plan["projection"])
+        orders = list(cursor.sort("_id", 1).limit(plan["limit"] + 1))
+        app.join_linked_orders(db, plan, orders[:plan["limit"]])
+    return app.linked_orders_page_response(plan, orders)
+
+
+def read_all_pages(db, join, limit, fields):
+    """Return (seconds, pages) for a full pass over the collection."""
+    pages = []
+    token = ""
+    start = time.perf_counter()
+    while True:
+        args = MultiDict({"limit": limit, "cursor": token, "join": join})
+        if fields:
+            args["fields"] = fields
+        body = read_page(db, app.plan_linked_orders_request(args))
+        pages.append(body["data"])
+        token = body["next_cursor"]
+        if not token:
+            return time.perf_counter() - start, pages
+
+
+def canonical(pages):
+    # $lookup does not order the joined documents: compare them as sets
+    def key(doc):
+        return json.dumps(doc, sort_keys=True, default=str)
+    result = []
+    for page in pages:
+        for order in page:
+            order = dict(order)
+            for field in ("produits_details", "client_details"):
+                if field in order:
+                    order[field] = sorted(order[field], key=key)
+            result.append(key(order))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=3, help="products per order")
+    parser.add_argument("--limit", type=int, default=50, help="orders per page")
+    parser.add_argument("--fields", default="", help="fields= of the reads")
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    client = MongoClient(database.MONGO_URI, event_listeners=[counter])
+    db = client[f"{database.DATABASE_NAME}_bench"]
+    client.drop_database(db.name)
+
+    print("=" * 72)
+    print(f"📊 Linked orders: {args.orders} orders, {args.products} products, {args.clients} clients, "
+          f"{args.limit} per page{', fields=' + args.fields if args.fields else ''}")
+    print("=" * 72)
+    try:
+        seed(db, args.orders, args.products, args.clients, args.lines)
+
+        results = {}
+        for name, join, clear in [("lookup", "lookup", False), ("app cold", "app", True), ("app warm", "app", False)]:
+            if clear:
+                for dimension in app.DIMENSIONS.values():
+                    dimension.clear()
+            counter.count = 0
+            elapsed, pages = read_all_pages(db, join, args.limit, args.fields)
+            results[name] = pages
+            print(f"   {name:<9}: {elapsed:7.3f} s  {len(pages):5} pages  "
+                  f"{elapsed / len(pages) * 1000:7.2f} ms/page  {counter.count / len(pages):5.2f} round trips/page")
+
+        counter.count = 0
+        start = time.perf_counter()
+        orders = list(db.CommandesLinking.aggregate(app.linked_orders_pipeline(args.fields or None)))
+        elapsed = time.perf_counter() - start
+        print(f"   {'unpaged':<9}: {elapsed:7.3f} s  {len(orders):5} orders in one $lookup read "
+              f"({counter.count} round trips)")
+
+        print()
+        for name, dimension in app.DIMENSIONS.items():
+            stats = dimension.stats()
+            print(f"   cache {name:<9}: {stats['size']} docs, hit ratio {stats['hit_ratio']}, "
+                  f"{stats['queries']} $in queries, {stats['evictions']} evictions")
+
+        same = canonical(results["lookup"]) == canonical(results["app warm"]) == canonical(results["app cold"])
+        print(f"\n{'✅' if same else '❌'} app-side join {'matches' if same else 'differs from'} $lookup")
+    finally:
+        client.drop_database(db.name)
+        client.close()
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,555 @@
+"""
+HTTP Load Test
+==============
+Drives a weighted mix of API requests from --concurrency worker threads
+for --duration seconds and reports, per endpoint and overall: requests/s,
+error rate and latency (mean, p50, p95, p99, max).
+
+Endpoints of the mix:
+
+  - products_list / products_filter / products_search / products_skip :
+    GET /api/products (category, price range and sort filters, name
+    search, skip pagination with total=estimate)
+  - products_pages / orders_pages : keyset page walks (cursor=, each
+    worker follows next_cursor for up to 5 pages, then starts over)
+  - product_get : GET /api/products/<id>
+  - tag_add / tag_remove : POST and DELETE /api/products/<id>/tags
+  - order_embedded / order_linking : POST /api/orders/embedding and
+    /api/orders/linking (stock reservation: 409 is an expected answer)
+  - stats_sales / stats_stock / stats_top : GET /api/stats/*
+
+--mix picks a preset (browse, checkout, admin); --weights overrides
+single weights, e.g. --weights tag_add=0,stats_top=10.
+
+Targets:
+  --url http://host:port   a running server (python app.py, hypercorn
+                           async_app:asgi_app, gunicorn...). It is
+                           written to: point it at a disposable
+                           DATABASE_NAME.
+  (default) in-process     the Flask app through its test client, on a
+                           scratch database seeded here and dropped at
+                           the end. Needs a running MongoDB (MONGO_URI),
+                           or --mongomock (pip install mongomock) as a
+                           stand-in: no server needed, but the numbers
+                           only measure the app layer, and endpoints
+                           using what mongomock lacks count as errors.
+
+Results:
+  --output results.json    machine-readable results
+  --baseline base.json     compare with stored results: exits 1 if an
+                           endpoint lost more than --tolerance of its
+                           requests/s, its p95 grew by more than
+                           --tolerance (and --min-delta-ms), or its
+                           error rate grew by more than 1 point.
+                           Endpoints with fewer than --min-requests
+                           requests in either run are not compared.
+
+Usage:
+    python benchmarks/bench_load.py [--concurrency 16] [--duration 30] [--mix browse]
+    python benchmarks/bench_load.py --url http://localhost:5000 --output run.json --baseline base.json
+    python benchmarks/bench_load.py --mongomock --duration 5
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compress
+import database
+
+CATEGORIES = {
+    "Vêtements": ["T-Shirt", "Jean", "Chemise", "Robe", "Pull-over", "Veste"],
+    "Chaussures": ["Baskets", "Sandales", "Bottes", "Mocassins"],
+    "Accessoires": ["Sac", "Montre", "Ceinture", "Lunettes", "Écharpe"],
+}
+COLORS = ["Blanc", "Noir", "Bleu", "Rouge", "Vert", "Beige", "Gris"]
+TAGS = ["promo", "nouveau", "ete", "hiver", "cuir", "coton", "eco", "solde"]
+PAGE_WALK = 5
+PAGE_WALKS = {"products_pages", "orders_pages"}
+
+
+# --- Request mix ---
+# Each scenario returns (method, path, json body or None) for one worker.
+
+class Worker:
+    """Per-thread state: random generator, discovered ids, open page walks."""
+
+    def __init__(self, seed, products, clients):
+        self.rng = random.Random(seed)
+        self.products = products
+        self.clients = clients
+        self.cursors = {}
+
+    def product(self):
+        return self.rng.choice(self.products)
+
+
+def products_list(worker):
+    return "GET", "/api/products?limit=20", None
+
+
+def products_filter(worker):
+    rng = worker.rng
+    low = rng.choice([0, 20, 50, 100])
+    query = {"categorie": rng.choice(list(CATEGORIES)), "min_prix": low, "max_prix": low + rng.choice([25, 50, 150]),
+             "sort": rng.choice(["prix", "-prix", "nom"]), "limit": 20}
+    return "GET", "/api/products?" + urlencode(query), None
+
+
+def products_search(worker):
+    word = worker.rng.choice([noun for nouns in CATEGORIES.values() for noun in nouns] + COLORS)
+    return "GET", "/api/products?" + urlencode({"search": word[:worker.rng.randint(3, len(word))].lower(), "limit": 20}), None
+
+
+def products_skip(worker):
+    return "GET", f"/api/products?skip={worker.rng.randint(0, 10) * 20}&limit=20&total=estimate", None
+
+
+def products_pages(worker):
+    cursor = worker.cursors.get("products_pages", ("", 0))[0]
+    return "GET", "/api/products?" + urlencode({"cursor": cursor, "limit": 20, "sort": "-prix"}), None
+
+
+def orders_pages(worker):
+    cursor = worker.cursors.get("orders_pages", ("", 0))[0]
+    return "GET", "/api/orders/linking?" + urlencode({"cursor": cursor, "limit": 20}), None
+
+
+def product_get(worker):
+    return "GET", f"/api/products/{worker.product()['_id']}", None
+
+
+def tag_add(worker):
+    return "POST", f"/api/products/{worker.product()['_id']}/tags", {"tag": worker.rng.choice(TAGS)}
+
+
+def tag_remove(worker):
+    return "DELETE", f"/api/products/{worker.product()['_id']}/tags", {"tag": worker.rng.choice(TAGS)}
+
+
+def order_lines(worker):
+    count = min(worker.rng.randint(1, 4), len(worker.products))
+    return [(product, worker.rng.randint(1, 3)) for product in worker.rng.sample(worker.products, count)]
+
+
+def order_embedded(worker):
+    lines = [{"produit_id": product["_id"], "nom": product["nom"], "prix": product["prix"], "quantite": quantity}
+             for product, quantity in order_lines(worker)]
+    return "POST", "/api/orders/embedding", {"client_nom": f"Client {worker.rng.randint(1, 999)}", "produits": lines}
+
+
+def order_linking(worker):
+    lines = [{"produit_id": product["_id"], "quantite": quantity} for product, quantity in order_lines(worker)]
+    return "POST", "/api/orders/linking", {"client_id": worker.rng.choice(worker.clients), "produits": lines}
+
+
+def stats_sales(worker):
+    return "GET", "/api/stats/sales-by-category", None
+
+
+def stats_stock(worker):
+    return "GET", "/api/stats/stock-by-category", None
+
+
+def stats_top(worker):
+    return "GET", "/api/stats/top-products", None
+
+
+# name: (scenario, expected statuses)
+SCENARIOS = {
+    "products_list": (products_list, {200}),
+    "products_filter": (products_filter, {200}),
+    "products_search": (products_search, {200}),
+    "products_skip": (products_skip, {200}),
+    "products_pages": (products_pages, {200}),
+    "product_get": (product_get, {200}),
+    "tag_add": (tag_add, {200}),
+    "tag_remove": (tag_remove, {200}),
+    "order_embedded": (order_embedded, {201, 409}),
+    "order_linking": (order_linking, {201, 409}),
+    "orders_pages": (orders_pages, {200}),
+    "stats_sales": (stats_sales, {200}),
+    "stats_stock": (stats_stock, {200}),
+    "stats_top": (stats_top, {200}),
+}
+
+MIXES = {
+    # Storefront: mostly catalogue reads, a few orders
+    "browse": {"products_list": 10, "products_filter": 25, "products_search": 10, "products_skip": 5,
+               "products_pages": 15, "product_get": 20, "order_embedded": 2, "order_linking": 2,
+               "orders_pages": 3, "stats_top": 3, "tag_add": 1, "tag_remove": 1,
+               "stats_sales": 1, "stats_stock": 2},
+    # Sales peak: order writes compete with catalogue reads
+    "checkout": {"products_filter": 15, "product_get": 20, "products_pages": 5, "order_embedded": 20,
+                 "order_linking": 20, "orders_pages": 5, "stats_top": 5, "stats_sales": 5, "stats_stock": 5},
+    # Back office: catalogue edits and dashboards
+    "admin": {"products_list": 10, "products_pages": 10, "tag_add": 20, "tag_remove": 20, "orders_pages": 10,
+              "stats_sales": 10, "stats_stock": 10, "stats_top": 10},
+}
+
+
+def parse_weights(mix, overrides):
+    weights = dict(MIXES[mix])
+    for item in filter(None, (overrides or "").split(",")):
+        name, _, value = item.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown endpoint {name!r} (one of {', '.join(SCENARIOS)})")
+        weights[name] = float(value)
+    weights = {name: weight for name, weight in weights.items() if weight > 0}
+    if not weights:
+        raise ValueError("every weight is 0")
+    return weights
+
+
+# --- Transports ---
+
+class InProcessTransport:
+    """The Flask app through one test client per thread (no HTTP parsing)."""
+
+    def __init__(self, flask_app, headers):
+        self.app = flask_app
+        self.headers = headers
+        self.local = threading.local()
+
+    def send(self, method, path, body):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.app.test_client()
+        response = self.local.client.open(path, method=method, json=body, headers=self.headers)
+        return response.status_code, compress.decompress(response.get_data(), response.headers.get("Content-Encoding"))
+
+
+class HttpTransport:
+    """A running server, one keep-alive connection per thread."""
+
+    def __init__(self, url, headers, timeout=30):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.headers = headers
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def send(self, method, path, body):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        headers = dict(self.headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        try:
+            connection.request(method, self.prefix + path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            raise
+        return response.status, compress.decompress(data, response.getheader("Content-Encoding"))
+
+
+# --- Data ---
+
+def seed(db, products, clients, orders):
+    """Scratch catalogue with plenty of stock, so orders are rarely rejected."""
+    import search
+
+    rng = random.Random(42)
+    docs = []
+    for i in range(products):
+        categorie = rng.choice(list(CATEGORIES))
+        nom = f"{rng.choice(CATEGORIES[categorie])} {rng.choice(COLORS)} {i}"
+        docs.append({"nom": nom, "prix": round(rng.uniform(5, 250), 2), "stock": 1_000_000, "categorie": categorie,
+                     "tags": rng.sample(TAGS, 2), "mots_cles": search.search_tokens(nom),
+                     "derniere_modification": datetime.now(timezone.utc)})
+    product_ids = db.Produits.insert_many(docs).inserted_ids
+    client_ids = db.Clients.insert_many([
+        {"nom": f"Nom {i}", "prenom": f"Prenom {i}", "email": f"client{i}@example.com", "ville": "Paris"}
+        for i in range(clients)
+    ]).inserted_ids
+    if orders:
+        db.CommandesLinking.insert_many([
+            {"client_id": rng.choice(client_ids), "date_commande": datetime.now(), "statut": "En cours",
+             "produits": [{"produit_id": product_id, "quantite": rng.randint(1, 3)}
+                          for product_id in rng.sample(product_ids, min(3, products))]}
+            for _ in range(orders)
+        ])
+
+
+def discover(transport, sample):
+    """Products and clients to reference, read through the API itself."""
+    status, data = transport.send("GET", f"/api/products?fields=nom,prix,categorie&limit={sample}&total=none", None)
+    if status != 200:
+        raise RuntimeError(f"GET /api/products answered {status}")
+    products = json.loads(data)["data"]
+    status, data = transport.send("GET", "/api/clients?fields=nom", None)
+    if status != 200:
+        raise RuntimeError(f"GET /api/clients answered {status}")
+    clients = [client["_id"] for client in json.loads(data)["data"]]
+    if not products or not clients:
+        raise RuntimeError("the database has no products or no clients (python db_init.py)")
+    return products, clients
+
+
+# --- Run ---
+
+def run(transport, weights, concurrency, duration, warmup, seed_value, products, clients):
+    """Closed-loop workers; returns (measured seconds, {name: {'latencies': [...], 'statuses': Counter}})."""
+    names = list(weights)
+    values = list(weights.values())
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+    results = []
+
+    def work(index):
+        worker = Worker(seed_value * 1000 + index, products, clients)
+        samples = {name: {"latencies": [], "statuses": Counter()} for name in names}
+        results.append(samples)
+        while True:
+            name = worker.rng.choices(names, values)[0]
+            scenario, expected = SCENARIOS[name]
+            method, path, body = scenario(worker)
+            began = time.perf_counter()
+            if began >= stop_at:
+                return
+            try:
+                status, data = transport.send(method, path, body)
+            except Exception:
+                status, data = 0, b""
+            elapsed = time.perf_counter() - began
+            if name in PAGE_WALKS:
+                walk = worker.cursors.get(name, ("", 0))[1] + 1
+                token = None
+                if status == 200:
+                    try:
+                        token = json.loads(data).get("next_cursor")
+                    except (ValueError, AttributeError):
+                        # Undecodable body: an error, and the walk starts over
+                        status = 0
+                worker.cursors[name] = (token, walk) if token and walk < PAGE_WALK else ("", 0)
+            if began >= measure_from:
+                samples[name]["latencies"].append(elapsed)
+                samples[name]["statuses"][status] += 1
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    merged = {name: {"latencies": [], "statuses": Counter()} for name in names}
+    for samples in results:
+        for name, sample in samples.items():
+            merged[name]["latencies"].extend(sample["latencies"])
+            merged[name]["statuses"].update(sample["statuses"])
+    return time.perf_counter() - measure_from, merged
+
+
+def summarize(latencies, statuses, expected, seconds):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    pick = lambda q: round(latencies[min(int(q * count), count - 1)] * 1000, 3) if count else None
+    errors = sum(n for status, n in statuses.items() if status not in expected)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "rps": round(count / seconds, 1),
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else None,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(latencies[-1] * 1000, 3) if count else None,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+    }
+
+
+def build_results(args, target, weights, seconds, samples):
+    endpoints = {
+        name: summarize(sample["latencies"], sample["statuses"], SCENARIOS[name][1], seconds)
+        for name, sample in samples.items()
+    }
+    all_latencies = [value for sample in samples.values() for value in sample["latencies"]]
+    all_statuses = Counter()
+    errors = 0
+    for name, sample in samples.items():
+        all_statuses.update(sample["statuses"])
+        errors += endpoints[name]["errors"]
+    total = summarize(all_latencies, all_statuses, set(), seconds)
+    total["errors"] = errors
+    total["error_rate"] = round(errors / total["requests"], 4) if total["requests"] else 0.0
+    return {
+        "version": 1,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": target,
+        "mix": args.mix,
+        "weights": weights,
+        "concurrency": args.concurrency,
+        "duration_s": round(seconds, 3),
+        "seed": args.seed,
+        "total": total,
+        "endpoints": endpoints,
+    }
+
+
+def print_results(results):
+    def line(name, stats):
+        if not stats["requests"]:
+            return f"   {name:<16}: no request"
+        return (f"   {name:<16}: {stats['requests']:7} req  {stats['rps']:8.1f} req/s  "
+                f"p50 {stats['p50_ms']:7.1f}  p95 {stats['p95_ms']:7.1f}  p99 {stats['p99_ms']:7.1f} ms  "
+                f"{'❌' if stats['errors'] else '  '} errors {stats['error_rate']:.1%}")
+
+    for name, stats in results["endpoints"].items():
+        print(line(name, stats))
+    print("   " + "-" * 69)
+    print(line("total", results["total"]))
+    for name, stats in results["endpoints"].items():
+        if stats["errors"]:
+            print(f"   ⚠️  {name}: statuses {stats['statuses']}")
+
+
+# --- Baseline ---
+
+def compare(results, baseline, tolerance, min_delta_ms, min_requests):
+    """Print the change of every endpoint vs the baseline; returns the regressions."""
+    differ = [key for key in ("target", "mix", "weights", "concurrency") if baseline.get(key) != results[key]]
+    if differ:
+        print(f"   ⚠️  the runs differ in {', '.join(differ)}: the comparison may not be meaningful")
+    regressions = []
+    rows = [("total", results["total"], baseline.get("total"))]
+    rows += [(name, stats, baseline.get("endpoints", {}).get(name)) for name, stats in results["endpoints"].items()]
+    for name, current, base in rows:
+        if not base or not base.get("requests") or not current["requests"]:
+            print(f"   {name:<16}: not in both runs")
+            continue
+        if min(base["requests"], current["requests"]) < min_requests:
+            print(f"   {name:<16}: too few requests to compare")
+            continue
+        problems = []
+        rps_change = current["rps"] / base["rps"] - 1 if base["rps"] else 0.0
+        if rps_change < -tolerance:
+            problems.append("req/s")
+        p95_change = current["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        if p95_change > tolerance and current["p95_ms"] - base["p95_ms"] > min_delta_ms:
+            problems.append("p95")
+        if current["error_rate"] - base["error_rate"] > 0.01:
+            problems.append("errors")
+        if problems:
+            regressions.append((name, problems))
+        print(f"   {'❌' if problems else '✅'} {name:<16}: req/s {rps_change:+7.1%}   p95 {p95_change:+7.1%}   "
+              f"errors {base['error_rate']:.1%} -> {current['error_rate']:.1%}"
+              f"{'   (' + ', '.join(problems) + ')' if problems else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: the app in-process)")
+    parser.add_argument("--mongomock", action="store_true", help="in-process, on mongomock instead of MongoDB")
+    parser.add_argument("--concurrency", type=int, default=16, help="worker threads (requests in flight)")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds run before measuring")
+    parser.add_argument("--mix", choices=list(MIXES), default="browse")
+    parser.add_argument("--weights", help="overrides, e.g. tag_add=0,stats_top=10")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the workers")
+    parser.add_argument("--accept-encoding", default="gzip", help="Accept-Encoding sent (empty: none)")
+    parser.add_argument("--sample", type=int, default=1000, help="products discovered for ids")
+    parser.add_argument("--products", type=int, default=5000, help="in-process: products seeded")
+    parser.add_argument("--clients", type=int, default=500, help="in-process: clients seeded")
+    parser.add_argument("--orders", type=int, default=5000, help="in-process: linked orders seeded")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="results JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative change (default: 0.10)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="p95 increases below this are noise")
+    parser.add_argument("--min-requests", type=int, default=30, help="fewer requests per endpoint are not compared")
+    args = parser.parse_args()
+
+    try:
+        weights = parse_weights(args.mix, args.weights)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.url and args.mongomock:
+        parser.error("--mongomock runs the app in-process: drop --url")
+    if "zstd" in args.accept_encoding and not compress.ZSTD_AVAILABLE:
+        parser.error("--accept-encoding zstd needs Python 3.14 or zstandard to decode responses")
+    headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    client = db = None
+    if args.url:
+        transport = HttpTransport(args.url, headers)
+        target = args.url
+    else:
+        if args.mongomock:
+            try:
+                import mongomock
+            except ImportError:
+                print("❌ --mongomock needs: pip install mongomock")
+                return 2
+            database._client = mongomock.MongoClient()
+            database._client_pid = os.getpid()
+            target = "in-process (mongomock)"
+        else:
+            target = f"in-process ({database.MONGO_URI})"
+        # The app reads database.DATABASE_NAME on every request
+        database.DATABASE_NAME = f"{database.DATABASE_NAME}_bench"
+        client = database.get_client()
+        db = database.get_db()
+        client.drop_database(db.name)
+
+        from app import app as flask_app
+        transport = InProcessTransport(flask_app, headers)
+
+    print("=" * 72)
+    print(f"📊 {target}: mix {args.mix}, {args.concurrency} workers, {args.duration:g} s (+{args.warmup:g} s warmup)")
+    print("=" * 72)
+    try:
+        if db is not None:
+            seed(db, args.products, args.clients, args.orders)
+            if not args.mongomock:
+                import indexes
+                indexes.ensure_indexes(db)
+        products, clients = discover(transport, args.sample)
+        seconds, samples = run(transport, weights, args.concurrency, args.duration, args.warmup,
+                               args.seed, products, clients)
+    finally:
+        if client is not None:
+            client.drop_database(db.name)
+            database.close_client()
+
+    results = build_results(args, target, weights, seconds, samples)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Results written to {args.output}")
+
+    if baseline is None:
+        return 0
+    print("\n" + "=" * 72)
+    print(f"🔍 Baseline {args.baseline} (tolerance {args.tolerance:.0%})")
+    print("=" * 72)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms, args.min_requests)
+    print(f"\n{'✅' if not regressions else '❌'} {len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Mutation Round-Trip Benchmark
+==============================
+Compares the former write pattern of the update endpoints (optional
+existence find_one, update_one, then find_one for the response) with
+app.mutate_one (a single find_one_and_update returning the post-image).
+
+Round trips are counted with a pymongo CommandListener. Needs a running
+MongoDB (MONGO_URI); works in a scratch database that is dropped at the end.
+
+Usage:
+    python benchmarks/bench_mutations.py [--ops 2000] [--docs 200]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app import PRODUCT_PROJECTION, mutate_one
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Count commands sent to the server (one per round trip)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def update_product_before(collection, product_id, i):
+    """update_product before: existence check, update_one, find_one."""
+    if collection.find_one({"_id": product_id}) is None:
+        return None
+    collection.update_one({"_id": product_id}, {"$set": {"prix": i}, "$currentDate": {"derniere_modification": True}})
+    return collection.find_one({"_id": product_id})
+
+
+def update_product_after(collection, product_id, i):
+    update = {"$set": {"prix": i}, "$currentDate": {"derniere_modification": True}}
+    return mutate_one(collection, product_id, update, PRODUCT_PROJECTION)
+
+
+def add_tag_before(collection, product_id, i):
+    """add_tag / order updates before: update_one, then find_one."""
+    collection.update_one({"_id": product_id}, {"$addToSet": {"tags": f"t{i % 5}"}})
+    return collection.find_one({"_id": product_id})
+
+
+def add_tag_after(collection, product_id, i):
+    return mutate_one(collection, product_id, {"$addToSet": {"tags": f"t{i % 5}"}}, PRODUCT_PROJECTION)
+
+
+def run(fn, collection, ids, ops, counter):
+    """Return (seconds, commands per op) for ops calls of fn."""
+    counter.count = 0
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(collection, ids[i % len(ids)], i)
+    elapsed = time.perf_counter() - start
+    return elapsed, counter.count / ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--docs", type=int, default=200)
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    client = MongoClient(database.MONGO_URI, event_listeners=[counter])
+    db = client[f"{database.DATABASE_NAME}_bench"]
+    collection = db.Produits
+    collection.drop()
+    ids = collection.insert_many([
+        {"nom": f"Produit {i}", "prix": 10.0, "stock": 100, "categorie": "Vêtements", "tags": []}
+        for i in range(args.docs)
+    ]).inserted_ids
+
+    cases = [
+        ("update_product", update_product_before, update_product_after),
+        ("add_tag / order updates", add_tag_before, add_tag_after),
+    ]
+
+    print("=" * 60)
+    print(f"📊 Mutation round trips ({args.ops} ops, {args.docs} docs)")
+    print("=" * 60)
+    try:
+        for name, before, after in cases:
+            t_before, rt_before = run(before, collection, ids, args.ops, counter)
+            t_after, rt_after = run(after, collection, ids, args.ops, counter)
+            print(f"\n{name}")
+            print(f"   before: {rt_before:.1f} round trips/op, {t_before / args.ops * 1000:7.3f} ms/op")
+            print(f"   after : {rt_after:.1f} round trips/op, {t_after / args.ops * 1000:7.3f} ms/op"
+                  f"  (x{t_before / t_after:.2f})")
+    finally:
+        client.drop_database(db.name)
+        client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Serialization Microbenchmark
+=============================
+Compares the legacy serialize_doc path with the single-pass encoders in
+serialization.py. Every path starts from raw BSON batches (what the
+driver receives) and ends with the JSON text jsonify() would send.
+Runs without MongoDB: documents are synthetic linked orders.
+
+Usage:
+    python benchmarks/bench_serialization.py [--docs 5000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import bson
+from bson import ObjectId
+from bson.codec_options import DEFAULT_CODEC_OPTIONS
+from bson.decimal128 import Decimal128
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, serialize_doc
+from serialization import JSON_CODEC_OPTIONS, decode_raw_batches
+
+
+def make_documents(n):
+    """Build documents shaped like /api/orders/linking results."""
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    docs = []
+    for i in range(n):
+        produits = [{"produit_id": ObjectId(), "quantite": j + 1} for j in range(3)]
+        docs.append({
+            "_id": ObjectId(),
+            "client_id": ObjectId(),
+            "date_commande": now + timedelta(minutes=i),
+            "statut": "En préparation",
+            "produits": produits,
+            "produits_details": [
+                {
+                    "_id": p["produit_id"],
+                    "nom": f"Produit {i}-{j}",
+                    "prix": 19.99 + j,
+                    "stock": 100,
+                    "categorie": "Vêtements",
+                    "tags": ["mode", "été"],
+                    "derniere_modification": now,
+                }
+                for j, p in enumerate(produits)
+            ],
+            "client_details": [{"_id": ObjectId(), "nom": "Dupont", "prenom": "Marie", "ville": "Paris"}],
+        })
+    return docs
+
+
+def raw_batches(docs, batch_size=100):
+    """Encode docs into raw BSON batches like find_raw_batches() returns."""
+    batches = []
+    for i in range(0, len(docs), batch_size):
+        batches.append(b"".join(bson.encode(d) for d in docs[i:i + batch_size]))
+    return batches
+
+
+def dumps(obj):
+    """Encode like jsonify() outside debug mode."""
+    return app.json.dumps(obj, separators=(",", ":"))
+
+
+def legacy_path(batches):
+    """Before: decode, copy with serialize_doc, encode."""
+    docs = list(decode_raw_batches(batches, DEFAULT_CODEC_OPTIONS))
+    return dumps(serialize_doc(docs))
+
+
+def provider_path(batches):
+    """BSONJSONProvider: decode, encode BSON types in the encoder."""
+    docs = list(decode_raw_batches(batches, DEFAULT_CODEC_OPTIONS))
+    return dumps(docs)
+
+
+def codec_path(batches):
+    """JSON_CODEC_OPTIONS: decode straight to JSON-ready values, encode."""
+    docs = list(decode_raw_batches(batches, JSON_CODEC_OPTIONS))
+    return dumps(docs)
+
+
+def timed(fn, repeat):
+    """Return the best wall time over repeat runs, and the last result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    batches = raw_batches(make_documents(args.docs))
+
+    with app.app_context():
+        t_legacy, out_legacy = timed(lambda: legacy_path(batches), args.repeat)
+        t_provider, out_provider = timed(lambda: provider_path(batches), args.repeat)
+        t_codec, out_codec = timed(lambda: codec_path(batches), args.repeat)
+
+        # Decimal128 was not encodable before; it is now rendered like Decimal
+        decimal_doc = {"prix": Decimal128("19.99")}
+        decimal_ok = dumps(decimal_doc) == dumps({"prix": Decimal("19.99")})
+        raw_decimal = bson.encode(decimal_doc)
+        decimal_ok = decimal_ok and dumps(list(decode_raw_batches([raw_decimal]))) == dumps([{"prix": "19.99"}])
+
+    print("=" * 60)
+    print(f"📊 Serialization benchmark ({args.docs} docs, best of {args.repeat})")
+    print("=" * 60)
+    print(f"   serialize_doc (before)   : {t_legacy * 1000:8.1f} ms")
+    print(f"   BSONJSONProvider         : {t_provider * 1000:8.1f} ms  (x{t_legacy / t_provider:.2f})")
+    print(f"   JSON_CODEC_OPTIONS decode: {t_codec * 1000:8.1f} ms  (x{t_legacy / t_codec:.2f})")
+    print(f"   output size              : {len(out_codec) / 1024:8.1f} KiB")
+
+    identical = out_legacy == out_provider == out_codec
+    print(f"\n{'✅' if identical else '❌'} Outputs identical: {identical}")
+    print(f"{'✅' if decimal_ok else '❌'} Decimal128 encoded as string: {decimal_ok}")
+    return 0 if identical and decimal_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
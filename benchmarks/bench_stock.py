@@ -0,0 +1,136 @@
+"""
+Stock Reservation Concurrency Benchmark
+========================================
+Many threads place orders on a few hot products at once, two ways:
+
+  - read-check-write : find_one the stock, check it, then $inc (the race
+                       order creation had with a separate stock check)
+  - reserve          : stock.reserve (conditional $inc decrements, in a
+                       transaction on a replica set, else one by one with
+                       compensating $inc on a shortfall)
+
+Each order takes 1 to --lines products with quantities of 1 or 2. Reports
+orders/s, rejected orders, and checks the stock at the end: no product
+below 0 (no oversell) and initial - final == quantities of accepted
+orders (nothing lost by the rollbacks).
+
+Needs a running MongoDB (MONGO_URI); works in a scratch database that is
+dropped at the end.
+
+Usage:
+    python benchmarks/bench_stock.py [--threads 32] [--orders 4000] [--products 5] [--stock 1000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import stock
+
+
+def read_check_write(db, lines):
+    """Former pattern: check every line, then decrement (no atomicity)."""
+    for line in lines:
+        product = db.Produits.find_one({"_id": line["produit_id"]}, {"stock": 1})
+        if product is None or product["stock"] < line["quantite"]:
+            return False
+    for line in lines:
+        db.Produits.update_one({"_id": line["produit_id"]}, {"$inc": {"stock": -line["quantite"]}})
+    return True
+
+
+def reserve(db, lines):
+    try:
+        stock.reserve(db, lines)
+    except stock.StockShortfall:
+        return False
+    return True
+
+
+def make_orders(product_ids, count, max_lines):
+    rng = random.Random(7)
+    return [
+        [{"produit_id": product_id, "quantite": rng.randint(1, 2)}
+         for product_id in rng.sample(product_ids, rng.randint(1, max_lines))]
+        for _ in range(count)
+    ]
+
+
+def run(db, place, orders, threads):
+    """Return (seconds, accepted orders, {produit_id: quantity taken by accepted orders})."""
+    taken = {}
+    lock = threading.Lock()
+
+    def one(lines):
+        if not place(db, lines):
+            return 0
+        db.CommandesLinking.insert_one({"statut": "En cours", "produits": lines})
+        with lock:
+            for line in lines:
+                taken[line["produit_id"]] = taken.get(line["produit_id"], 0) + line["quantite"]
+        return 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        accepted = sum(pool.map(one, orders))
+    return time.perf_counter() - start, accepted, taken
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=4000)
+    parser.add_argument("--products", type=int, default=5, help="hot products shared by every order")
+    parser.add_argument("--stock", type=int, default=1000, help="initial stock of each product")
+    parser.add_argument("--lines", type=int, default=3, help="most products per order")
+    args = parser.parse_args()
+
+    client = MongoClient(database.MONGO_URI, maxPoolSize=args.threads + 4)
+    db = client[f"{database.DATABASE_NAME}_bench"]
+    client.drop_database(db.name)
+
+    print("=" * 72)
+    print(f"📊 {args.orders} orders, {args.threads} threads, {args.products} hot products "
+          f"with {args.stock} in stock each")
+    print("=" * 72)
+    failures = 0
+    try:
+        for name, place in [("read-check-write", read_check_write), ("reserve", reserve)]:
+            db.Produits.drop()
+            db.CommandesLinking.drop()
+            product_ids = db.Produits.insert_many([
+                {"nom": f"Produit {i}", "prix": 10.0, "stock": args.stock, "categorie": "Vêtements"}
+                for i in range(args.products)
+            ]).inserted_ids
+            orders = make_orders(product_ids, args.orders, min(args.lines, args.products))
+
+            elapsed, accepted, taken = run(db, place, orders, args.threads)
+            final = {doc["_id"]: doc["stock"] for doc in db.Produits.find({}, {"stock": 1})}
+            oversold = sum(-value for value in final.values() if value < 0)
+            consistent = all(args.stock - final[pid] == taken.get(pid, 0) for pid in product_ids)
+            ok = oversold == 0 and consistent and db.Produits.count_documents({}) == args.products
+            failures += name == "reserve" and not ok
+
+            print(f"\n{name}")
+            print(f"   {len(orders) / elapsed:8.0f} orders/s   accepted {accepted}   rejected {len(orders) - accepted}")
+            print(f"   units sold {sum(taken.values())} of {args.stock * args.products}   "
+                  f"lowest stock {min(final.values())}")
+            print(f"   {'✅' if oversold == 0 else '❌'} oversold units: {oversold}   "
+                  f"{'✅' if consistent else '❌'} stock matches accepted orders")
+    finally:
+        client.drop_database(db.name)
+        client.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+BoutiqueComplete1 - In-Process Caches
+======================================
+Small thread-safe TTL + LRU cache used for short-lived query results.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from bson import json_util
+
+
+def make_key(*parts):
+    """Build a stable cache key from query documents (dict key order ignored)."""
+    return json_util.dumps(parts, sort_keys=True)
+
+
+class TTLCache:
+    """
+    Size-bounded cache with per-entry expiry.
+    Least recently used entries are evicted once maxsize is reached.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value, or default if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING or entry[0] <= now:
+                if entry is not self._MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entries if full."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Read-through helper: return the cached value or compute and store it."""
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def delete(self, key):
+        """Drop one entry if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry (write-driven invalidation)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,347 @@
+"""
+BoutiqueComplete1 - Response Compression
+=========================================
+Negotiated gzip / deflate / zstd compression of API responses (JSON,
+NDJSON) and HTML pages. JSON with repeated field names compresses
+roughly 10x, e.g. the linked orders with their joined products. Static
+files are sent as is (leave them to the front web server).
+
+  - The encoding follows Accept-Encoding (client q-values first, then
+    COMPRESS_ALGORITHMS order). zstd needs Python 3.14 or `zstandard`.
+  - Buffered responses are compressed once they reach COMPRESS_MIN_SIZE
+    bytes; smaller ones are sent as is.
+  - Streamed responses (?stream=, ingestion summaries) are compressed
+    chunk by chunk with a sync flush, so each batch still reaches the
+    client as soon as it is produced.
+  - A compressed response gets a weak ETag (W/"..."): If-None-Match
+    still matches it, and PUT accepts it in If-Match.
+
+Bytes in/out and the CPU time spent compressing are counted per
+encoding (GET /api/compression/stats). Level trade-offs:
+`python benchmarks/bench_compression.py`.
+
+Configuration (environment):
+  - COMPRESS_ALGORITHMS: preference order (default: zstd,gzip,deflate;
+    empty disables compression, e.g. behind a compressing proxy)
+  - COMPRESS_MIN_SIZE: smallest body compressed, in bytes (default: 1024)
+  - COMPRESS_LEVEL: gzip/deflate level 1-9 (default: 6)
+  - COMPRESS_ZSTD_LEVEL: zstd level 1-22 (default: 3)
+"""
+
+import os
+import threading
+import time
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    from compression import zstd as _zstd  # Python 3.14+
+except ImportError:
+    _zstd = None
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+ZSTD_AVAILABLE = _zstd is not None or _zstandard is not None
+
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3))
+
+ALGORITHMS = [
+    name.strip() for name in os.environ.get('COMPRESS_ALGORITHMS', 'zstd,gzip,deflate').split(',')
+    if name.strip() in ('gzip', 'deflate') or (name.strip() == 'zstd' and ZSTD_AVAILABLE)
+]
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'image/svg+xml'
+)
+
+
+# --- Encoders ---
+# compress(data) returns what can be sent so far; final=True ends the stream.
+
+class _ZlibEncoder:
+    """gzip (wbits 31) or deflate (wbits 15: zlib format, as HTTP defines it)."""
+
+    def __init__(self, wbits, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data, final=False):
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _ZstdEncoder:
+    def __init__(self, level):
+        if _zstd is not None:
+            self._z = _zstd.ZstdCompressor(level)
+            self._block, self._frame = _zstd.ZstdCompressor.FLUSH_BLOCK, _zstd.ZstdCompressor.FLUSH_FRAME
+        else:
+            self._z = _zstandard.ZstdCompressor(level=level).compressobj()
+            self._block, self._frame = _zstandard.COMPRESSOBJ_FLUSH_BLOCK, _zstandard.COMPRESSOBJ_FLUSH_FINISH
+
+    def compress(self, data, final=False):
+        if _zstd is not None:
+            return self._z.compress(data, mode=self._frame if final else self._block)
+        return self._z.compress(data) + self._z.flush(self._frame if final else self._block)
+
+
+def make_encoder(encoding, level=None):
+    """New stream encoder for 'gzip', 'deflate' or 'zstd' (level: module default)."""
+    if encoding == 'zstd':
+        return _ZstdEncoder(ZSTD_LEVEL if level is None else level)
+    wbits = 31 if encoding == 'gzip' else 15
+    return _ZlibEncoder(wbits, LEVEL if level is None else level)
+
+
+def decompress(data, encoding):
+    """Decode a whole response body sent with Content-Encoding encoding (benchmarks, tests)."""
+    if encoding == 'zstd':
+        if _zstd is not None:
+            return _zstd.decompress(data)
+        # Streamed frames carry no content size: ZstdDecompressor.decompress refuses them
+        return _zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if encoding in ('gzip', 'deflate'):
+        return zlib.decompress(data, 31 if encoding == 'gzip' else 15)
+    return data
+
+
+# --- Counters ---
+
+class CompressionStats:
+    """Thread-safe per-encoding counters: responses, bytes in/out, CPU time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._encodings = {}
+        self.identity = 0
+        self.below_min_size = 0
+
+    def record(self, encoding, bytes_in, bytes_out, cpu_seconds, streamed=False):
+        with self._lock:
+            entry = self._encodings.setdefault(encoding, {
+                'responses': 0, 'streamed': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0
+            })
+            entry['responses'] += 1
+            entry['streamed'] += streamed
+            entry['bytes_in'] += bytes_in
+            entry['bytes_out'] += bytes_out
+            entry['cpu_seconds'] += cpu_seconds
+
+    def skipped(self, below_min_size):
+        with self._lock:
+            if below_min_size:
+                self.below_min_size += 1
+            else:
+                self.identity += 1
+
+    def snapshot(self):
+        with self._lock:
+            encodings = {}
+            for name, entry in self._encodings.items():
+                bytes_in, bytes_out = entry['bytes_in'], entry['bytes_out']
+                encodings[name] = {
+                    'responses': entry['responses'],
+                    'streamed': entry['streamed'],
+                    'bytes_in': bytes_in,
+                    'bytes_out': bytes_out,
+                    'bytes_saved': bytes_in - bytes_out,
+                    'ratio': round(bytes_in / bytes_out, 2) if bytes_out else None,
+                    'cpu_ms': round(entry['cpu_seconds'] * 1000, 3),
+                    'cpu_us_per_kb': round(entry['cpu_seconds'] * 1e6 / (bytes_in / 1024), 2) if bytes_in else None
+                }
+            return {
+                'algorithms': ALGORITHMS,
+                'min_size': MIN_SIZE,
+                'level': LEVEL,
+                'zstd_level': ZSTD_LEVEL if ZSTD_AVAILABLE else None,
+                'encodings': encodings,
+                'uncompressed': {'not_accepted': self.identity, 'below_min_size': self.below_min_size}
+            }
+
+    def reset(self):
+        with self._lock:
+            self._encodings.clear()
+            self.identity = 0
+            self.below_min_size = 0
+
+
+stats = CompressionStats()
+
+
+# --- Negotiation ---
+
+def negotiate(accept_encoding):
+    """Best encoding for an Accept-Encoding header value, or None."""
+    if not accept_encoding or not ALGORITHMS:
+        return None
+    return parse_accept_header(accept_encoding).best_match(ALGORITHMS)
+
+
+def is_compressible(status, mimetype, content_encoding, method='GET'):
+    """Whether a response may be compressed at all (before size and negotiation)."""
+    return (
+        bool(ALGORITHMS)
+        and method != 'HEAD'
+        and 200 <= status < 300 and status not in (204, 206)
+        and not content_encoding
+        and mimetype in COMPRESSIBLE_TYPES
+    )
+
+
+def weak_etag(value):
+    """The weak form of an ETag header value (unchanged if already weak)."""
+    return value if value.startswith('W/') else 'W/' + value
+
+
+def compress_body(data, encoding):
+    """One-shot compression of a full body, counted in stats."""
+    start = time.thread_time()
+    body = make_encoder(encoding).compress(data, final=True)
+    stats.record(encoding, len(data), len(body), time.thread_time() - start)
+    return body
+
+
+class _StreamCounter:
+    """Compress successive chunks of one streamed body, counted in stats when done."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.encoder = make_encoder(encoding)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu = 0.0
+
+    def compress(self, data, final=False):
+        start = time.thread_time()
+        out = self.encoder.compress(data, final)
+        self.cpu += time.thread_time() - start
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        if final:
+            stats.record(self.encoding, self.bytes_in, self.bytes_out, self.cpu, streamed=True)
+        return out
+
+
+# --- Flask (WSGI) ---
+
+def _iter_compressed(chunks, stream, original):
+    try:
+        for chunk in chunks:
+            if chunk:
+                data = stream.compress(chunk)
+                if data:
+                    yield data
+        yield stream.compress(b'', final=True)
+    finally:
+        close = getattr(original, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(request, response):
+    """Flask after_request hook: compress the response if worth it and accepted."""
+    if response.direct_passthrough or not is_compressible(
+        response.status_code, response.mimetype, response.headers.get('Content-Encoding'), request.method
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        stats.skipped(below_min_size=False)
+        return response
+
+    if response.is_streamed:
+        original = response.response
+        response.response = _iter_compressed(response.iter_encoded(), _StreamCounter(encoding), original)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            stats.skipped(below_min_size=True)
+            return response
+        response.set_data(compress_body(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = weak_etag(response.headers['ETag'])
+    return response
+
+
+# --- ASGI (async_app.py) ---
+
+class CompressionMiddleware:
+    """
+    ASGI middleware with the same rules as compress_response. Bodies with a
+    Content-Length are buffered and compressed once (below MIN_SIZE: sent
+    as is); bodies without one are compressed as a stream. Responses
+    already negotiated by compress_response (the Flask routes) pass through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not ALGORITHMS:
+            return await self.app(scope, receive, send)
+
+        accept = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+        state = {'mode': 'passthrough', 'start': None, 'buffer': [], 'stream': None}
+
+        async def send_compressed(message):
+            if message['type'] == 'http.response.start':
+                start_headers = message.get('headers', [])
+                headers = {k.lower(): v for k, v in start_headers}
+                mimetype = headers.get(b'content-type', b'').split(b';')[0].strip().decode('latin-1')
+                vary = [v for k, v in start_headers if k.lower() == b'vary']
+                if (not is_compressible(message['status'], mimetype, headers.get(b'content-encoding'), scope['method'])
+                        or b'accept-encoding' in b','.join(vary).lower()):
+                    # Not compressible, or already negotiated (Flask routes)
+                    return await send(message)
+
+                vary.append(b'Accept-Encoding')
+                start_headers = [(k, v) for k, v in start_headers if k.lower() != b'vary']
+                start_headers.append((b'vary', b', '.join(vary)))
+                encoding = negotiate(accept)
+                length = headers.get(b'content-length')
+                if encoding is None or (length is not None and int(length) < MIN_SIZE):
+                    stats.skipped(below_min_size=encoding is not None)
+                    return await send({**message, 'headers': start_headers})
+
+                start_headers = [
+                    (k, weak_etag(v.decode('latin-1')).encode('latin-1') if k.lower() == b'etag' else v)
+                    for k, v in start_headers if k.lower() != b'content-length'
+                ]
+                start_headers.append((b'content-encoding', encoding.encode()))
+                state['start'] = {**message, 'headers': start_headers}
+                state['encoding'] = encoding
+                if length is None:
+                    state['mode'] = 'stream'
+                    state['stream'] = _StreamCounter(encoding)
+                    return await send(state['start'])
+                state['mode'] = 'buffer'
+                return
+
+            if message['type'] != 'http.response.body' or state['mode'] == 'passthrough':
+                return await send(message)
+
+            more_body = message.get('more_body', False)
+            if state['mode'] == 'buffer':
+                state['buffer'].append(message.get('body', b''))
+                if more_body:
+                    return
+                body = compress_body(b''.join(state['buffer']), state['encoding'])
+                start = state['start']
+                start['headers'].append((b'content-length', str(len(body)).encode()))
+                await send(start)
+                return await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+            data = state['stream'].compress(message.get('body', b''), final=not more_body)
+            if data or not more_body:
+                await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        return await self.app(scope, receive, send_compressed)
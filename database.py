@@ -0,0 +1,239 @@
+"""
+BoutiqueComplete1 - MongoDB Connection Layer
+=============================================
+A single pooled MongoClient shared by the whole process (app.py, db_init.py),
+plus an AsyncMongoClient for the optional async server (async_app.py).
+
+Configuration is read from the environment:
+  - MONGO_URI: connection string (default: mongodb://localhost:27017)
+  - DATABASE_NAME: database name (default: BoutiqueComplete1)
+  - MONGO_MAX_POOL_SIZE: max connections per server (default: 100)
+  - MONGO_MIN_POOL_SIZE: connections kept open when idle (default: 0)
+  - MONGO_WAIT_QUEUE_TIMEOUT_MS: max wait for a free connection (default: 2000)
+  - MONGO_SERVER_SELECTION_TIMEOUT_MS: max wait for a usable server (default: 5000)
+"""
+
+import os
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo import monitoring
+
+# --- Configuration ---
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = os.environ.get('DATABASE_NAME', 'BoutiqueComplete1')
+MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+
+# --- Shared client state ---
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_client_pid = None
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collect connection pool counters used to size MONGO_MAX_POOL_SIZE."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checked_in = 0
+            self.checkout_failed = 0
+            self.pool_cleared = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self._pending = {}
+
+    # Pool events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    # Connection events
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pending[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failed += 1
+            self._pending.pop(threading.get_ident(), None)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            started = self._pending.pop(threading.get_ident(), None)
+            if started is not None:
+                wait_ms = (time.perf_counter() - started) * 1000
+                self.total_wait_ms += wait_ms
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.checked_out += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_in += 1
+            self.in_use = max(self.in_use - 1, 0)
+
+    def snapshot(self):
+        """Return the counters as a plain dict."""
+        with self._lock:
+            return {
+                'connections_created': self.created,
+                'connections_closed': self.closed,
+                'connections_open': self.created - self.closed,
+                'checkouts': self.checked_out,
+                'checkout_failures': self.checkout_failed,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'avg_wait_ms': round(self.total_wait_ms / self.checked_out, 3) if self.checked_out else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 3),
+                'pool_cleared': self.pool_cleared,
+            }
+
+
+pool_stats = PoolStatsListener()
+
+
+def _create_client():
+    """Build a new MongoClient with the configured pool options."""
+    return MongoClient(
+        MONGO_URI,
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[pool_stats],
+    )
+
+
+def get_client():
+    """
+    Return the process-wide MongoClient, creating it on first use.
+    A client inherited across fork() is never reused: the child builds its own.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = _create_client()
+            _client_pid = pid
+        return _client
+
+
+def get_db():
+    """Get the application database from the shared client."""
+    return get_client()[DATABASE_NAME]
+
+
+def get_async_client():
+    """
+    Return the process-wide AsyncMongoClient, creating it on first use.
+    It belongs to the event loop of the async server; only call it from there.
+    Pool counters (pool_stats) are collected for the sync client only.
+    """
+    # pymongo >= 4.13 (requirements-async.txt); the sync app does not need it
+    from pymongo import AsyncMongoClient
+
+    global _async_client, _async_client_pid
+    pid = os.getpid()
+    if _async_client is None or _async_client_pid != pid:
+        _async_client = AsyncMongoClient(
+            MONGO_URI,
+            maxPoolSize=MAX_POOL_SIZE,
+            minPoolSize=MIN_POOL_SIZE,
+            waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+        )
+        _async_client_pid = pid
+    return _async_client
+
+
+def get_async_db():
+    """Get the application database from the async client."""
+    return get_async_client()[DATABASE_NAME]
+
+
+async def close_async_client():
+    """Close the async client (async server shutdown)."""
+    global _async_client, _async_client_pid
+    if _async_client is not None and _async_client_pid == os.getpid():
+        await _async_client.close()
+    _async_client = None
+    _async_client_pid = None
+
+
+def close_client():
+    """Close the shared client (used at shutdown and in tools)."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def _reset_after_fork():
+    """Drop the parent's client in a forked child (pre-fork servers like gunicorn)."""
+    global _client, _client_pid, _client_lock, _async_client, _async_client_pid
+    _client = None
+    _client_pid = None
+    _async_client = None
+    _async_client_pid = None
+    _client_lock = threading.Lock()
+    pool_stats._lock = threading.Lock()
+    pool_stats.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_pool_stats():
+    """Return pool configuration and live counters."""
+    return {
+        'config': {
+            'max_pool_size': MAX_POOL_SIZE,
+            'min_pool_size': MIN_POOL_SIZE,
+            'wait_queue_timeout_ms': WAIT_QUEUE_TIMEOUT_MS,
+            'server_selection_timeout_ms': SERVER_SELECTION_TIMEOUT_MS,
+        },
+        'pid': os.getpid(),
+        'client_initialized': _client is not None and _client_pid == os.getpid(),
+        'stats': pool_stats.snapshot(),
+    }
@@ -7,20 +7,44 @@ This script:
 3. Inserts sample data (Products, Clients, Orders with embedding and linking)
 4. Creates indexes
 5. Demonstrates various MongoDB operators and operations
+
+    python db_init.py                     # sample data (12 products) and demos
+
+Synthetic data at scale (no demos), generated in worker processes:
+
+    python db_init.py seed --products 1000000 --clients 100000 --orders 1000000 \
+                           [--seed 42] [--workers 8] [--batch-size 5000]
+
+--orders embedded orders and --orders linked orders are generated; they
+reference real product and client _ids. The same --seed gives the same
+documents (and _ids) whatever --workers and --batch-size.
 """
 
-from pymongo import MongoClient
-from datetime import datetime
+import argparse
+import math
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from bson import ObjectId
 
+import database
+import indexes
+import order_lines
+import sales_stats
+import search
+import versions
+
 # --- Configuration ---
-MONGO_URI = "mongodb://localhost:27017"
-DATABASE_NAME = "BoutiqueComplete1"
+MONGO_URI = database.MONGO_URI
+DATABASE_NAME = database.DATABASE_NAME
 
 def get_database():
     """Connect to MongoDB and return the database instance."""
-    client = MongoClient(MONGO_URI)
-    return client[DATABASE_NAME]
+    return database.get_db()
 
 def init_products(db):
     """Initialize Produits collection with 10+ products."""
@@ -39,6 +63,10 @@ def init_products(db):
         {"nom": "Bottes Hiver", "prix": 119.99, "stock": 22, "categorie": "Chaussures"},
     ]
     
+    # Accent-folded name tokens used by the product search
+    for product in products:
+        product["mots_cles"] = search.search_tokens(product["nom"])
+    
     # Drop existing collection and insert fresh data
     db.Produits.drop()
     result = db.Produits.insert_many(products)
@@ -70,8 +98,10 @@ def init_orders_embedding(db, product_ids):
             "date_commande": datetime.now(),
             "statut": "Livrée",
             "produits": [
-                {"nom": products[0]["nom"], "prix": products[0]["prix"], "quantite": 2},
-                {"nom": products[1]["nom"], "prix": products[1]["prix"], "quantite": 1},
+                {"produit_id": products[0]["_id"], "nom": products[0]["nom"], "prix": products[0]["prix"],
+                 "categorie": products[0]["categorie"], "quantite": 2},
+                {"produit_id": products[1]["_id"], "nom": products[1]["nom"], "prix": products[1]["prix"],
+                 "categorie": products[1]["categorie"], "quantite": 1},
             ],
             "total": products[0]["prix"] * 2 + products[1]["prix"]
         },
@@ -80,8 +110,10 @@ def init_orders_embedding(db, product_ids):
             "date_commande": datetime.now(),
             "statut": "En cours",
             "produits": [
-                {"nom": products[2]["nom"], "prix": products[2]["prix"], "quantite": 1},
-                {"nom": products[3]["nom"], "prix": products[3]["prix"], "quantite": 1},
+                {"produit_id": products[2]["_id"], "nom": products[2]["nom"], "prix": products[2]["prix"],
+                 "categorie": products[2]["categorie"], "quantite": 1},
+                {"produit_id": products[3]["_id"], "nom": products[3]["nom"], "prix": products[3]["prix"],
+                 "categorie": products[3]["categorie"], "quantite": 1},
             ],
             "total": products[2]["prix"] + products[3]["prix"]
         }
@@ -122,10 +154,11 @@ def init_orders_linking(db, product_ids, client_ids):
     return result.inserted_ids
 
 def create_indexes(db):
-    """Create index on Produits.nom and display existing indexes."""
-    # Create index on 'nom' field
-    db.Produits.create_index("nom")
-    print("✅ Created index on Produits.nom")
+    """Create the declared indexes (see indexes.py) and display Produits indexes."""
+    report = indexes.ensure_indexes(db)
+    for collection_name, entry in report.items():
+        for name in entry["created"]:
+            print(f"✅ Created index {collection_name}.{name}")
     
     # Display all indexes
     print("\n📋 Existing indexes on Produits collection:")
@@ -302,7 +335,282 @@ def demonstrate_aggregation(db):
     for cat in result:
         print(f"   {cat['_id']}: {cat['nombre_produits']} products, {cat['valeur_stock']:.2f}€ total value")
 
+# ============================================================
+# SYNTHETIC DATA (python db_init.py seed)
+# ============================================================
+# Every document is a pure function of (seed, collection, index): its
+# random draws come from a hash of the three, not from a shared random
+# stream. Workers can generate any range of any collection, an order
+# line can rebuild the product it references, and the output does not
+# depend on how the ranges are split.
+
+SYNTHETIC_COLLECTIONS = ["Produits", "Clients", "CommandesEmbedding", "CommandesLinking"]
+
+# First byte after the timestamp of synthetic _ids, per collection
+ID_KINDS = {"Produits": 1, "Clients": 2, "CommandesEmbedding": 3, "CommandesLinking": 4}
+
+# _id timestamps and order dates (two years up to SEED_END)
+SEED_END = datetime(2025, 1, 1)
+SEED_DAYS = 730
+
+# Timestamp of the first synthetic _id, in UTC (not the machine's timezone)
+SEED_ID_EPOCH = int((SEED_END - timedelta(days=SEED_DAYS)).replace(tzinfo=timezone.utc).timestamp())
+
+# Documents per worker task
+TASK_SIZE = 50000
+
+CATALOGUE = {
+    # categorie: (share of products, price range, names, category tags)
+    "Vêtements": (0.50, (9, 180), ["T-Shirt", "Jean Slim", "Chemise", "Robe", "Pull-over", "Veste", "Short",
+                                    "Jupe", "Sweat", "Manteau"], ["coton", "laine", "ete", "hiver"]),
+    "Chaussures": (0.25, (19, 250), ["Baskets Running", "Sandales", "Bottes", "Mocassins", "Escarpins",
+                                     "Derbies"], ["cuir", "sport", "confort"]),
+    "Accessoires": (0.25, (5, 400), ["Sac à Main", "Montre", "Ceinture", "Lunettes de Soleil", "Écharpe",
+                                     "Casquette", "Portefeuille"], ["cuir", "cadeau", "ete"]),
+}
+COLORS = ["Blanc", "Noir", "Bleu", "Rouge", "Vert", "Beige", "Gris", "Marine", "Rose", "Camel"]
+COMMON_TAGS = ["nouveau", "promo", "eco", "bestseller"]
+FIRST_NAMES = ["Marie", "Jean", "Sophie", "Lucas", "Emma", "Louis", "Léa", "Hugo", "Chloé", "Nathan",
+               "Camille", "Théo", "Manon", "Arthur", "Inès", "Jules"]
+LAST_NAMES = ["Dupont", "Martin", "Bernard", "Petit", "Durand", "Leroy", "Moreau", "Simon", "Laurent",
+              "Lefèvre", "Michel", "Garcia", "Roux", "Fournier", "Girard", "Mercier"]
+# ville: share of clients
+CITIES = [("Paris", 0.30), ("Lyon", 0.12), ("Marseille", 0.12), ("Toulouse", 0.09), ("Bordeaux", 0.08),
+          ("Lille", 0.08), ("Nantes", 0.07), ("Strasbourg", 0.07), ("Nice", 0.07)]
+STATUSES = [("Livrée", 0.65), ("En préparation", 0.15), ("En cours", 0.20)]
+# Lines per order and quantite per line: share of orders / lines
+LINE_COUNTS = [(1, 0.40), (2, 0.30), (3, 0.15), (4, 0.10), (5, 0.05)]
+QUANTITIES = [(1, 0.75), (2, 0.18), (3, 0.07)]
+
+_MASK = (1 << 64) - 1
+
+
+def _draws(seed, kind, index):
+    """Endless floats in [0, 1) for one document (splitmix64 from a hash of its key)."""
+    state = (index ^ (kind << 56)) + (seed * 0x9E3779B97F4A7C15) & _MASK
+    while True:
+        state = (state + 0x9E3779B97F4A7C15) & _MASK
+        z = ((state ^ (state >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+        yield ((z ^ (z >> 31)) >> 11) / 9007199254740992.0
+
+
+def _weighted(u, choices):
+    """Value of (value, share) pairs picked by u in [0, 1)."""
+    for value, share in choices:
+        u -= share
+        if u < 0:
+            return value
+    return choices[-1][0]
+
+
+def _skewed(u, count, power):
+    """Index in [0, count) favouring small indexes: a few products and clients get most orders."""
+    return min(int(count * u ** power), count - 1)
+
+
+def synthetic_id(collection_name, index):
+    """Deterministic ObjectId: _id order is index order, ids never clash between collections."""
+    timestamp = SEED_ID_EPOCH + index // 1000
+    return ObjectId(struct.pack(">IB", timestamp, ID_KINDS[collection_name]) + index.to_bytes(7, "big"))
+
+
+def synthetic_product(seed, index):
+    """Product index of the catalogue generated with seed."""
+    u = _draws(seed, ID_KINDS["Produits"], index)
+    categorie = _weighted(next(u), [(name, entry[0]) for name, entry in CATALOGUE.items()])
+    _, (low, high), names, category_tags = CATALOGUE[categorie]
+    nom = f"{names[int(next(u) * len(names))]} {COLORS[int(next(u) * len(COLORS))]} {index}"
+    # Log-uniform price skewed to the cheap end, with a .99 ending
+    prix = math.floor(low * (high / low) ** (next(u) ** 1.5)) + 0.99
+    # One product in ten is out of stock
+    stock = 0 if next(u) < 0.1 else int(500 * next(u) ** 2) + 1
+    # Each tag on one product in four: two bits of one draw per tag
+    bits = int(next(u) * (1 << 53))
+    tags = [tag for i, tag in enumerate(category_tags + COMMON_TAGS) if (bits >> (2 * i)) & 3 == 0]
+    return {
+        "_id": synthetic_id("Produits", index),
+        "nom": nom,
+        "prix": prix,
+        "stock": stock,
+        "categorie": categorie,
+        "tags": tags,
+        "mots_cles": search.search_tokens(nom)
+    }
+
+
+@lru_cache(maxsize=100000)
+def _product_line(seed, index):
+    """Snapshot of a product copied on embedded order lines (popular products stay cached)."""
+    product = synthetic_product(seed, index)
+    return product["_id"], product["nom"], product["prix"], product["categorie"]
+
+
+@lru_cache(maxsize=100000)
+def _client_name(seed, index):
+    """client_nom of embedded orders."""
+    client = synthetic_client(seed, index)
+    return f"{client['nom']} {client['prenom']}"
+
+
+def synthetic_client(seed, index):
+    u = _draws(seed, ID_KINDS["Clients"], index)
+    prenom = FIRST_NAMES[int(next(u) * len(FIRST_NAMES))]
+    nom = LAST_NAMES[int(next(u) * len(LAST_NAMES))]
+    return {
+        "_id": synthetic_id("Clients", index),
+        "nom": nom,
+        "prenom": prenom,
+        "email": f"{search.fold(prenom)}.{search.fold(nom)}.{index}@example.com",
+        "ville": _weighted(next(u), CITIES)
+    }
+
+
+def _order_base(seed, collection_name, index, counts):
+    """Draws, client index, date, statut and [(product index, quantite)] of an order."""
+    u = _draws(seed, ID_KINDS[collection_name], index)
+    client = _skewed(next(u), counts["Clients"], 2)
+    date = SEED_END - timedelta(seconds=int(SEED_DAYS * 86400 * next(u)))
+    statut = _weighted(next(u), STATUSES)
+    wanted = min(_weighted(next(u), LINE_COUNTS), counts["Produits"])
+    products = []
+    while len(products) < wanted:
+        product = _skewed(next(u), counts["Produits"], 3)
+        if product not in products:
+            products.append(product)
+    lines = [(product, _weighted(next(u), QUANTITIES)) for product in products]
+    return client, date, statut, lines
+
+
+def synthetic_embedded_order(seed, index, counts):
+    client, date, statut, lines = _order_base(seed, "CommandesEmbedding", index, counts)
+    produits = []
+    for product_index, quantite in lines:
+        produit_id, nom, prix, categorie = _product_line(seed, product_index)
+        produits.append({"produit_id": produit_id, "nom": nom, "prix": prix, "categorie": categorie,
+                         "quantite": quantite})
+    return {
+        "_id": synthetic_id("CommandesEmbedding", index),
+        "client_nom": _client_name(seed, client),
+        "date_commande": date,
+        "statut": statut,
+        "produits": produits,
+        "total": round(order_lines.order_total(produits), 2)
+    }
+
+
+def synthetic_linked_order(seed, index, counts):
+    client, date, statut, lines = _order_base(seed, "CommandesLinking", index, counts)
+    return {
+        "_id": synthetic_id("CommandesLinking", index),
+        "client_id": synthetic_id("Clients", client),
+        "date_commande": date,
+        "statut": statut,
+        "produits": [{"produit_id": synthetic_id("Produits", product), "quantite": quantite}
+                     for product, quantite in lines]
+    }
+
+
+def synthetic_documents(collection_name, seed, start, stop, counts):
+    """Documents start..stop-1 of a synthetic collection."""
+    for index in range(start, stop):
+        if collection_name == "Produits":
+            yield synthetic_product(seed, index)
+        elif collection_name == "Clients":
+            yield synthetic_client(seed, index)
+        elif collection_name == "CommandesEmbedding":
+            yield synthetic_embedded_order(seed, index, counts)
+        else:
+            yield synthetic_linked_order(seed, index, counts)
+
+
+def load_range(collection_name, seed, start, stop, counts, batch_size):
+    """Worker task: insert documents start..stop-1 with unordered insert_many batches."""
+    collection = database.get_db()[collection_name]
+    batch = []
+    for doc in synthetic_documents(collection_name, seed, start, stop, counts):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    return collection_name, stop - start
+
+
+def seed_synthetic(db, counts, seed=42, workers=None, batch_size=5000):
+    """
+    Replace the collections with synthetic data ({collection: count}).
+    They are loaded with their _id index only; the declared indexes and
+    the sales counters are built once everything is in.
+    """
+    workers = workers or os.cpu_count() or 1
+    for collection_name in SYNTHETIC_COLLECTIONS + [sales_stats.STATS_COLLECTION]:
+        db[collection_name].drop()
+    
+    tasks = [
+        (collection_name, start, min(start + TASK_SIZE, counts[collection_name]))
+        for collection_name in SYNTHETIC_COLLECTIONS
+        for start in range(0, counts[collection_name], TASK_SIZE)
+    ]
+    total = sum(counts.values())
+    print(f"\n⚙️  Loading {total:,} documents with {workers} worker processes "
+          f"(insert_many batches of {batch_size}, seed {seed})")
+    
+    loaded = dict.fromkeys(SYNTHETIC_COLLECTIONS, 0)
+    started = last_report = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(load_range, collection_name, seed, start, stop, counts, batch_size)
+            for collection_name, start, stop in tasks
+        ]
+        for future in as_completed(futures):
+            collection_name, inserted = future.result()
+            loaded[collection_name] += inserted
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                done = sum(loaded.values())
+                print(f"   ⏳ {done:,}/{total:,} documents, {done / (now - started):,.0f} docs/s")
+                last_report = now
+    elapsed = time.perf_counter() - started
+    
+    for collection_name, inserted in loaded.items():
+        print(f"✅ Inserted {inserted:,} documents into {collection_name}")
+    print(f"⚡ Loaded {total:,} documents in {elapsed:.1f}s ({total / elapsed:,.0f} docs/s)")
+    
+    started = time.perf_counter()
+    create_indexes(db)
+    print(f"⚡ Built indexes in {time.perf_counter() - started:.1f}s")
+    
+    started = time.perf_counter()
+    sales_stats.rebuild_sales_stats(db)
+    print(f"✅ Built {sales_stats.STATS_COLLECTION} counters in {time.perf_counter() - started:.1f}s")
+    return loaded
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Initialize the BoutiqueComplete1 database.")
+    parser.add_argument("command", nargs="?", choices=["sample", "seed"], default="sample",
+                        help="sample: small demo data set (default); seed: synthetic data at scale")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=100000, help="embedded orders, and as many linked orders")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--batch-size", type=int, default=5000, help="documents per insert_many")
+    args = parser.parse_args(argv)
+    if args.command == "seed":
+        if args.products < 1 or args.clients < 1:
+            parser.error("seed needs at least one product and one client")
+        if args.orders < 0:
+            parser.error("--orders must not be negative")
+        if args.workers < 1 or args.batch_size < 1:
+            parser.error("--workers and --batch-size must be positive")
+    return args
+
+
 def main():
+    args = parse_args()
     print("="*60)
     print("🚀 BoutiqueComplete1 - Database Initialization")
     print("="*60)
@@ -310,12 +618,30 @@ def main():
     db = get_database()
     print(f"\n📦 Connected to database: {DATABASE_NAME}")
     
+    if args.command == "seed":
+        counts = {
+            "Produits": args.products,
+            "Clients": args.clients,
+            "CommandesEmbedding": args.orders,
+            "CommandesLinking": args.orders
+        }
+        seed_synthetic(db, counts, args.seed, args.workers, args.batch_size)
+        versions.bump(db, *versions.TRACKED_COLLECTIONS)
+        print("\n" + "="*60)
+        print("✅ Synthetic data loaded!")
+        print("="*60)
+        return 0
+    
     # Initialize collections
     product_ids = init_products(db)
     client_ids = init_clients(db)
     init_orders_embedding(db, product_ids)
     init_orders_linking(db, product_ids, client_ids)
     
+    # Build pre-aggregated sales counters from the seeded orders
+    sales_stats.rebuild_sales_stats(db)
+    print(f"✅ Built {sales_stats.STATS_COLLECTION} counters")
+    
     # Create indexes
     create_indexes(db)
     
@@ -325,9 +651,13 @@ def main():
     # Demonstrate aggregation
     demonstrate_aggregation(db)
     
+    # New data: change the ETags of every API read
+    versions.bump(db, *versions.TRACKED_COLLECTIONS)
+    
     print("\n" + "="*60)
     print("✅ Database initialization complete!")
     print("="*60)
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+BoutiqueComplete1 - Field Selection
+====================================
+The fields= query param of the read endpoints, turned into a MongoDB
+projection: unrequested fields are neither sent by the server nor
+serialized by the app.
+
+  fields=nom,prix,stock     only these fields (and _id)
+  fields=-tags,-promotion   every field but these
+  fields=nom,-_id           inclusion without _id
+  fields=produits.nom       dotted paths into sub-documents and arrays
+
+Paths are checked against an allowlist per collection
+({field: None, or the allowlist of its sub-documents}). Internal fields
+(e.g. the search tokens) are never returned, whatever the request.
+"""
+
+MAX_FIELDS = 50
+
+
+def check_path(path, allowed):
+    """Raise ValueError unless every segment of a dotted path is allowlisted."""
+    node = allowed
+    for segment in path.split('.'):
+        if not isinstance(node, dict) or segment not in node:
+            raise ValueError(f'Unknown field: {path}')
+        node = node[segment]
+
+
+def _without_nested(paths):
+    # MongoDB rejects a path together with one of its sub-paths
+    return [path for path in paths
+            if not any(path.startswith(other + '.') for other in paths if other != path)]
+
+
+def parse_fields(value, allowed, internal=()):
+    """
+    Projection for a fields= value. Without fields, excludes the internal
+    fields (None if there are none). Raises ValueError on unknown paths or
+    a mix of included and excluded fields (-_id excepted).
+    """
+    include, exclude = [], []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if item.startswith('-'):
+            exclude.append(item[1:].strip())
+        elif item:
+            include.append(item)
+
+    if not include and not exclude:
+        return {field: 0 for field in internal} or None
+    if len(include) + len(exclude) > MAX_FIELDS:
+        raise ValueError(f'At most {MAX_FIELDS} fields')
+    for path in include + exclude:
+        check_path(path, allowed)
+    if include and any(path != '_id' for path in exclude):
+        raise ValueError('fields cannot mix included and excluded fields (except -_id)')
+
+    if include:
+        projection = {path: 1 for path in _without_nested(include)}
+        if '_id' in exclude:
+            projection['_id'] = 0
+        return projection
+    projection = {path: 0 for path in _without_nested(exclude)}
+    projection.update({field: 0 for field in internal})
+    return projection
+
+
+def is_inclusion(projection):
+    """True for an inclusion projection ({'nom': 1}), False for an exclusion one."""
+    return any(value == 1 for key, value in projection.items() if key != '_id')
+
+
+def _parents(path):
+    # 'produits.produit_id' -> ['produits', 'produits.produit_id']
+    parts = path.split('.')
+    return ['.'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def ensure_fields(projection, required, inclusion=None):
+    """
+    Extend a projection with fields needed server-side (cursor sort key,
+    ETag date, join keys). Returns (projection, fields to remove from the
+    results). inclusion overrides is_inclusion(projection), for projections
+    whose included fields were all taken out (the joined ones).
+    """
+    if inclusion is None:
+        inclusion = bool(projection) and is_inclusion(projection)
+    if not projection and not inclusion:
+        return projection, []
+    projection = dict(projection or {})
+    dropped = []
+    for field in required:
+        parents = _parents(field)
+        excluded = [path for path in parents if projection.get(path) == 0]
+        if excluded:
+            for path in excluded:
+                del projection[path]
+                dropped.append(path)
+        elif inclusion and field != '_id' and not any(projection.get(path) == 1 for path in parents):
+            # Drop the whole top-level field unless part of it was requested
+            root = parents[0]
+            requested = any(path == root or path.startswith(root + '.') for path in projection)
+            projection[field] = 1
+            dropped.append(field if requested else root)
+    return projection, dropped
+
+
+def _pop_path(doc, parts):
+    if len(parts) == 1:
+        doc.pop(parts[0], None)
+        return
+    value = doc.get(parts[0])
+    for item in value if isinstance(value, list) else [value]:
+        if isinstance(item, dict):
+            _pop_path(item, parts[1:])
+
+
+def strip_fields(docs, dropped):
+    """Remove the fields added by ensure_fields from documents (dotted paths too)."""
+    if dropped:
+        paths = [field.split('.') for field in dropped]
+        for doc in docs:
+            for parts in paths:
+                _pop_path(doc, parts)
+    return docs
+
+
+def apply_projection(doc, projection):
+    """
+    Copy of a document with a projection applied in Python, for documents
+    already fetched (the join caches). Top-level fields only.
+    """
+    if not projection:
+        return dict(doc)
+    if is_inclusion(projection):
+        keep = {field for field, value in projection.items() if value == 1}
+        if projection.get('_id', 1) != 0:
+            keep.add('_id')
+        return {field: value for field, value in doc.items() if field in keep}
+    return {field: value for field, value in doc.items() if projection.get(field) != 0}
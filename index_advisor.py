@@ -0,0 +1,217 @@
+"""
+BoutiqueComplete1 - Query-Shape Index Advisor
+==============================================
+Records the normalized shape of every GET /api/products query (which
+fields are filtered with equality, range or regex, and the sort), samples
+explain("executionStats") for the most frequent shapes and suggests
+compound indexes following the Equality - Sort - Range rule.
+
+Recording is a dict update on the request path; explain() only runs when
+the advice is requested (GET /api/indexes/advise).
+"""
+
+import re
+import threading
+import time
+
+from bson.regex import Regex
+
+# Shapes kept in memory; new shapes are ignored once full
+MAX_SHAPES = 500
+
+# Seconds before a shape's explain() sample is refreshed
+EXPLAIN_TTL = 300
+
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$ne'}
+
+
+def classify(condition):
+    """Return how a field is filtered: 'eq', 'range', 'prefix', 'regex', 'exists' or 'text'."""
+    if isinstance(condition, (re.Pattern, Regex)):
+        return 'prefix' if str(condition.pattern).startswith('^') else 'regex'
+    if not isinstance(condition, dict):
+        return 'eq'
+    operators = set(condition)
+    if '$search' in operators:
+        return 'text'
+    if '$all' in operators and all(isinstance(v, (re.Pattern, Regex)) for v in condition['$all']):
+        return 'prefix'
+    if '$regex' in operators:
+        return 'regex'
+    if '$exists' in operators:
+        return 'exists'
+    if '$in' in operators or '$eq' in operators:
+        return 'eq'
+    if operators & RANGE_OPERATORS:
+        return 'range'
+    return 'eq'
+
+
+def query_shape(query, sort_spec):
+    """Normalize a filter and sort into a hashable shape."""
+    fields = tuple(sorted((field, classify(condition)) for field, condition in query.items()))
+    sort = tuple((field, 'textScore' if isinstance(order, dict) else order) for field, order in sort_spec)
+    return fields, sort
+
+
+def shape_key(shape):
+    """Human-readable key for a shape, e.g. 'categorie:eq,prix:range|sort:nom:1'."""
+    fields, sort = shape
+    filter_part = ','.join(f'{field}:{kind}' for field, kind in fields) or '*'
+    sort_part = ','.join(f'{field}:{order}' for field, order in sort)
+    return f'{filter_part}|sort:{sort_part}'
+
+
+def suggest_index(shape):
+    """
+    Build an ESR compound index for a shape: equality fields first, then
+    the sort keys, then range/regex/exists fields.
+    """
+    fields, sort = shape
+    # $text queries are served by the text index, not a compound key
+    fields = [(field, kind) for field, kind in fields if kind != 'text']
+    sort = [(field, order) for field, order in sort if order != 'textScore']
+    sort_fields = {field for field, _ in sort}
+    key = [(field, 1) for field, kind in fields if kind == 'eq' and field not in sort_fields]
+    for field, order in sort:
+        key.append((field, order))
+    used = {field for field, _ in key}
+    key += [(field, 1) for field, kind in fields if kind != 'eq' and field not in used]
+    return key
+
+
+def plan_stages(plan):
+    """Collect the stage names of an explain plan tree."""
+    stages = []
+    if not isinstance(plan, dict):
+        return stages
+    if 'stage' in plan:
+        stages.append(plan['stage'])
+    for child_key in ('inputStage', 'queryPlan', 'innerStage', 'outerStage'):
+        if child_key in plan:
+            stages += plan_stages(plan[child_key])
+    for child in plan.get('inputStages', []):
+        stages += plan_stages(child)
+    return stages
+
+
+def index_covers(index_key, suggested):
+    """
+    True if an existing index starts with the suggested key pattern,
+    or with its exact reverse (an index can be walked backwards).
+    """
+    prefix = [(field, int(order)) for field, order in list(index_key)[:len(suggested)]]
+    reverse = [(field, -order) for field, order in suggested]
+    return prefix == suggested or prefix == reverse
+
+
+class QueryShapeRecorder:
+    """Thread-safe frequency table of query shapes with explain samples."""
+
+    def __init__(self, max_shapes=MAX_SHAPES):
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._shapes = {}
+
+    def record(self, query, sort_spec):
+        """Count one execution of a query shape, keeping the latest query as sample."""
+        shape = query_shape(query, sort_spec)
+        with self._lock:
+            entry = self._shapes.get(shape)
+            if entry is None:
+                if len(self._shapes) >= self.max_shapes:
+                    return
+                entry = self._shapes[shape] = {
+                    'count': 0,
+                    'explain': None,
+                    'explained_at': 0
+                }
+            entry['count'] += 1
+            entry['query'] = query
+            entry['sort'] = list(sort_spec)
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+
+    def top(self, limit):
+        """Return (shape, entry) pairs, most frequent first."""
+        with self._lock:
+            items = sorted(self._shapes.items(), key=lambda item: item[1]['count'], reverse=True)
+            return [(shape, dict(entry)) for shape, entry in items[:limit]]
+
+    def store_explain(self, shape, summary):
+        with self._lock:
+            if shape in self._shapes:
+                self._shapes[shape]['explain'] = summary
+                self._shapes[shape]['explained_at'] = time.monotonic()
+
+
+def explain_query(collection, query, sort_spec):
+    """Run explain("executionStats") for a find and summarize it."""
+    command = {
+        'explain': {
+            'find': collection.name,
+            'filter': query,
+            'sort': dict(sort_spec)
+        },
+        'verbosity': 'executionStats'
+    }
+    try:
+        result = collection.database.command(command)
+    except Exception as e:
+        return {'error': str(e)}
+
+    stats = result.get('executionStats', {})
+    winning_plan = result.get('queryPlanner', {}).get('winningPlan', {})
+    stages = plan_stages(winning_plan)
+    returned = stats.get('nReturned', 0)
+    docs_examined = stats.get('totalDocsExamined', 0)
+    return {
+        'returned': returned,
+        'docs_examined': docs_examined,
+        'keys_examined': stats.get('totalKeysExamined', 0),
+        'execution_ms': stats.get('executionTimeMillis', 0),
+        'docs_examined_per_returned': round(docs_examined / max(returned, 1), 2),
+        'collection_scan': 'COLLSCAN' in stages,
+        'in_memory_sort': 'SORT' in stages,
+        'stages': stages
+    }
+
+
+def advise(collection, recorder, limit=20, refresh=False):
+    """Explain the most frequent shapes and suggest missing ESR indexes."""
+    existing = [
+        list(index['key'].items()) for index in collection.list_indexes()
+        if 'textIndexVersion' not in index
+    ]
+    now = time.monotonic()
+    report = []
+
+    for shape, entry in recorder.top(limit):
+        summary = entry['explain']
+        if refresh or summary is None or now - entry['explained_at'] > EXPLAIN_TTL:
+            summary = explain_query(collection, entry['query'], entry['sort'])
+            recorder.store_explain(shape, summary)
+
+        suggested = suggest_index(shape)
+        covered = any(index_covers(key, suggested) for key in existing)
+        needs_index = not covered and (
+            summary.get('collection_scan')
+            or summary.get('in_memory_sort')
+            or summary.get('docs_examined_per_returned', 0) > 1
+        )
+        notes = []
+        if any(kind == 'regex' for _, kind in shape[0]):
+            notes.append('Unanchored or case-insensitive $regex cannot use index bounds efficiently')
+
+        report.append({
+            'shape': shape_key(shape),
+            'count': entry['count'],
+            'explain': summary,
+            'suggested_index': [[field, order] for field, order in suggested],
+            'covered_by_existing_index': covered,
+            'recommended': bool(needs_index),
+            'notes': notes
+        })
+    return report
@@ -0,0 +1,171 @@
+"""
+BoutiqueComplete1 - Declarative Index Specification
+====================================================
+Every index the application relies on is declared in INDEX_SPEC. The
+spec is verified and built idempotently at startup (python app.py), by
+db_init.py, or from the command line:
+
+    python indexes.py check                 # report missing / extra indexes
+    python indexes.py apply                 # create missing indexes
+    python indexes.py apply --drop-extra    # also drop indexes not in the spec
+
+Indexes that exist but are not declared are only reported; they are
+dropped only when explicitly requested.
+"""
+
+import argparse
+import sys
+
+from pymongo import IndexModel
+
+# collection -> list of {'key': [(field, direction)], **options}
+INDEX_SPEC = {
+    'Produits': [
+        {'key': [('nom', 1)]},
+        {'key': [('categorie', 1), ('prix', 1)]},
+        # Word-prefix search (search.py)
+        {'key': [('mots_cles', 1)]},
+        # Ranked search; text indexes are accent-insensitive
+        {
+            'key': [('nom', 'text'), ('tags', 'text'), ('categorie', 'text')],
+            'name': 'produits_text',
+            'weights': {'nom': 10, 'tags': 5, 'categorie': 2},
+            'default_language': 'french'
+        },
+    ],
+    'CommandesEmbedding': [
+        {'key': [('statut', 1)]},
+        {'key': [('date_commande', -1)]},
+    ],
+    'CommandesLinking': [
+        {'key': [('produits.produit_id', 1)]},
+        {'key': [('client_id', 1)]},
+        {'key': [('statut', 1)]},
+        {'key': [('date_commande', -1)]},
+    ],
+    'StatistiquesVentes': [
+        {'key': [('type', 1), ('quantite_vendue', -1)]},
+        {'key': [('type', 1), ('total_ventes', -1)]},
+    ],
+}
+
+
+def index_name(spec):
+    """Name of a spec entry: explicit 'name' or MongoDB's default naming."""
+    if 'name' in spec:
+        return spec['name']
+    return '_'.join(f'{field}_{direction}' for field, direction in spec['key'])
+
+
+def normalize_key(key):
+    """Key pattern as a list of (field, direction) with integer directions."""
+    items = key.items() if hasattr(key, 'items') else key
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in items]
+
+
+def check_collection(collection, specs):
+    """Compare a collection's indexes with its spec: returns (missing, extra)."""
+    existing = {index['name']: normalize_key(index['key']) for index in collection.list_indexes()}
+
+    missing = []
+    declared = set()
+    for spec in specs:
+        name = index_name(spec)
+        if name in existing:
+            declared.add(name)
+            continue
+        key = normalize_key(spec['key'])
+        match = next((n for n, k in existing.items() if k == key), None)
+        if match is not None:
+            declared.add(match)
+        else:
+            missing.append(spec)
+
+    extra = [
+        {'name': name, 'key': key}
+        for name, key in existing.items()
+        if name != '_id_' and name not in declared
+    ]
+    return missing, extra
+
+
+def verify_indexes(db):
+    """Report missing and extra indexes for every collection in the spec."""
+    report = {}
+    for collection_name, specs in INDEX_SPEC.items():
+        missing, extra = check_collection(db[collection_name], specs)
+        report[collection_name] = {
+            'missing': [{'name': index_name(spec), 'key': spec['key']} for spec in missing],
+            'extra': extra
+        }
+    return report
+
+
+def ensure_indexes(db, drop_extra=False):
+    """
+    Create every missing index (idempotent). Extra indexes are dropped only
+    with drop_extra=True. Returns the report with 'created' and 'dropped'.
+    """
+    report = {}
+    for collection_name, specs in INDEX_SPEC.items():
+        collection = db[collection_name]
+        missing, extra = check_collection(collection, specs)
+
+        created = []
+        if missing:
+            models = [
+                IndexModel(spec['key'], name=index_name(spec),
+                           **{k: v for k, v in spec.items() if k not in ('key', 'name')})
+                for spec in missing
+            ]
+            created = collection.create_indexes(models)
+
+        dropped = []
+        if drop_extra:
+            for index in extra:
+                collection.drop_index(index['name'])
+                dropped.append(index['name'])
+
+        report[collection_name] = {
+            'created': created,
+            'dropped': dropped,
+            'extra': [] if drop_extra else extra
+        }
+    return report
+
+
+def print_report(report):
+    """Print a verify/ensure report."""
+    for collection_name, entry in report.items():
+        print(f"\n📋 {collection_name}")
+        for index in entry.get('missing', []):
+            print(f"   ❌ missing: {index['name']} {index['key']}")
+        for name in entry.get('created', []):
+            print(f"   ✅ created: {name}")
+        for name in entry.get('dropped', []):
+            print(f"   🗑️  dropped: {name}")
+        for index in entry.get('extra', []):
+            print(f"   ⚠️  extra (not in spec): {index['name']} {index['key']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify or build the declared MongoDB indexes.')
+    parser.add_argument('command', choices=['check', 'apply'])
+    parser.add_argument('--drop-extra', action='store_true', help='drop indexes that are not declared')
+    args = parser.parse_args()
+
+    from database import get_db
+    db = get_db()
+
+    if args.command == 'check':
+        report = verify_indexes(db)
+        print_report(report)
+        return 1 if any(entry['missing'] for entry in report.values()) else 0
+
+    print_report(ensure_indexes(db, drop_extra=args.drop_extra))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+BoutiqueComplete1 - Application-Side Joins
+===========================================
+Joins a page of linked orders with their products and clients in the
+app instead of with $lookup:
+
+  1. the page of orders is read alone (keyset on _id, see app.py);
+  2. the produit_id / client_id values of the page are collected;
+  3. they are looked up in a DimensionCache, a bounded in-process cache
+     of Produits / Clients documents by _id; the misses are read with one
+     $in query per collection;
+  4. the joined documents are stitched in (produits_details,
+     client_details), with the requested fields= projection.
+
+Product writes clear the products cache (app.invalidate_product_caches).
+Other processes (several workers) and writes made outside the API are
+covered by the TTL: JOIN_CACHE_TTL seconds of staleness at most.
+
+Compare with the $lookup pipeline: `python benchmarks/bench_joins.py`.
+
+Configuration (environment):
+  - JOIN_CACHE_SIZE: documents kept per collection (default: 10000)
+  - JOIN_CACHE_TTL: seconds a cached document is trusted (default: 300)
+"""
+
+import os
+import threading
+
+from cache import TTLCache
+import fields
+
+JOIN_CACHE_SIZE = int(os.environ.get('JOIN_CACHE_SIZE', 10000))
+JOIN_CACHE_TTL = float(os.environ.get('JOIN_CACHE_TTL', 300))
+
+
+class DimensionCache:
+    """
+    Documents of one collection by _id, with the internal fields left out
+    (projection). Thread-safe; a clear() during a read drops the documents
+    that read fetched, so a write is never hidden by an older read.
+    """
+
+    def __init__(self, collection_name, projection=None, maxsize=JOIN_CACHE_SIZE, ttl=JOIN_CACHE_TTL):
+        self.collection_name = collection_name
+        self.projection = projection
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.queries = 0
+        self.fetched = 0
+
+    def _split(self, ids):
+        found, misses = {}, []
+        for value in ids:
+            doc = self._cache.get(value)
+            if doc is None:
+                misses.append(value)
+            else:
+                found[value] = doc
+        with self._lock:
+            generation = self._generation
+            if misses:
+                self.queries += 1
+        return found, misses, generation
+
+    def _store(self, found, docs, generation):
+        with self._lock:
+            self.fetched += len(docs)
+            current = generation == self._generation
+        for doc in docs:
+            found[doc['_id']] = doc
+            if current:
+                self._cache.set(doc['_id'], doc)
+        return found
+
+    def get_many(self, db, ids):
+        """{_id: document} for the ids that exist; misses cost one $in query."""
+        found, misses, generation = self._split(ids)
+        if not misses:
+            return found
+        docs = list(db[self.collection_name].find({'_id': {'$in': misses}}, self.projection))
+        return self._store(found, docs, generation)
+
+    async def get_many_async(self, db, ids):
+        """get_many on an AsyncMongoClient database."""
+        found, misses, generation = self._split(ids)
+        if not misses:
+            return found
+        cursor = db[self.collection_name].find({'_id': {'$in': misses}}, self.projection)
+        return self._store(found, await cursor.to_list(), generation)
+
+    def clear(self):
+        """Drop every cached document (after a write to the collection)."""
+        with self._lock:
+            self._generation += 1
+        self._cache.clear()
+
+    def discard(self, ids):
+        """Drop some cached documents (after a write to them)."""
+        with self._lock:
+            self._generation += 1
+        for value in ids:
+            self._cache.delete(value)
+
+    def stats(self):
+        with self._lock:
+            queries, fetched = self.queries, self.fetched
+        return {**self._cache.stats(), 'queries': queries, 'fetched': fetched}
+
+
+# --- Stitching ---
+
+def path_values(doc, path):
+    """Values at a dotted path, through arrays: distinct, in document order."""
+    values = [doc]
+    for key in path.split('.'):
+        values = [
+            item.get(key)
+            for value in values
+            for item in (value if isinstance(value, list) else [value])
+            if isinstance(item, dict)
+        ]
+    flat = []
+    for value in values:
+        flat.extend(value if isinstance(value, list) else [value])
+    return list(dict.fromkeys(value for value in flat if value is not None))
+
+
+def collect_ids(docs, path):
+    """Distinct values at path over a page of documents."""
+    return list(dict.fromkeys(value for doc in docs for value in path_values(doc, path)))
+
+
+def stitch(docs, path, as_field, found, projection=None):
+    """
+    Set as_field on each document to the list of found documents its
+    path references (like $lookup, with unknown references left out).
+    """
+    projected = {key: fields.apply_projection(doc, projection) for key, doc in found.items()}
+    for doc in docs:
+        doc[as_field] = [projected[value] for value in path_values(doc, path) if value in projected]
+    return docs
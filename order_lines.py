@@ -0,0 +1,243 @@
+"""
+BoutiqueComplete1 - Embedded Order Lines
+=========================================
+Embedded order lines carry a snapshot of the ordered product taken at
+order time: 'produit_id' and 'categorie' next to 'nom', 'prix' and
+'quantite'. Sales statistics can then group lines directly, without
+joining Produits on the (non-unique) product name.
+
+Order totals are recomputed from the lines by the database: every line
+mutation is one aggregation-pipeline update that rewrites 'produits' and
+sets 'total' from it, so concurrent edits cannot make the total drift.
+
+Usage:
+    python order_lines.py backfill [--batch-size 500]
+        Add produit_id/categorie to lines of existing CommandesEmbedding
+        documents, in batches.
+    python order_lines.py repair-totals [--batch-size 500] [--dry-run]
+        Recompute the total of orders whose total disagrees with their
+        lines (orders written before pipeline updates), in batches.
+"""
+
+import argparse
+import sys
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+import versions
+
+
+def resolve_products(db, lines):
+    """
+    Find the products referenced by order lines with one query.
+    Lines are matched by produit_id when present, otherwise by nom.
+    Returns (by_id, by_nom) dicts of product documents.
+    """
+    ids = set()
+    noms = set()
+    for line in lines:
+        if line.get('produit_id'):
+            ids.add(ObjectId(line['produit_id']))
+        elif line.get('nom'):
+            noms.add(line['nom'])
+
+    clauses = []
+    if ids:
+        clauses.append({'_id': {'$in': list(ids)}})
+    if noms:
+        clauses.append({'nom': {'$in': list(noms)}})
+
+    by_id = {}
+    by_nom = {}
+    if clauses:
+        for product in db.Produits.find({'$or': clauses}, {'nom': 1, 'categorie': 1}):
+            by_id[product['_id']] = product
+            by_nom.setdefault(product['nom'], product)
+    return by_id, by_nom
+
+
+def match_product(line, by_id, by_nom):
+    """Return the product document for a line, or None."""
+    if line.get('produit_id'):
+        return by_id.get(ObjectId(line['produit_id']))
+    return by_nom.get(line.get('nom'))
+
+
+def snapshot_lines(db, lines):
+    """
+    Copy produit_id and categorie onto order lines (in place).
+    Raises bson.errors.InvalidId for a malformed produit_id.
+    """
+    by_id, by_nom = resolve_products(db, lines)
+    for line in lines:
+        product = match_product(line, by_id, by_nom)
+        if product is not None:
+            line['produit_id'] = product['_id']
+            line['categorie'] = product.get('categorie')
+        elif line.get('produit_id'):
+            line['produit_id'] = ObjectId(line['produit_id'])
+    return lines
+
+
+# --- Order totals ---
+
+# Largest difference between total and its lines before it counts as drift
+TOTAL_TOLERANCE = 0.005
+
+# sum(prix * quantite) over the lines, as an aggregation expression
+TOTAL_EXPRESSION = {'$sum': {'$map': {
+    'input': {'$ifNull': ['$produits', []]},
+    'as': 'line',
+    'in': {'$multiply': [{'$ifNull': ['$$line.prix', 0]}, {'$ifNull': ['$$line.quantite', 1]}]}
+}}}
+
+RECOMPUTE_TOTAL = {'$set': {'total': TOTAL_EXPRESSION}}
+
+
+def _if_null(value, default):
+    return default if value is None else value
+
+
+def order_total(lines):
+    """sum(prix * quantite) of order lines, like TOTAL_EXPRESSION (null prix 0, null quantite 1)."""
+    return sum(_if_null(line.get('prix'), 0) * _if_null(line.get('quantite'), 1) for line in lines)
+
+
+def push_line_update(line):
+    """Pipeline update appending a line and recomputing the total."""
+    # $literal: values starting with '$' must not be read as field paths
+    return [
+        {'$set': {'produits': {'$concatArrays': [{'$ifNull': ['$produits', []]}, [{'$literal': line}]]}}},
+        RECOMPUTE_TOTAL
+    ]
+
+
+def pull_lines_update(nom):
+    """Pipeline update removing every line with this nom and recomputing the total."""
+    return [
+        {'$set': {'produits': {'$filter': {
+            'input': {'$ifNull': ['$produits', []]},
+            'as': 'line',
+            'cond': {'$ne': ['$$line.nom', {'$literal': nom}]}
+        }}}},
+        RECOMPUTE_TOTAL
+    ]
+
+
+def repair_totals(db, batch_size=500, dry_run=False):
+    """
+    Recompute total where it differs from the lines by more than
+    TOTAL_TOLERANCE. Orders are scanned by _id in batches: one aggregate
+    computes the expected totals, one update_many fixes the drifted orders
+    (recomputing again, so a concurrent edit is never overwritten).
+    Returns (orders_scanned, drifted, fixed).
+    """
+    scanned = 0
+    drifted = 0
+    fixed = 0
+    last_id = None
+
+    while True:
+        match = {} if last_id is None else {'_id': {'$gt': last_id}}
+        orders = list(db.CommandesEmbedding.aggregate([
+            {'$match': match},
+            {'$sort': {'_id': 1}},
+            {'$limit': batch_size},
+            {'$project': {'total': 1, 'expected': TOTAL_EXPRESSION}}
+        ]))
+        if not orders:
+            break
+        last_id = orders[-1]['_id']
+        scanned += len(orders)
+
+        ids = [
+            order['_id'] for order in orders
+            if not isinstance(order.get('total'), (int, float))
+            or abs(order['total'] - order['expected']) > TOTAL_TOLERANCE
+        ]
+        drifted += len(ids)
+        if ids and not dry_run:
+            fixed += db.CommandesEmbedding.update_many({'_id': {'$in': ids}}, [RECOMPUTE_TOTAL]).modified_count
+
+    return scanned, drifted, fixed
+
+
+def backfill_order_lines(db, batch_size=500):
+    """
+    Snapshot produit_id/categorie on embedded order lines that lack them.
+    Each batch costs one Produits query and one unordered bulk_write; lines
+    are targeted with arrayFilters so concurrent $push/$pull are preserved.
+    Returns (orders_scanned, orders_updated).
+    """
+    query = {'produits': {'$elemMatch': {'categorie': {'$exists': False}}}}
+    scanned = 0
+    updated = 0
+    last_id = None
+
+    while True:
+        page_query = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+        orders = list(db.CommandesEmbedding.find(page_query, {'produits': 1}).sort('_id', 1).limit(batch_size))
+        if not orders:
+            break
+        last_id = orders[-1]['_id']
+        scanned += len(orders)
+
+        missing = [
+            line for order in orders for line in order.get('produits', [])
+            if 'categorie' not in line
+        ]
+        by_id, by_nom = resolve_products(db, missing)
+
+        requests = []
+        for order in orders:
+            updates = {}
+            array_filters = []
+            seen = set()
+            for line in order.get('produits', []):
+                if 'categorie' in line or line.get('nom') in seen:
+                    continue
+                product = match_product(line, by_id, by_nom)
+                if product is None:
+                    continue
+                seen.add(line.get('nom'))
+                name = f'l{len(array_filters)}'
+                updates[f'produits.$[{name}].produit_id'] = product['_id']
+                updates[f'produits.$[{name}].categorie'] = product.get('categorie')
+                array_filters.append({f'{name}.nom': line.get('nom'), f'{name}.categorie': {'$exists': False}})
+            if updates:
+                requests.append(UpdateOne({'_id': order['_id']}, {'$set': updates}, array_filters=array_filters))
+
+        if requests:
+            result = db.CommandesEmbedding.bulk_write(requests, ordered=False)
+            updated += result.modified_count
+
+    return scanned, updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain denormalized data on embedded order lines.')
+    parser.add_argument('command', choices=['backfill', 'repair-totals'])
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='repair-totals: only report drifted orders')
+    args = parser.parse_args()
+
+    from database import get_db
+    db = get_db()
+
+    if args.command == 'repair-totals':
+        scanned, drifted, fixed = repair_totals(db, args.batch_size, args.dry_run)
+        if fixed:
+            versions.bump(db, 'CommandesEmbedding')
+        print(f"{'✅' if not drifted or fixed else '⚠️ '} Order totals: {drifted} of {scanned} orders drifted, {fixed} fixed")
+        return 0
+
+    scanned, updated = backfill_order_lines(db, args.batch_size)
+    if updated:
+        versions.bump(db, 'CommandesEmbedding')
+    print(f"✅ Backfilled order lines: {updated} of {scanned} orders updated")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
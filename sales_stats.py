@@ -0,0 +1,242 @@
+"""
+BoutiqueComplete1 - Pre-aggregated Sales Statistics
+====================================================
+Per-category and per-product sales counters kept in the
+StatistiquesVentes collection. The embedded-order write endpoints apply
+$inc deltas, so /api/stats/sales-by-category and /api/stats/top-products
+read a handful of documents instead of unwinding every order.
+
+Counter documents:
+  {'_id': 'categorie:<name>', 'type': 'categorie', 'cle': <name>,
+   'total_ventes': float, 'nombre_articles': int, 'lignes': int}
+  {'_id': 'produit:<nom>', 'type': 'produit', 'cle': <nom>,
+   'revenue': float, 'quantite_vendue': int, 'lignes': int}
+
+'lignes' counts contributing order lines; entries at 0 are ignored.
+Category counters use the 'categorie' snapshot stored on each order line
+(run `python order_lines.py backfill` once for orders created before it).
+
+Usage:
+    python sales_stats.py check     # report drift against CommandesEmbedding
+    python sales_stats.py rebuild   # recompute every counter from scratch
+"""
+
+import argparse
+import sys
+
+from pymongo import UpdateOne
+
+STATS_COLLECTION = 'StatistiquesVentes'
+
+# Tolerance when comparing float sums accumulated with $inc
+DRIFT_TOLERANCE = 0.005
+
+# Documents per bulk_write/delete_many during a rebuild
+BATCH_SIZE = 1000
+
+
+def line_deltas(lines, sign=1):
+    """Sum order lines into {counter _id: {'type', 'cle', '$inc' fields}}."""
+    deltas = {}
+
+    def add(kind, key, fields):
+        entry = deltas.setdefault(f'{kind}:{key}', {'type': kind, 'cle': key, 'inc': {}})
+        for name, value in fields.items():
+            entry['inc'][name] = entry['inc'].get(name, 0) + value
+
+    for line in lines:
+        # Null prix / quantite count like missing ones (order_lines.order_total)
+        quantite = line.get('quantite')
+        quantite = 1 if quantite is None else quantite
+        prix = line.get('prix')
+        montant = (0 if prix is None else prix) * quantite
+        add('produit', line['nom'], {
+            'revenue': sign * montant,
+            'quantite_vendue': sign * quantite,
+            'lignes': sign
+        })
+        # Category comes from the snapshot taken at order time (order_lines.py)
+        categorie = line.get('categorie')
+        if categorie is not None:
+            add('categorie', categorie, {
+                'total_ventes': sign * montant,
+                'nombre_articles': sign * quantite,
+                'lignes': sign
+            })
+    return deltas
+
+
+def apply_sales_deltas(db, lines, sign=1):
+    """Apply $inc deltas for order lines added (sign=1) or removed (sign=-1)."""
+    lines = [line for line in lines if line.get('nom') is not None]
+    if not lines:
+        return
+    deltas = line_deltas(lines, sign)
+    requests = [
+        UpdateOne(
+            {'_id': counter_id},
+            {'$inc': entry['inc'], '$setOnInsert': {'type': entry['type'], 'cle': entry['cle']}},
+            upsert=True
+        )
+        for counter_id, entry in deltas.items()
+    ]
+    db[STATS_COLLECTION].bulk_write(requests, ordered=False)
+
+
+def compute_sales_stats(db):
+    """
+    Recompute every counter from CommandesEmbedding. Lines are grouped on
+    their own nom and categorie snapshot: no join with Produits.
+    """
+    # Null or missing prix counts 0 and quantite 1, as in line_deltas
+    # and order_lines.TOTAL_EXPRESSION
+    quantite = {'$ifNull': ['$produits.quantite', 1]}
+    line_totals = {
+        'montant': {'$sum': {'$multiply': [{'$ifNull': ['$produits.prix', 0]}, quantite]}},
+        'quantite': {'$sum': quantite},
+        'lignes': {'$sum': 1}
+    }
+    counters = {}
+    
+    by_product = [
+        {'$unwind': '$produits'},
+        {'$match': {'produits.nom': {'$ne': None}}},
+        {'$group': {'_id': '$produits.nom', **line_totals}}
+    ]
+    for row in db.CommandesEmbedding.aggregate(by_product, allowDiskUse=True):
+        counters[f"produit:{row['_id']}"] = {
+            'type': 'produit',
+            'cle': row['_id'],
+            'revenue': row['montant'],
+            'quantite_vendue': row['quantite'],
+            'lignes': row['lignes']
+        }
+    
+    by_category = [
+        {'$unwind': '$produits'},
+        {'$match': {'produits.nom': {'$ne': None}, 'produits.categorie': {'$ne': None}}},
+        {'$group': {'_id': '$produits.categorie', **line_totals}}
+    ]
+    for row in db.CommandesEmbedding.aggregate(by_category, allowDiskUse=True):
+        counters[f"categorie:{row['_id']}"] = {
+            'type': 'categorie',
+            'cle': row['_id'],
+            'total_ventes': row['montant'],
+            'nombre_articles': row['quantite'],
+            'lignes': row['lignes']
+        }
+    return counters
+
+
+def find_drift(db, expected=None):
+    """Compare stored counters with a fresh computation; return differences."""
+    if expected is None:
+        expected = compute_sales_stats(db)
+    stored = {doc['_id']: doc for doc in db[STATS_COLLECTION].find({'lignes': {'$gt': 0}})}
+    drift = []
+    for counter_id in sorted(set(expected) | set(stored)):
+        want = expected.get(counter_id, {})
+        have = stored.get(counter_id, {})
+        for field in ('revenue', 'quantite_vendue', 'total_ventes', 'nombre_articles', 'lignes'):
+            if field not in want and field not in have:
+                continue
+            if abs(want.get(field, 0) - have.get(field, 0)) > DRIFT_TOLERANCE:
+                drift.append({
+                    'counter': counter_id,
+                    'field': field,
+                    'stored': have.get(field, 0),
+                    'expected': want.get(field, 0)
+                })
+    return drift
+
+
+def rebuild_sales_stats(db):
+    """Replace every counter with a fresh computation. Returns the drift found."""
+    expected = compute_sales_stats(db)
+    drift = find_drift(db, expected)
+    collection = db[STATS_COLLECTION]
+    stale = [doc['_id'] for doc in collection.find({}, {'_id': 1}) if doc['_id'] not in expected]
+    for i in range(0, len(stale), BATCH_SIZE):
+        collection.delete_many({'_id': {'$in': stale[i:i + BATCH_SIZE]}})
+    requests = [
+        UpdateOne({'_id': counter_id}, {'$set': fields}, upsert=True)
+        for counter_id, fields in expected.items()
+    ]
+    for i in range(0, len(requests), BATCH_SIZE):
+        collection.bulk_write(requests[i:i + BATCH_SIZE], ordered=False)
+    return drift
+
+
+# Queries of the read endpoints: (filter, projection, sort field)
+SALES_BY_CATEGORY_QUERY = (
+    {'type': 'categorie', 'lignes': {'$gt': 0}},
+    {'_id': 0, 'cle': 1, 'total_ventes': 1, 'nombre_articles': 1},
+    'total_ventes'
+)
+TOP_PRODUCTS_QUERY = (
+    {'type': 'produit', 'lignes': {'$gt': 0}},
+    {'_id': 0, 'cle': 1, 'quantite_vendue': 1, 'revenue': 1},
+    'quantite_vendue'
+)
+
+
+def category_row(doc):
+    """Shape a category counter like the former $group output."""
+    return {'_id': doc['cle'], 'total_ventes': doc['total_ventes'], 'nombre_articles': doc['nombre_articles']}
+
+
+def product_row(doc):
+    """Shape a product counter like the former $group output."""
+    return {'_id': doc['cle'], 'quantite_vendue': doc['quantite_vendue'], 'revenue': doc['revenue']}
+
+
+def read_sales_by_category(db):
+    """Sales per category, shaped like the former $group output."""
+    query, projection, sort_field = SALES_BY_CATEGORY_QUERY
+    cursor = db[STATS_COLLECTION].find(query, projection).sort(sort_field, -1)
+    return [category_row(doc) for doc in cursor]
+
+
+def read_top_products(db, limit=10):
+    """Best-selling products, shaped like the former $group output."""
+    query, projection, sort_field = TOP_PRODUCTS_QUERY
+    cursor = db[STATS_COLLECTION].find(query, projection).sort(sort_field, -1).limit(limit)
+    return [product_row(doc) for doc in cursor]
+
+
+async def read_sales_by_category_async(db):
+    """read_sales_by_category for an AsyncMongoClient database."""
+    query, projection, sort_field = SALES_BY_CATEGORY_QUERY
+    cursor = db[STATS_COLLECTION].find(query, projection).sort(sort_field, -1)
+    return [category_row(doc) async for doc in cursor]
+
+
+async def read_top_products_async(db, limit=10):
+    """read_top_products for an AsyncMongoClient database."""
+    query, projection, sort_field = TOP_PRODUCTS_QUERY
+    cursor = db[STATS_COLLECTION].find(query, projection).sort(sort_field, -1).limit(limit)
+    return [product_row(doc) async for doc in cursor]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check or rebuild pre-aggregated sales statistics.')
+    parser.add_argument('command', choices=['check', 'rebuild'])
+    args = parser.parse_args()
+
+    from database import get_db
+    db = get_db()
+
+    if args.command == 'rebuild':
+        drift = rebuild_sales_stats(db)
+        print(f"✅ Rebuilt {STATS_COLLECTION} ({len(drift)} drifted values corrected)")
+    else:
+        drift = find_drift(db)
+        print(f"{'✅ No drift' if not drift else f'⚠️  {len(drift)} drifted values'} in {STATS_COLLECTION}")
+
+    for item in drift[:50]:
+        print(f"   {item['counter']}.{item['field']}: stored={item['stored']} expected={item['expected']}")
+    return 1 if drift and args.command == 'check' else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+BoutiqueComplete1 - Product Search
+===================================
+Index-backed search on Produits.nom, replacing the unanchored
+case-insensitive $regex.
+
+Three modes for GET /api/products?search=...&search_mode=...:
+  - prefix (default): every word of the query must start a word of the
+    product name. Names are stored as accent-folded lowercase tokens in
+    'mots_cles' (multikey index), so each word is an anchored,
+    case-sensitive regex with tight index bounds.
+  - text: ranked full-text search on nom/tags/categorie through the
+    'produits_text' index (French stemming, accent-insensitive).
+  - regex: substring match on nom; the input is escaped, never
+    interpreted as a pattern.
+
+Usage:
+    python search.py backfill [--all] [--batch-size 500]
+        Compute 'mots_cles' for products that lack it (or all with --all).
+"""
+
+import argparse
+import re
+import sys
+import unicodedata
+
+from pymongo import UpdateOne
+
+import versions
+
+SEARCH_MODES = ('prefix', 'text', 'regex')
+
+# Internal field holding the folded tokens of nom
+TOKENS_FIELD = 'mots_cles'
+
+# Letters that NFKD does not decompose
+_LIGATURES = str.maketrans({'œ': 'oe', 'Œ': 'oe', 'æ': 'ae', 'Æ': 'ae', 'ß': 'ss'})
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    """Lowercase and strip accents: 'Été' -> 'ete'."""
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize('NFKD', text.translate(_LIGATURES))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Split text into folded alphanumeric tokens."""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(fold(text))
+
+
+def search_tokens(nom):
+    """Sorted unique tokens stored in mots_cles for a product name."""
+    return sorted(set(tokenize(nom)))
+
+
+def prefix_filter(search):
+    """
+    Filter matching products whose name has a word starting with each
+    word of the search. Returns None if the search has no usable token.
+    """
+    tokens = tokenize(search)
+    if not tokens:
+        return None
+    patterns = [re.compile('^' + re.escape(token)) for token in tokens]
+    if len(patterns) == 1:
+        return {TOKENS_FIELD: patterns[0]}
+    return {TOKENS_FIELD: {'$all': patterns}}
+
+
+def text_filter(search):
+    """$text filter for ranked search."""
+    return {'$text': {'$search': search}}
+
+
+def regex_filter(search):
+    """Literal, case-insensitive substring match on nom."""
+    return {'nom': {'$regex': re.escape(search), '$options': 'i'}}
+
+
+def backfill_search_tokens(db, query=None, batch_size=500):
+    """
+    Compute mots_cles for products matching query (default: those without
+    it), in _id-ordered batches. Returns the number of products updated.
+    """
+    if query is None:
+        query = {TOKENS_FIELD: {'$exists': False}}
+    updated = 0
+    last_id = None
+    while True:
+        page_query = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+        products = list(db.Produits.find(page_query, {'nom': 1}).sort('_id', 1).limit(batch_size))
+        if not products:
+            break
+        last_id = products[-1]['_id']
+        requests = [
+            UpdateOne({'_id': p['_id']}, {'$set': {TOKENS_FIELD: search_tokens(p.get('nom'))}})
+            for p in products
+        ]
+        updated += db.Produits.bulk_write(requests, ordered=False).modified_count
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the product search tokens.')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--all', action='store_true', help='recompute tokens of every product')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    from database import get_db
+    db = get_db()
+
+    updated = backfill_search_tokens(db, {} if args.all else None, args.batch_size)
+    if updated:
+        versions.bump(db, 'Produits')
+    print(f"✅ Search tokens updated on {updated} products")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+BoutiqueComplete1 - BSON to JSON Serialization
+===============================================
+Encode MongoDB documents to JSON without the serialize_doc() copy.
+
+Two complementary paths, both producing output identical to
+jsonify(serialize_doc(doc)):
+  - BSONJSONProvider: Flask JSON provider whose default() maps ObjectId,
+    datetime and Decimal128 by exact type, so the C encoder walks dicts
+    and lists itself.
+  - JSON_CODEC_OPTIONS: codec options that decode raw BSON batches
+    (find_raw_batches / aggregate_raw_batches) straight into JSON-ready
+    values (ObjectId -> str, datetime -> ISO string), so no per-document
+    conversion is needed at all.
+"""
+
+from datetime import datetime
+
+import bson
+from bson import ObjectId
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
+from bson.decimal128 import Decimal128
+from bson.raw_bson import RawBSONDocument
+from flask.json.provider import DefaultJSONProvider
+
+
+def _decimal128_to_str(value):
+    return str(value.to_decimal())
+
+
+def _raw_to_dict(value):
+    return bson.decode(value.raw, JSON_CODEC_OPTIONS)
+
+
+# Exact-type dispatch: a dict lookup is much cheaper than an isinstance chain
+# for the thousands of values encoded per listing.
+_CONVERTERS = {
+    ObjectId: str,
+    datetime: datetime.isoformat,
+    Decimal128: _decimal128_to_str,
+    RawBSONDocument: _raw_to_dict,
+}
+
+
+def bson_default(o):
+    """Convert a BSON value to a JSON-encodable value, or raise TypeError."""
+    converter = _CONVERTERS.get(type(o))
+    if converter is not None:
+        return converter(o)
+    # Subclasses (e.g. tz-aware datetime types) take the slow path
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, RawBSONDocument):
+        return _raw_to_dict(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+# --- Decoding straight to JSON-ready values ---
+
+class _ObjectIdAsStr(TypeDecoder):
+    bson_type = ObjectId
+
+    def transform_bson(self, value):
+        return str(value)
+
+
+class _DatetimeAsIso(TypeDecoder):
+    bson_type = datetime
+
+    def transform_bson(self, value):
+        return value.isoformat()
+
+
+class _Decimal128AsStr(TypeDecoder):
+    bson_type = Decimal128
+
+    def transform_bson(self, value):
+        return _decimal128_to_str(value)
+
+
+JSON_CODEC_OPTIONS = CodecOptions(
+    type_registry=TypeRegistry([_ObjectIdAsStr(), _DatetimeAsIso(), _Decimal128AsStr()])
+)
+
+
+def decode_raw_batches(batches, codec_options=JSON_CODEC_OPTIONS):
+    """
+    Yield documents from raw BSON batches, e.g. from find_raw_batches()
+    or aggregate_raw_batches(). Each batch is decoded in one C call.
+    """
+    for batch in batches:
+        yield from bson.decode_all(batch, codec_options)
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that understands BSON types natively."""
+
+    @staticmethod
+    def default(o):
+        try:
+            return bson_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
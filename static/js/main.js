@@ -36,7 +36,26 @@ const api = {
     get(url) { return this.request(url, 'GET'); },
     post(url, data) { return this.request(url, 'POST', data); },
     put(url, data) { return this.request(url, 'PUT', data); },
-    delete(url, data) { return this.request(url, 'DELETE', data); }
+    delete(url, data) { return this.request(url, 'DELETE', data); },
+
+    // Resolve many ids of 'products' or 'clients' with one request per 1000 ids
+    // (BATCH_GET_MAX_IDS) instead of one GET per id.
+    // Returns a Map id -> document; unknown ids are left out.
+    async batchGet(resource, ids, fields = null, chunkSize = 1000) {
+        const unique = [...new Set(ids.filter(Boolean))];
+        const found = new Map();
+
+        for (let start = 0; start < unique.length; start += chunkSize) {
+            const chunk = unique.slice(start, start + chunkSize);
+            const body = { ids: chunk };
+            if (fields) body.fields = fields;
+            const result = await this.post(`/api/${resource}/batch-get`, body);
+            result.data.forEach((doc, idx) => {
+                if (doc) found.set(chunk[idx], doc);
+            });
+        }
+        return found;
+    }
 };
 
 /* --- Toast Notifications --- */
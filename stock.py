@@ -0,0 +1,170 @@
+"""
+BoutiqueComplete1 - Stock Reservation
+======================================
+Order creation takes the ordered quantities off Produits.stock without a
+read-check-write race: each product gets a conditional decrement
+
+    {'_id': id, 'stock': {'$gte': quantite}} -> {'$inc': {'stock': -quantite}}
+
+A decrement that does not match leaves the stock as it is, so stock
+never goes below 0 whatever the number of concurrent orders.
+
+  1. The produit_ids are read first with one $in query: an unknown id
+     rejects the order (not_found) before anything is written.
+  2. On a replica set or sharded cluster, a transaction reads the stock
+     of every product, then sends all decrements in one bulk_write (write
+     conflicts between concurrent orders are retried by with_transaction).
+     A short product aborts it before the write: nothing is written.
+  3. On a standalone server (no transactions), products are decremented
+     one by one; if any is short, the decrements that did apply are
+     given back (compensating $inc).
+
+A rejected order reports the shortfall of each product. Lines without a
+produit_id (embedded lines not matching any product) are not reserved.
+Stock is not given back when an order is deleted.
+"""
+
+from pymongo import UpdateOne
+
+# Stock writes change the product ETag (versions.document_etag)
+_STAMP = {'derniere_modification': True}
+
+# Topologies that support multi-document transactions
+_TRANSACTION_TOPOLOGIES = ('ReplicaSetWithPrimary', 'Sharded', 'LoadBalanced')
+
+
+class StockShortfall(Exception):
+    """
+    Some products lack stock or do not exist (nothing stays reserved).
+    shortfalls: one entry per product. released: products whose stock
+    was decremented then given back (their caches are stale).
+    """
+
+    def __init__(self, shortfalls, released=()):
+        super().__init__('Insufficient stock')
+        self.shortfalls = shortfalls
+        self.released = list(released)
+
+
+class _Short(Exception):
+    """Aborts the reservation transaction."""
+
+
+def requested_quantities(lines):
+    """
+    Sum order lines per produit_id: {produit_id: {'quantite': n, 'lines': [index, ...]}}.
+    Raises ValueError unless every reserved quantite is a positive integer.
+    """
+    wanted = {}
+    for index, line in enumerate(lines):
+        product_id = line.get('produit_id')
+        if product_id is None:
+            continue
+        quantity = line.get('quantite', 1)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+            raise ValueError('quantite must be a positive integer')
+        entry = wanted.setdefault(product_id, {'quantite': 0, 'lines': []})
+        entry['quantite'] += quantity
+        entry['lines'].append(index)
+    return wanted
+
+
+def release(db, reserved):
+    """Give back reserved quantities ({produit_id: quantite}) in one bulk_write."""
+    if reserved:
+        db.Produits.bulk_write([
+            UpdateOne({'_id': product_id}, {'$inc': {'stock': quantity}, '$currentDate': _STAMP})
+            for product_id, quantity in reserved.items()
+        ], ordered=False)
+
+
+def _decrement(product_id, quantity):
+    return {'_id': product_id, 'stock': {'$gte': quantity}}, {'$inc': {'stock': -quantity}, '$currentDate': _STAMP}
+
+
+def _shortfalls(wanted, product_ids, stock, reason='insufficient_stock'):
+    """One entry per product of product_ids, in order line order."""
+    return [
+        {
+            'produit_id': product_id,
+            'lines': wanted[product_id]['lines'],
+            'requested': wanted[product_id]['quantite'],
+            'available': stock.get(product_id),
+            'reason': reason
+        }
+        for product_id in wanted if product_id in product_ids
+    ]
+
+
+def _is_short(available, quantity):
+    return not isinstance(available, (int, float)) or available < quantity
+
+
+def _read_stock(db, product_ids, session=None):
+    return {
+        doc['_id']: doc.get('stock')
+        for doc in db.Produits.find({'_id': {'$in': product_ids}}, {'stock': 1}, session=session)
+    }
+
+
+def supports_transactions(client):
+    """True if the deployment takes multi-document transactions (not a standalone server)."""
+    description = getattr(client, 'topology_description', None)
+    return description is not None and description.topology_type_name in _TRANSACTION_TOPOLOGIES
+
+
+def _reserve_in_transaction(db, wanted):
+    """All decrements in one bulk_write, sent only if every product has the stock."""
+    requests = [UpdateOne(*_decrement(product_id, entry['quantite'])) for product_id, entry in wanted.items()]
+
+    def apply(session):
+        # Read before writing: the decrements run on this same snapshot (a
+        # concurrent change is a write conflict, retried by with_transaction)
+        stock = _read_stock(db, list(wanted), session)
+        short = [pid for pid, entry in wanted.items() if _is_short(stock.get(pid), entry['quantite'])]
+        if short:
+            raise _Short(_shortfalls(wanted, short, stock))
+        result = db.Produits.bulk_write(requests, ordered=False, session=session)
+        if result.matched_count != len(requests):
+            raise RuntimeError('Stock changed during the reservation transaction')
+
+    with db.client.start_session() as session:
+        try:
+            session.with_transaction(apply)
+        except _Short as e:
+            raise StockShortfall(e.args[0])
+    return {product_id: entry['quantite'] for product_id, entry in wanted.items()}
+
+
+def _reserve_one_by_one(db, wanted):
+    """One conditional decrement per product, compensated if any is short."""
+    reserved = {}
+    short = []
+    for product_id, entry in wanted.items():
+        if db.Produits.update_one(*_decrement(product_id, entry['quantite'])).matched_count:
+            reserved[product_id] = entry['quantite']
+        else:
+            short.append(product_id)
+    if not short:
+        return reserved
+    release(db, reserved)
+    # Reported stock is read after the failure: it may have moved since
+    raise StockShortfall(_shortfalls(wanted, short, _read_stock(db, short)), released=reserved)
+
+
+def reserve(db, lines):
+    """
+    Reserve the stock of order lines. Returns {produit_id: quantite} to
+    pass to release() if the order is not saved after all.
+    Raises ValueError (bad quantite) or StockShortfall (nothing reserved).
+    """
+    wanted = requested_quantities(lines)
+    if not wanted:
+        return {}
+    found = _read_stock(db, list(wanted))
+    missing = {product_id for product_id in wanted if product_id not in found}
+    if missing:
+        raise StockShortfall(_shortfalls(wanted, missing, {}, 'not_found'))
+    if supports_transactions(db.client):
+        return _reserve_in_transaction(db, wanted)
+    return _reserve_one_by_one(db, wanted)
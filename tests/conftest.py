@@ -0,0 +1,142 @@
+"""
+Shared fixtures: the app on mongomock, no MongoDB server needed.
+
+mongomock has no async client: AsyncMockClient wraps a mongomock client
+with the part of the AsyncMongoClient API that async_app.py uses, so
+the Flask routes and their async twins read the same documents.
+
+    pip install -r requirements-test.txt
+    python -m pytest
+"""
+
+import os
+import sys
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+class AsyncMockCursor:
+    """AsyncCursor / AsyncCommandCursor over a mongomock cursor."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._iterator = None
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, count):
+        self._cursor = self._cursor.skip(count)
+        return self
+
+    def limit(self, count):
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length=None):
+        docs = list(self._cursor)
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        self._iterator = iter(self._cursor)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        pass
+
+
+class AsyncMockCollection:
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        return AsyncMockCursor(self._collection.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return self._collection.find_one(*args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return self._collection.find_one_and_update(*args, **kwargs)
+
+    async def count_documents(self, query, **kwargs):
+        return self._collection.count_documents(query, **kwargs)
+
+    async def estimated_document_count(self, **kwargs):
+        return self._collection.estimated_document_count(**kwargs)
+
+    async def aggregate(self, pipeline, **kwargs):
+        # Cursor options (batchSize, allowDiskUse) do not change the result
+        return AsyncMockCursor(self._collection.aggregate(pipeline))
+
+
+class AsyncMockDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return AsyncMockCollection(self._db[name])
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class AsyncMockClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return AsyncMockDatabase(self._client[name])
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(scope='module')
+def mock_client():
+    """Install a mongomock client as the shared sync and async clients."""
+    saved = (database._client, database._client_pid, database._async_client, database._async_client_pid)
+    client = mongomock.MongoClient()
+    database._client, database._client_pid = client, os.getpid()
+    database._async_client, database._async_client_pid = AsyncMockClient(client), os.getpid()
+    yield client
+    database._client, database._client_pid, database._async_client, database._async_client_pid = saved
+
+
+@pytest.fixture(scope='module')
+def seeded_db(mock_client):
+    """The sample data set of db_init.py, with empty in-process caches."""
+    import app
+    import db_init
+    import sales_stats
+
+    db = mock_client[database.DATABASE_NAME]
+    product_ids = db_init.init_products(db)
+    client_ids = db_init.init_clients(db)
+    db_init.init_orders_embedding(db, product_ids)
+    db_init.init_orders_linking(db, product_ids, client_ids)
+    counters = sales_stats.compute_sales_stats(db)
+    db[sales_stats.STATS_COLLECTION].insert_many([{'_id': key, **value} for key, value in counters.items()])
+
+    app.stats_cache.clear()
+    app.count_cache.clear()
+    for dimension in app.DIMENSIONS.values():
+        dimension.clear()
+    yield db
+    mock_client.drop_database(db.name)
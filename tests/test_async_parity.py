@@ -0,0 +1,140 @@
+"""
+The async server (async_app.asgi_app: async routes, compression, Flask
+fallback) answers exactly like the Flask app (app.py): same status,
+body bytes and headers, on the same data.
+"""
+
+import asyncio
+import json
+from urllib.parse import quote, unquote
+
+import pytest
+
+pytest.importorskip('quart')
+
+import async_app
+from app import app as flask_app
+
+# Headers both servers set themselves, unrelated to the route
+IGNORED_HEADERS = {'date', 'server', 'content-length'}
+
+# $text, and the $lookup of /api/orders/linking without a page, need a real server
+GET_PATHS = [
+    '/api/products',
+    '/api/products?limit=5&skip=2&sort=-prix',
+    '/api/products?categorie=' + quote('Vêtements') + '&min_prix=40',
+    '/api/products?search=chemise',
+    '/api/products?search=cuir&search_mode=regex',
+    '/api/products?total=estimate&limit=3',
+    '/api/products?total=none',
+    '/api/products?cursor=&limit=5&sort=prix',
+    '/api/products?fields=nom,prix&cursor=&limit=5&sort=-prix',
+    '/api/products?fields=-tags',
+    '/api/products?total=bad',
+    '/api/products?fields=mots_cles',
+    '/api/products/not-an-id',
+    '/api/products/000000000000000000000000',
+    '/api/clients',
+    '/api/clients?fields=nom,-_id',
+    '/api/clients?stream=ndjson&batch_size=2',
+    '/api/orders/embedding',
+    '/api/orders/embedding?fields=-produits',
+    '/api/orders/embedding?stream=json&batch_size=1',
+    '/api/orders/linking?limit=1',
+    '/api/orders/linking?limit=2&fields=statut,produits_details.nom',
+    '/api/orders/linking?stream=ndjson&limit=2',
+    '/api/orders/linking?join=app',
+    '/api/stats/sales-by-category',
+    '/api/stats/stock-by-category',
+    '/api/stats/top-products',
+]
+
+
+def headers_of(response):
+    return sorted((key.lower(), value) for key, value in response.headers.items()
+                  if key.lower() not in IGNORED_HEADERS)
+
+
+async def asgi_request(method, path, headers=None, json_body=None):
+    '''One HTTP request through asgi_app: (status, body, headers).'''
+    path, _, query = path.partition('?')
+    body = b'' if json_body is None else json.dumps(json_body).encode()
+    raw_headers = [(b'host', b'localhost'), (b'content-length', str(len(body)).encode())]
+    if json_body is not None:
+        raw_headers.append((b'content-type', b'application/json'))
+    raw_headers += [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': unquote(path), 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': raw_headers, 'client': ('127.0.0.1', 5000), 'server': ('localhost', 80),
+    }
+    received = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await async_app.asgi_app(scope, receive, send)
+    disconnected.set()
+    start = next(message for message in messages if message['type'] == 'http.response.start')
+    response_headers = sorted((key.decode().lower(), value.decode()) for key, value in start['headers']
+                              if key.decode().lower() not in IGNORED_HEADERS)
+    response_body = b''.join(message.get('body', b'') for message in messages
+                             if message['type'] == 'http.response.body')
+    return start['status'], response_body, response_headers
+
+
+def assert_same(method, path, headers=None, json_body=None):
+    expected = flask_app.test_client().open(path, method=method, headers=headers, json=json_body)
+    status, body, response_headers = asyncio.run(asgi_request(method, path, headers, json_body))
+    assert status == expected.status_code
+    assert body == expected.get_data()
+    assert response_headers == headers_of(expected)
+
+
+@pytest.mark.parametrize('path', GET_PATHS)
+def test_get_parity(seeded_db, path):
+    assert_same('GET', path)
+
+
+def test_product_by_id_parity(seeded_db):
+    product = seeded_db.Produits.find_one({}, {'_id': 1})
+    assert_same('GET', f"/api/products/{product['_id']}")
+    assert_same('GET', f"/api/products/{product['_id']}?fields=nom,prix")
+
+
+def test_next_page_parity(seeded_db):
+    first = flask_app.test_client().get('/api/products?cursor=&limit=5').get_json()
+    assert first['next_cursor']
+    assert_same('GET', '/api/products?cursor=' + quote(first['next_cursor']) + '&limit=5')
+
+
+def test_not_modified_parity(seeded_db):
+    for path in ['/api/products', '/api/clients', '/api/orders/embedding', '/api/orders/linking?limit=2']:
+        etag = flask_app.test_client().get(path).headers['ETag']
+        assert_same('GET', path, headers={'If-None-Match': etag})
+
+
+@pytest.mark.parametrize('resource', ['products', 'clients'])
+def test_batch_get_parity(seeded_db, resource):
+    collection = seeded_db.Produits if resource == 'products' else seeded_db.Clients
+    ids = [str(doc['_id']) for doc in collection.find({}, {'_id': 1}).limit(3)]
+    ids += ['000000000000000000000000', 'not-an-id']
+    assert_same('POST', f'/api/{resource}/batch-get', json_body={'ids': ids, 'fields': 'nom'})
+    assert_same('POST', f'/api/{resource}/batch-get', json_body={'ids': 'not-a-list'})
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate'])
+def test_compressed_parity(seeded_db, encoding):
+    for path in ['/api/products', '/api/orders/embedding', '/api/clients?stream=ndjson&batch_size=2']:
+        assert_same('GET', path, headers={'Accept-Encoding': encoding})
@@ -0,0 +1,161 @@
+"""
+BoutiqueComplete1 - Collection Versions (ETags)
+================================================
+Change counters behind the ETags of the read API, kept in the Versions
+collection: one document per collection, {'_id': <collection>, 'v': int,
+'epoch': ObjectId}. The write endpoints bump the counter after each
+write, so an ETag only has to read these few documents to know whether a
+list changed, and If-None-Match is answered with 304 before the query.
+
+The epoch is set when a counter document is created: dropping Versions
+(or a fresh database) never repeats an old ETag.
+
+Single products are tagged with their derniere_modification date, which
+every product write sets; PUT /api/products/<id> turns If-Match into a
+filter on that date (optimistic concurrency in the same round trip).
+
+The bump is a separate write made after the data write: a conditional
+GET that lands between the two can still get a 304 for the previous
+content. The window lasts one round trip to MongoDB; the next request
+after the bump sees the change. Clients that cannot accept this send no
+If-None-Match.
+
+Writes made outside the API (mongo shell, scripts) do not bump anything:
+run `python versions.py bump` afterwards.
+
+Usage:
+    python versions.py show
+    python versions.py bump [collection ...]
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import hashlib
+import sys
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+VERSIONS_COLLECTION = 'Versions'
+
+# Collections whose reads are tagged
+TRACKED_COLLECTIONS = ('Produits', 'Clients', 'CommandesEmbedding', 'CommandesLinking')
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _bump_update():
+    return {'$inc': {'v': 1}, '$setOnInsert': {'epoch': ObjectId()}}
+
+
+def _init_update():
+    return {'$setOnInsert': {'v': 0, 'epoch': ObjectId()}}
+
+
+def bump(db, *collections):
+    """
+    Change the ETag of every read over these collections (call after the
+    write; reads between the write and the bump still match the old ETag).
+    """
+    for name in collections:
+        db[VERSIONS_COLLECTION].update_one({'_id': name}, _bump_update(), upsert=True)
+
+
+def _etag(docs, collections):
+    parts = '|'.join(f"{name}:{docs[name]['epoch']}:{docs[name]['v']}" for name in collections)
+    return hashlib.blake2b(parts.encode(), digest_size=12).hexdigest()
+
+
+def collection_etag(db, *collections):
+    """ETag of a read over these collections (one query on Versions)."""
+    versions = db[VERSIONS_COLLECTION]
+    docs = {doc['_id']: doc for doc in versions.find({'_id': {'$in': list(collections)}})}
+    for name in collections:
+        if name not in docs:
+            docs[name] = versions.find_one_and_update(
+                {'_id': name}, _init_update(), upsert=True, return_document=ReturnDocument.AFTER
+            )
+    return _etag(docs, collections)
+
+
+async def collection_etag_async(db, *collections):
+    """collection_etag on an AsyncMongoClient database."""
+    versions = db[VERSIONS_COLLECTION]
+    cursor = versions.find({'_id': {'$in': list(collections)}})
+    docs = {doc['_id']: doc async for doc in cursor}
+    for name in collections:
+        if name not in docs:
+            docs[name] = await versions.find_one_and_update(
+                {'_id': name}, _init_update(), upsert=True, return_document=ReturnDocument.AFTER
+            )
+    return _etag(docs, collections)
+
+
+# --- Per-document tags (derniere_modification) ---
+
+def modification_stamp():
+    """
+    A new derniere_modification, as reads return it: naive UTC with
+    millisecond precision (BSON dates), so a write can echo it unchanged.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def _to_millis(value):
+    # BSON dates have millisecond precision
+    return (value.replace(tzinfo=None) - _EPOCH) // timedelta(milliseconds=1)
+
+
+def document_etag(doc):
+    """
+    ETag of one document: its _id and derniere_modification in
+    milliseconds ('.0' when never stamped). None if the field is not a date.
+    """
+    modified = doc.get('derniere_modification')
+    if modified is None:
+        return f"{doc['_id']}.0"
+    if not isinstance(modified, datetime):
+        return None
+    return f"{doc['_id']}.{_to_millis(modified)}"
+
+
+def revision_filter(object_id, etags):
+    """
+    Condition matching the document only while it still has one of the
+    given ETags (from If-Match). None if none of them belongs to it.
+    """
+    conditions = []
+    for etag in etags:
+        doc_id, _, millis = etag.rpartition('.')
+        if doc_id != str(object_id) or not millis.isdigit():
+            continue
+        if millis == '0':
+            conditions.append({'derniere_modification': {'$exists': False}})
+        else:
+            conditions.append({'derniere_modification': _EPOCH + timedelta(milliseconds=int(millis))})
+    if not conditions:
+        return None
+    return {'$or': conditions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['show', 'bump'])
+    parser.add_argument('collections', nargs='*', help=f'default: {", ".join(TRACKED_COLLECTIONS)}')
+    args = parser.parse_args()
+
+    from database import get_db
+    db = get_db()
+    collections = args.collections or TRACKED_COLLECTIONS
+
+    if args.command == 'bump':
+        bump(db, *collections)
+    for name in collections:
+        doc = db[VERSIONS_COLLECTION].find_one({'_id': name}) or {}
+        print(f"{name:<20} v{doc.get('v', '-')}  epoch {doc.get('epoch', '-')}  etag {collection_etag(db, name)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())